@@ -1,22 +1,32 @@
 from pearll.agents.a2c import A2C
+from pearll.agents.a3c import A3C
 from pearll.agents.adames import AdamES
 from pearll.agents.base_agents import BaseAgent
 from pearll.agents.cem_rl import CEM_RL
+from pearll.agents.cma_es import CMA_ES
 from pearll.agents.ddpg import DDPG
+from pearll.agents.distributed_es import ESCoordinator
 from pearll.agents.dqn import DQN
 from pearll.agents.dyna import DynaQ
 from pearll.agents.es import ES
 from pearll.agents.ga import GA
+from pearll.agents.map_elites import MAP_Elites
+from pearll.agents.pbt import PBT
 from pearll.agents.ppo import PPO
 
 __all__ = [
     "A2C",
+    "A3C",
     "BaseAgent",
     "CEM_RL",
+    "CMA_ES",
     "DDPG",
     "DQN",
+    "ESCoordinator",
     "ES",
     "GA",
+    "MAP_Elites",
+    "PBT",
     "PPO",
     "AdamES",
     "DynaQ",
@@ -0,0 +1,126 @@
+import multiprocessing as mp
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import torch as T
+
+from pearll.agents.a2c import A2C
+from pearll.common.utils import set_seed
+from pearll.models import ActorCritic
+
+
+def _worker(
+    agent_fn: Callable[[], A2C],
+    model: ActorCritic,
+    seed: int,
+    fit_kwargs: Dict[str, Any],
+    step_counter: Any,
+) -> None:
+    # Parallelism comes from the workers, extra threads only oversubscribe the cores
+    T.set_num_threads(1)
+    agent = agent_fn()
+    agent.model = model
+    set_seed(seed, agent.env)
+    try:
+        agent.fit(**fit_kwargs)
+    except KeyboardInterrupt:
+        pass
+    with step_counter.get_lock():
+        step_counter.value += agent.step
+
+
+class A3C(object):
+    """
+    Asynchronous Advantage Actor Critic (A3C)
+    https://arxiv.org/abs/1602.01783
+
+    Trains a single `ActorCritic` held in shared memory with several worker processes. Each worker
+    builds its own `A2C` agent, i.e. its own environment, `RolloutBuffer` and updaters, swaps in
+    the shared model and runs the usual `A2C` training loop. The updaters apply their gradient
+    steps to the shared weights without any locking, Hogwild style (https://arxiv.org/abs/1106.5730),
+    so workers never wait for each other and throughput scales with the number of CPU cores.
+    The model must stay on the CPU.
+
+    :param agent_fn: function which creates an `A2C` agent, called once for the shared model and
+        once in each worker process, it must be picklable unless the start method is fork
+    :param num_workers: number of worker processes
+    :param start_method: optional multiprocessing start method for the worker processes
+    :param seed: optional seed used to draw the seed of each worker
+    """
+
+    def __init__(
+        self,
+        agent_fn: Callable[[], A2C],
+        num_workers: int = 4,
+        start_method: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.agent_fn = agent_fn
+        self.num_workers = num_workers
+        self.start_method = start_method
+        self.agent = agent_fn()
+        self.model = self.agent.model
+        # The populations aren't registered submodules so are moved separately
+        for network in self.model.actors + self.model.critics:
+            network.share_memory()
+        self.model.share_memory()
+        self.num_steps = 0
+        self.steps_per_second = 0.0
+        self._rng = np.random.default_rng(seed)
+
+    def fit(
+        self,
+        num_steps: int,
+        batch_size: int,
+        actor_epochs: int = 1,
+        critic_epochs: int = 1,
+        train_frequency: Tuple[str, int] = ("step", 1),
+    ) -> None:
+        """
+        Train the shared model with the worker processes, each worker runs the `A2C` training
+        loop for its share of the environment steps, see `BaseAgent.fit`
+
+        :param num_steps: total number of environment steps to train over, split between the workers
+        :param batch_size: minibatch size to make a single gradient descent step on
+        :param actor_epochs: how many times to update the actor network in each training step
+        :param critic_epochs: how many times to update the critic network in each training step
+        :param train_frequency: the number of steps or episodes each worker runs before running a training step
+        """
+        ctx = mp.get_context(self.start_method)
+        step_counter = ctx.Value("q", 0)
+        fit_kwargs = dict(
+            num_steps=num_steps // self.num_workers,
+            batch_size=batch_size,
+            actor_epochs=actor_epochs,
+            critic_epochs=critic_epochs,
+            train_frequency=train_frequency,
+        )
+        seeds = self._rng.integers(2 ** 31 - 1, size=self.num_workers)
+        processes = [
+            ctx.Process(
+                target=_worker,
+                args=(self.agent_fn, self.model, int(seed), fit_kwargs, step_counter),
+            )
+            for seed in seeds
+        ]
+        start = time.perf_counter()
+        try:
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        elapsed = time.perf_counter() - start
+
+        failed = [process.exitcode for process in processes if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"{len(failed)} A3C workers failed, exit codes {failed}")
+        self.num_steps += step_counter.value
+        self.steps_per_second = step_counter.value / elapsed
+        self.agent.step = self.num_steps
+        self.model.update_global()
@@ -21,6 +21,7 @@ from pearll.settings import (
     MiscellaneousSettings,
     MutationSettings,
     PopulationSettings,
+    RacingSettings,
     Settings,
 )
 from pearll.updaters.evolution import BaseEvolutionUpdater, NoisyGradientAscent
@@ -66,6 +67,7 @@ class AdamES(BaseAgent):
     :param callback_settings: settings for callbacks
     :param logger_settings: settings for the logger
     :param misc_settings: settings for miscellaneous parameters
+    :param racing_settings: optional settings to stop evaluating poor individuals early
     """
 
     def __init__(
@@ -86,6 +88,7 @@ class AdamES(BaseAgent):
         callback_settings: Optional[List[Settings]] = None,
         logger_settings: LoggerSettings = LoggerSettings(),
         misc_settings: MiscellaneousSettings = MiscellaneousSettings(),
+        racing_settings: Optional[RacingSettings] = None,
     ) -> None:
         model = model if model is not None else default_model(env)
         super().__init__(
@@ -99,6 +102,7 @@ class AdamES(BaseAgent):
             callbacks=callbacks,
             callback_settings=callback_settings,
             misc_settings=misc_settings,
+            racing_settings=racing_settings,
         )
 
         self.learning_rate = learning_rate
@@ -125,20 +129,20 @@ class AdamES(BaseAgent):
         self.adam_step += 1
         return m_adj / (np.sqrt(v_adj) + 1e-8)
 
-    def _fit(
-        self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
-    ) -> Log:
+    def _update(self, rewards: np.ndarray, actor_epochs: int = 1) -> Log:
+        """
+        Update the population from the returns of each individual
+
+        :param rewards: the return of each individual in the current population
+        :param actor_epochs: how many times to update the population
+        :return: a Log object with training diagnostic info
+        """
         divergences = np.zeros(actor_epochs)
         entropies = np.zeros(actor_epochs)
 
-        trajectories = self.buffer.all(dtype="numpy")
-        rewards = trajectories.rewards.squeeze()
-        rewards = filter_rewards(rewards, trajectories.dones.squeeze())
-        if rewards.ndim > 1:
-            rewards = rewards.sum(axis=-1)
         scaled_rewards = scale(rewards)
-        grad_approx = np.dot(self.updater.normal_dist.T, scaled_rewards) / (
-            np.mean(self.updater.std) * self.env.num_envs
+        grad_approx = self.updater.weighted_noise(scaled_rewards) / (
+            np.mean(self.updater.std) * self.updater.population_size
         )
         optimization_direction = self._adam(grad_approx)
         for i in range(actor_epochs):
@@ -149,6 +153,18 @@ class AdamES(BaseAgent):
             )
             divergences[i] = log.divergence
             entropies[i] = log.entropy
-        self.buffer.reset()
 
         return Log(divergence=divergences.sum(), entropy=entropies.mean())
+
+    def _fit(
+        self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
+    ) -> Log:
+        trajectories = self.buffer.all(dtype="numpy")
+        rewards = trajectories.rewards.squeeze()
+        rewards = filter_rewards(rewards, trajectories.dones.squeeze())
+        if rewards.ndim > 1:
+            rewards = rewards.sum(axis=-1)
+        log = self._update(rewards, actor_epochs)
+        self.buffer.reset()
+
+        return log
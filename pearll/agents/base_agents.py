@@ -11,6 +11,8 @@ from pearll.buffers.base_buffer import BaseBuffer
 from pearll.callbacks.base_callback import BaseCallback
 from pearll.common.enumerations import FrequencyType
 from pearll.common.logging_ import Logger
+from pearll.common.pipelined_env import PipelinedVectorEnv
+from pearll.common.racing import Racing
 from pearll.common.type_aliases import Log, Observation, Tensor, Trajectories
 from pearll.common.utils import get_device, set_seed
 from pearll.explorers.base_explorer import BaseExplorer
@@ -20,6 +22,7 @@ from pearll.settings import (
     ExplorerSettings,
     LoggerSettings,
     MiscellaneousSettings,
+    RacingSettings,
     Settings,
 )
 
@@ -45,6 +48,8 @@ class BaseAgent(ABC):
     :param callback_settings: settings for callbacks
     :param logger_settings: settings for the logger
     :param misc_settings: settings for miscellaneous parameters
+    :param racing_settings: optional settings to stop evaluating poor individuals early, useful for
+        population based agents where each environment of a `VectorEnv` evaluates one individual
     """
 
     def __init__(
@@ -59,6 +64,7 @@ class BaseAgent(ABC):
         callback_settings: Optional[List[Settings]] = None,
         logger_settings: LoggerSettings = LoggerSettings(),
         misc_settings: MiscellaneousSettings = MiscellaneousSettings(),
+        racing_settings: Optional[RacingSettings] = None,
     ) -> None:
         self.logger = Logger(
             tensorboard_log_path=logger_settings.tensorboard_log_path,
@@ -81,6 +87,14 @@ class BaseAgent(ABC):
         )
         buffer_settings = buffer_settings.filter_none()
         self.buffer = buffer_class(env=env, **buffer_settings)
+        self.racing = (
+            None
+            if racing_settings is None
+            else Racing(
+                num_envs=env.num_envs if isinstance(env, VectorEnv) else 1,
+                **racing_settings.filter_none(),
+            )
+        )
         self.step = 0
         self.episode = 0
         self.done = False  # Flag terminate training
@@ -135,6 +149,33 @@ class BaseAgent(ABC):
         self.logger.write_log(self.step)
         self.logger.reset_log()
 
+    def _step_pipelined(
+        self, observation: Observation
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Step a `PipelinedVectorEnv`, the actions of the next step are computed group by group
+        while the other groups are still simulating
+
+        :param observation: the current observation
+        :return: the actions taken, next observations, rewards and dones
+        """
+        if self.racing is not None:
+            raise ValueError("Racing isn't supported with a `PipelinedVectorEnv`")
+        if not self.env.in_flight:
+            self.env.step_async(
+                self.action_explorer(self.model, observation, self.step)
+            )
+
+        def policy(group: slice, group_observation: np.ndarray) -> np.ndarray:
+            action = self.action_explorer(self.model, group_observation, self.step + 1)
+            # Random actions are sampled for every sub environment
+            if len(action) != len(group_observation):
+                action = action[group]
+            return action
+
+        action, next_observation, reward, done, _ = self.env.step_pipelined(policy)
+        return action, next_observation, reward, done
+
     def step_env(self, observation: Observation, num_steps: int = 1) -> np.ndarray:
         """
         Step the agent in the environment
@@ -147,8 +188,18 @@ class BaseAgent(ABC):
         for _ in range(num_steps):
             if self.render:
                 self.env.render()
-            action = self.action_explorer(self.model, observation, self.step)
-            next_observation, reward, done, _ = self.env.step(action)
+            if isinstance(self.env, PipelinedVectorEnv):
+                action, next_observation, reward, done = self._step_pipelined(
+                    observation
+                )
+            elif self.racing is None:
+                action = self.action_explorer(self.model, observation, self.step)
+                next_observation, reward, done, _ = self.env.step(action)
+            else:
+                action = self.action_explorer(self.model, observation, self.step)
+                next_observation, reward, done, _ = self.racing.step(
+                    self.env, observation, action
+                )
             self.buffer.add_trajectory(
                 observation, action, reward, next_observation, done
             )
@@ -162,6 +213,12 @@ class BaseAgent(ABC):
             # If all environment episodes are done, reset and check if we should dump the log
             if self.logger.check_episode_done(done):
                 observation = self.env.reset()
+                if self.racing is not None:
+                    self.logger.debug(
+                        f"Racing stopped {self.racing.num_stopped} individuals, "
+                        f"skipping {self.racing.skipped_steps} environment steps"
+                    )
+                    self.racing.reset()
                 if self.log_frequency[0] == FrequencyType.EPISODE:
                     if self.episode % self.log_frequency[1] == 0:
                         self.dump_log()
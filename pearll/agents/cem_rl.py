@@ -12,7 +12,8 @@ from pearll.agents.base_agents import BaseAgent
 from pearll.buffers import ReplayBuffer
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.callbacks.base_callback import BaseCallback
-from pearll.common.type_aliases import Log
+from pearll.common.racing import Racing
+from pearll.common.type_aliases import Log, NStepTrajectories
 from pearll.common.utils import filter_rewards, get_space_shape, to_numpy
 from pearll.explorers import BaseExplorer
 from pearll.models import Actor, ActorCritic, Critic
@@ -27,6 +28,7 @@ from pearll.settings import (
     MiscellaneousSettings,
     OptimizerSettings,
     PopulationSettings,
+    RacingSettings,
     Settings,
 )
 from pearll.signal_processing import (
@@ -99,6 +101,7 @@ class CEM_RL(BaseAgent):
     :param callback_settings: settings for callbacks
     :param logger_settings: settings for the logger
     :param misc_settings: settings for miscellaneous parameters
+    :param racing_settings: optional settings to stop evaluating poor individuals early in `eval_env`
     """
 
     def __init__(
@@ -122,6 +125,7 @@ class CEM_RL(BaseAgent):
         callback_settings: Optional[List[Settings]] = None,
         logger_settings: LoggerSettings = LoggerSettings(),
         misc_settings: MiscellaneousSettings = MiscellaneousSettings(),
+        racing_settings: Optional[RacingSettings] = None,
     ) -> None:
         model = model or get_default_model(env)
         super().__init__(
@@ -137,6 +141,12 @@ class CEM_RL(BaseAgent):
             misc_settings=misc_settings,
         )
         self.eval_env = eval_env
+        # Racing is only applied to the population evaluation, not the RL data collection
+        self.eval_racing = (
+            None
+            if racing_settings is None
+            else Racing(eval_env.num_envs, **racing_settings.filter_none())
+        )
         self.actor_updater = actor_updater_class(self.model)
         self.critic_updater = critic_updater_class(
             loss_class=critic_optimizer_settings.loss_class,
@@ -162,8 +172,8 @@ class CEM_RL(BaseAgent):
         model_copy = copy.deepcopy(self.model)
 
         # Train critic for critic_epochs
-        for i in range(critic_epochs):
-            trajectories = self.buffer.sample(batch_size=batch_size)
+        batches = self.buffer.sample_many(critic_epochs, batch_size=batch_size)
+        for i, trajectories in enumerate(batches):
             with T.no_grad():
                 next_actions = self.model.forward_target_actors(
                     trajectories.next_observations
@@ -175,7 +185,10 @@ class CEM_RL(BaseAgent):
                     trajectories.rewards,
                     next_q_values,
                     trajectories.dones,
-                    gamma=self.td_gamma,
+                    # n-step buffers give the discount of each transition
+                    gamma=trajectories.discounts
+                    if isinstance(trajectories, NStepTrajectories)
+                    else self.td_gamma,
                 )
             critic_log = self.critic_updater(
                 self.model,
@@ -197,10 +210,17 @@ class CEM_RL(BaseAgent):
         # Evaluate new model
         episode_dones = [False for _ in range(self.eval_env.num_envs)]
         observation = self.eval_env.reset()
+        if self.eval_racing is not None:
+            self.eval_racing.reset()
         episode_length = 0
         while not np.all(episode_dones):
             action = to_numpy(self.model(observation))
-            next_observation, reward, done, _ = self.eval_env.step(action)
+            if self.eval_racing is None:
+                next_observation, reward, done, _ = self.eval_env.step(action)
+            else:
+                next_observation, reward, done, _ = self.eval_racing.step(
+                    self.eval_env, observation, action
+                )
             self.buffer.add_trajectory(
                 observation, action, reward, next_observation, done
             )
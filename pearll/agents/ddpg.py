@@ -8,7 +8,7 @@ from pearll.agents.base_agents import BaseAgent
 from pearll.buffers import ReplayBuffer
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.callbacks.base_callback import BaseCallback
-from pearll.common.type_aliases import Log
+from pearll.common.type_aliases import Log, NStepTrajectories
 from pearll.common.utils import get_space_shape, to_numpy
 from pearll.explorers import BaseExplorer, GaussianExplorer
 from pearll.models import Actor, ActorCritic, Critic
@@ -136,8 +136,8 @@ class DDPG(BaseAgent):
         critic_losses = np.zeros(shape=(critic_epochs))
         actor_losses = np.zeros(shape=(actor_epochs))
         # Train critic for critic_epochs
-        for i in range(critic_epochs):
-            trajectories = self.buffer.sample(batch_size=batch_size)
+        batches = self.buffer.sample_many(critic_epochs, batch_size=batch_size)
+        for i, trajectories in enumerate(batches):
             with T.no_grad():
                 next_actions = self.model.forward_target_actors(
                     trajectories.next_observations
@@ -149,7 +149,10 @@ class DDPG(BaseAgent):
                     trajectories.rewards,
                     next_q_values,
                     trajectories.dones,
-                    gamma=self.td_gamma,
+                    # n-step buffers give the discount of each transition
+                    gamma=trajectories.discounts
+                    if isinstance(trajectories, NStepTrajectories)
+                    else self.td_gamma,
                 )
             critic_log = self.critic_updater(
                 self.model,
@@ -162,8 +165,10 @@ class DDPG(BaseAgent):
             critic_losses[i] = critic_log.loss
 
         # Train actor for actor_epochs
-        for i in range(actor_epochs):
-            trajectories = self.buffer.sample(batch_size=batch_size)
+        batches = self.buffer.sample_many(
+            actor_epochs, batch_size=batch_size, fields=["observations"]
+        )
+        for i, trajectories in enumerate(batches):
             actor_log = self.actor_updater(self.model, trajectories.observations)
             actor_losses[i] = actor_log.loss
 
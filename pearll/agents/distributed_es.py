@@ -0,0 +1,398 @@
+import hashlib
+import multiprocessing as mp
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch as T
+
+from pearll.agents.adames import AdamES
+from pearll.agents.es import ES
+from pearll.common.remote_env import (
+    authenticate_client,
+    connect,
+    recv_message,
+    send_message,
+)
+from pearll.common.utils import to_numpy
+from pearll.settings import DistributedESSettings
+from pearll.updaters.evolution import NoiseTableGradientAscent
+
+INIT = b"I"
+EVALUATE = b"E"
+RESYNC = b"R"
+FITNESS = b"F"
+CLOSE = b"C"
+
+
+def _hash(mean: np.ndarray) -> bytes:
+    """Hash of the mean genome used to check a worker holds the current mean"""
+    return hashlib.sha1(np.ascontiguousarray(mean).tobytes()).digest()
+
+
+def evaluate_population(agent: Union[ES, AdamES], population: np.ndarray) -> np.ndarray:
+    """
+    Score individuals by their return over one episode. The individuals are evaluated
+    `num_envs` at a time in the agent's vector environment.
+
+    :param agent: the agent whose model and environment are used for the evaluation
+    :param population: the individuals to evaluate
+    :return: the return of each individual
+    """
+    num_envs = agent.env.num_envs
+    action_range = agent.action_explorer.action_range
+    fitness = np.zeros(len(population))
+    for start in range(0, len(population), num_envs):
+        batch = population[start : start + num_envs]
+        # Pad the last batch so every sub environment has an individual
+        padding = np.repeat(batch[-1:], num_envs - len(batch), axis=0)
+        agent.updater.update_networks(np.concatenate([batch, padding]))
+
+        observation = agent.env.reset()
+        returns = np.zeros(num_envs)
+        dones = np.zeros(num_envs, dtype=bool)
+        while not np.all(dones):
+            with T.no_grad():
+                action = to_numpy(agent.model(observation))
+            action = np.clip(action, action_range[0], action_range[1])
+            observation, reward, done, _ = agent.env.step(action)
+            returns += np.where(dones, 0, reward)
+            dones = np.logical_or(dones, done)
+        fitness[start : start + len(batch)] = returns[: len(batch)]
+    return fitness
+
+
+def run_es_worker(
+    agent_fn: Callable[[], Union[ES, AdamES]],
+    settings: DistributedESSettings,
+) -> None:
+    """
+    Connect to an `ESCoordinator` and evaluate shares of its population until it closes.
+    The worker agent should use a `NoiseTableGradientAscent` updater with the same noise
+    table as the coordinator agent, its population size can differ from the coordinator's
+    and sets how many individuals are evaluated at once.
+
+    :param agent_fn: function which creates the worker agent
+    :param settings: the coordinator connection settings
+    """
+    agent = agent_fn()
+    updater = agent.updater
+    conn = connect(
+        settings.host, settings.port, settings.authkey, settings.connect_timeout
+    )
+
+    mean_hash = None
+    try:
+        while True:
+            try:
+                op, arrays = recv_message(conn)
+            except EOFError:
+                break
+            if op == INIT:
+                table = updater.noise_table
+                if [table.size, table.seed, updater.num_params] != arrays[0].tolist():
+                    raise ValueError(
+                        "The worker noise table or genome size doesn't match the coordinator"
+                    )
+            elif op == EVALUATE:
+                header, indices, std, mean, new_hash = arrays
+                generation, share_id, has_mean = header.tolist()
+                new_hash = new_hash.tobytes()
+                if has_mean:
+                    updater.mean[:] = mean.reshape(updater.mean.shape)
+                    mean_hash = new_hash
+                elif new_hash != mean_hash:
+                    send_message(conn, RESYNC, [np.array([generation, share_id])])
+                    continue
+                updater.std = std.item() if std.ndim == 0 else std.copy()
+                fitness = evaluate_population(
+                    agent, updater.population_from_indices(indices)
+                )
+                send_message(conn, FITNESS, [np.array([generation, share_id]), fitness])
+            elif op == CLOSE:
+                break
+            else:
+                raise RuntimeError(f"Received unknown operation `{op}`")
+    except (KeyboardInterrupt, BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        conn.close()
+
+
+def start_es_workers(
+    agent_fn: Callable[[], Union[ES, AdamES]],
+    num_workers: int,
+    settings: DistributedESSettings,
+    start_method: Optional[str] = None,
+) -> List[mp.Process]:
+    """
+    Start worker processes on this host, e.g. to use the cores of the coordinator machine
+
+    :param agent_fn: function which creates the worker agent
+    :param num_workers: number of worker processes
+    :param settings: the coordinator connection settings
+    :param start_method: optional multiprocessing start method for the worker processes
+    :return: the worker processes
+    """
+    ctx = mp.get_context(start_method)
+    processes = []
+    for _ in range(num_workers):
+        process = ctx.Process(
+            target=run_es_worker, args=(agent_fn, settings), daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+class ESCoordinator(object):
+    """
+    Coordinator distributing the population evaluation of `ES` or `AdamES` over workers,
+    which can run on other hosts and connect over TCP with `run_es_worker`.
+    https://arxiv.org/abs/1703.03864
+
+    The agent must use a `NoiseTableGradientAscent` updater so each individual is described
+    by its noise table index. Each generation the population is split into shares of
+    `share_size` individuals, a worker receives the noise indices of its share along with the
+    mean genome, or only the hash of the mean if it already holds it, and returns one fitness per
+    individual. The usual ES gradient estimate and update is then run on the coordinator.
+    Shares of workers which disconnect or time out are re-dispatched to the remaining workers.
+
+    The coordinator and the workers authenticate each other with the secret `authkey` of the
+    settings and exchange raw numpy arrays over TCP with the codec of
+    `pearll.common.remote_env`, nothing received is unpickled. The traffic isn't encrypted so
+    the coordinator should only listen on a trusted network.
+
+    :param agent: the agent to train, its environment is only used to build the agent
+    :param settings: the coordinator settings
+    """
+
+    def __init__(
+        self,
+        agent: Union[ES, AdamES],
+        settings: DistributedESSettings,
+    ) -> None:
+        if not isinstance(agent.updater, NoiseTableGradientAscent):
+            raise ValueError(
+                "Distributed ES requires the `NoiseTableGradientAscent` updater"
+            )
+        if agent.mutation_operator is not None:
+            raise ValueError(
+                "Mutated individuals can't be rebuilt by the workers from noise table indices"
+            )
+        self.agent = agent
+        self.settings = settings
+        self.generation = 0
+        self.num_redispatched = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((settings.host, settings.port))
+        self.socket.listen()
+        self.address = self.socket.getsockname()
+        self._closed = False
+        self._new_workers = deque()
+        self._workers: List[socket.socket] = []
+        # Hash of the mean held by each worker
+        self._worker_hashes: Dict[socket.socket, Optional[bytes]] = {}
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+
+    def _accept(self) -> None:
+        """Accept worker connections in the background"""
+        updater = self.agent.updater
+        init = np.array(
+            [updater.noise_table.size, updater.noise_table.seed, updater.num_params]
+        )
+        while not self._closed:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                continue
+            try:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                authenticate_client(conn, self.settings.authkey)
+                send_message(conn, INIT, [init])
+            except (OSError, AuthenticationError):
+                conn.close()
+                continue
+            self._new_workers.append(conn)
+
+    def _collect_workers(self) -> None:
+        """Add the newly connected workers"""
+        while self._new_workers:
+            conn = self._new_workers.popleft()
+            self._workers.append(conn)
+            self._worker_hashes[conn] = None
+
+    def _drop_worker(self, conn: socket.socket) -> None:
+        """Remove a missing worker"""
+        self._workers.remove(conn)
+        del self._worker_hashes[conn]
+        conn.close()
+
+    @property
+    def num_workers(self) -> int:
+        """The number of connected workers"""
+        self._collect_workers()
+        return len(self._workers)
+
+    def wait_for_workers(
+        self, num_workers: int, timeout: Optional[float] = None
+    ) -> None:
+        """
+        Wait for workers to connect
+
+        :param num_workers: the number of workers to wait for
+        :param timeout: optional seconds to wait, defaults to the connect timeout
+        """
+        timeout = self.settings.connect_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self.num_workers < num_workers:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Only {self.num_workers} of {num_workers} ES workers connected"
+                )
+            time.sleep(0.01)
+
+    def _send_share(
+        self,
+        conn: socket.socket,
+        share_id: int,
+        indices: np.ndarray,
+        mean: np.ndarray,
+        mean_hash: bytes,
+    ) -> None:
+        """Send a share to a worker, the mean is only sent if the worker doesn't hold it"""
+        send_mean = self._worker_hashes[conn] != mean_hash
+        send_message(
+            conn,
+            EVALUATE,
+            [
+                np.array([self.generation, share_id, send_mean]),
+                np.asarray(indices),
+                np.asarray(self.agent.updater.std, dtype=np.float64),
+                mean if send_mean else np.zeros(0),
+                np.frombuffer(mean_hash, dtype=np.uint8),
+            ],
+        )
+        self._worker_hashes[conn] = mean_hash
+
+    def evaluate(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Evaluate individuals of the current population on the workers
+
+        :param indices: the noise table index of each individual
+        :return: the fitness of each individual
+        """
+        self.generation += 1
+        mean = self.agent.updater.mean.copy()
+        mean_hash = _hash(mean)
+        share_size = self.settings.share_size
+        shares = [
+            indices[i : i + share_size] for i in range(0, len(indices), share_size)
+        ]
+        pending = deque(range(len(shares)))
+        # Share and deadline of each worker evaluating
+        in_flight: Dict[socket.socket, Tuple[int, float]] = {}
+        fitness = np.zeros(len(indices))
+        num_done = 0
+
+        while num_done < len(shares):
+            self._collect_workers()
+            for conn in list(self._workers):
+                if not pending:
+                    break
+                if conn in in_flight:
+                    continue
+                share_id = pending.popleft()
+                try:
+                    self._send_share(conn, share_id, shares[share_id], mean, mean_hash)
+                except OSError:
+                    self._drop_worker(conn)
+                    pending.appendleft(share_id)
+                    continue
+                in_flight[conn] = (share_id, time.monotonic() + self.settings.timeout)
+
+            if not in_flight:
+                deadline = time.monotonic() + self.settings.connect_timeout
+                while not self._new_workers:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("No ES workers are connected")
+                    time.sleep(0.01)
+                continue
+
+            # Wake up regularly to hand pending shares to newly connected workers
+            next_deadline = min(deadline for _, deadline in in_flight.values())
+            timeout = min(max(next_deadline - time.monotonic(), 0), 1)
+            for conn in wait(list(in_flight), timeout=timeout):
+                share_id, _ = in_flight.pop(conn)
+                try:
+                    op, arrays = recv_message(conn)
+                except (EOFError, OSError, ValueError):
+                    op = None
+                if op == RESYNC:
+                    self._worker_hashes[conn] = None
+                    pending.appendleft(share_id)
+                    continue
+                if op != FITNESS:
+                    self._drop_worker(conn)
+                    pending.append(share_id)
+                    self.num_redispatched += 1
+                    continue
+                header, share_fitness = arrays
+                _, share_id = header.tolist()
+                start = share_id * share_size
+                fitness[start : start + len(share_fitness)] = share_fitness
+                num_done += 1
+
+            now = time.monotonic()
+            for conn, (share_id, deadline) in list(in_flight.items()):
+                if deadline < now:
+                    del in_flight[conn]
+                    self._drop_worker(conn)
+                    pending.append(share_id)
+                    self.num_redispatched += 1
+
+        return fitness
+
+    def fit(self, num_generations: int, actor_epochs: int = 1) -> None:
+        """
+        Train the agent with the population evaluated on the workers
+
+        :param num_generations: number of generations to train for
+        :param actor_epochs: how many times to update the population each generation
+        """
+        for _ in range(num_generations):
+            rewards = self.evaluate(self.agent.updater.noise_indices)
+            self.agent.logger.add_reward(float(np.mean(rewards)))
+            self.agent.model.train()
+            train_log = self.agent._update(rewards, actor_epochs)
+            self.agent.model.update_global()
+            self.agent.logger.add_train_log(train_log)
+            self.agent.dump_log()
+            self.agent.step += 1
+            self.agent.episode += 1
+
+    def close(self) -> None:
+        """Close the worker connections and stop listening"""
+        self._closed = True
+        self._collect_workers()
+        for conn in self._workers:
+            try:
+                send_message(conn, CLOSE)
+            except OSError:
+                pass
+            conn.close()
+        self._workers = []
+        self._worker_hashes = {}
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
@@ -8,7 +8,7 @@ from pearll.agents.base_agents import BaseAgent
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.buffers.replay_buffer import ReplayBuffer
 from pearll.callbacks.base_callback import BaseCallback
-from pearll.common.type_aliases import Log
+from pearll.common.type_aliases import Log, NStepTrajectories
 from pearll.common.utils import get_space_shape
 from pearll.explorers.base_explorer import BaseExplorer
 from pearll.models.actor_critics import ActorCritic, Critic, EpsilonGreedyActor
@@ -107,8 +107,10 @@ class DQN(BaseAgent):
         self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
     ) -> Log:
         critic_losses = np.zeros(shape=(critic_epochs))
-        for i in range(critic_epochs):
-            trajectories = self.buffer.sample(batch_size=batch_size, flatten_env=False)
+        batches = self.buffer.sample_many(
+            critic_epochs, batch_size=batch_size, flatten_env=False
+        )
+        for i, trajectories in enumerate(batches):
 
             with T.no_grad():
                 next_q_values = self.model.forward_target_critics(
@@ -119,7 +121,10 @@ class DQN(BaseAgent):
                     trajectories.rewards,
                     next_q_values,
                     trajectories.dones,
-                    self.td_gamma,
+                    # n-step buffers give the discount of each transition
+                    trajectories.discounts
+                    if isinstance(trajectories, NStepTrajectories)
+                    else self.td_gamma,
                 )
 
             updater_log = self.updater(
@@ -156,8 +156,11 @@ class DynaQ(BaseAgent):
         obs_loss = np.zeros(epochs)
         reward_loss = np.zeros(epochs)
         done_loss = np.zeros(epochs)
-        for i in range(epochs):
-            trajectories = self.buffer.sample(batch_size)
+        fields = ["observations", "actions", "next_observations", "rewards"]
+        if self.env_model.done_fn is not None:
+            fields.append("dones")
+        batches = self.buffer.sample_many(epochs, batch_size, fields=fields)
+        for i, trajectories in enumerate(batches):
             obs_update_log = self.obs_updater(
                 model=self.env_model.observation_fn,
                 observations=trajectories.observations,
@@ -193,8 +196,10 @@ class DynaQ(BaseAgent):
         self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
     ) -> Log:
         critic_losses = np.zeros(shape=(critic_epochs))
-        for i in range(critic_epochs):
-            trajectories = self.buffer.sample(batch_size=batch_size, flatten_env=False)
+        batches = self.buffer.sample_many(
+            critic_epochs, batch_size=batch_size, flatten_env=False
+        )
+        for i, trajectories in enumerate(batches):
 
             with T.no_grad():
                 next_q_values = self.model.forward_target_critics(
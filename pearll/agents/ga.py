@@ -8,7 +8,8 @@ from pearll.agents.base_agents import BaseAgent
 from pearll.buffers import RolloutBuffer
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.callbacks.base_callback import BaseCallback
-from pearll.common.type_aliases import Log
+from pearll.common.archives import NoveltyArchive, final_observation_descriptor
+from pearll.common.type_aliases import Log, Trajectories
 from pearll.common.utils import filter_rewards
 from pearll.explorers.base_explorer import BaseExplorer
 from pearll.models import ActorCritic, Dummy
@@ -18,7 +19,9 @@ from pearll.settings import (
     LoggerSettings,
     MiscellaneousSettings,
     MutationSettings,
+    NoveltySettings,
     PopulationSettings,
+    RacingSettings,
     Settings,
 )
 from pearll.signal_processing import (
@@ -60,6 +63,10 @@ class GA(BaseAgent):
     :param mutation_operator: the mutation operator to be used
     :param mutation_settings: the mutation settings to be used
     :param elitism: the elitism ratio
+    :param novelty_settings: optional settings to select individuals by the novelty of their behaviour
+        rather than their reward (novelty search)
+    :param descriptor_fn: function mapping the population trajectories to their behaviour descriptors,
+        only used for novelty search
     :param buffer_class: the buffer class for storing and sampling trajectories
     :param buffer_settings: settings for the buffer
     :param action_explorer_class: the explorer class for random search at beginning of training and
@@ -69,6 +76,7 @@ class GA(BaseAgent):
     :param callback_settings: settings for callbacks
     :param logger_settings: settings for the logger
     :param misc_settings: settings for miscellaneous parameters
+    :param racing_settings: optional settings to stop evaluating poor individuals early
     """
 
     def __init__(
@@ -83,6 +91,10 @@ class GA(BaseAgent):
         mutation_operator: Callable = mutation_operators.uniform_mutation,
         mutation_settings: MutationSettings = MutationSettings(),
         elitism: float = 0.1,
+        novelty_settings: Optional[NoveltySettings] = None,
+        descriptor_fn: Callable[
+            [Trajectories], np.ndarray
+        ] = final_observation_descriptor,
         buffer_class: Type[BaseBuffer] = RolloutBuffer,
         buffer_settings: BufferSettings = BufferSettings(),
         action_explorer_class: Type[BaseExplorer] = BaseExplorer,
@@ -91,6 +103,7 @@ class GA(BaseAgent):
         callback_settings: Optional[List[Settings]] = None,
         logger_settings: LoggerSettings = LoggerSettings(),
         misc_settings: MiscellaneousSettings = MiscellaneousSettings(),
+        racing_settings: Optional[RacingSettings] = None,
     ) -> None:
         model = model if model is not None else default_model(env)
         super().__init__(
@@ -104,6 +117,7 @@ class GA(BaseAgent):
             callbacks=callbacks,
             callback_settings=callback_settings,
             misc_settings=misc_settings,
+            racing_settings=racing_settings,
         )
 
         self.updater = updater_class(self.model)
@@ -118,6 +132,30 @@ class GA(BaseAgent):
             mutation_operator, **mutation_settings.filter_none()
         )
         self.elitism = elitism
+        self.descriptor_fn = descriptor_fn
+        self.novelty_settings = novelty_settings
+        self.novelty_archive = None
+
+    def _novelty(self, trajectories: Trajectories) -> np.ndarray:
+        """
+        Score the novelty of the population behaviours and add some of them to the novelty archive
+
+        :param trajectories: the numpy trajectories of the population
+        :return: the novelty scores
+        """
+        descriptors = self.descriptor_fn(trajectories)
+        if self.novelty_archive is None:
+            self.novelty_archive = NoveltyArchive(
+                descriptor_size=descriptors.shape[1],
+                num_neighbours=self.novelty_settings.num_neighbours,
+                rebuild_frequency=self.novelty_settings.rebuild_frequency,
+            )
+        novelty = self.novelty_archive.novelty(descriptors)
+        add_mask = (
+            np.random.rand(descriptors.shape[0]) < self.novelty_settings.add_probability
+        )
+        self.novelty_archive.add(descriptors[add_mask])
+        return novelty
 
     def _fit(
         self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
@@ -126,10 +164,15 @@ class GA(BaseAgent):
         entropies = np.zeros(actor_epochs)
 
         trajectories = self.buffer.sample(batch_size, dtype="numpy")
-        rewards = trajectories.rewards.squeeze()
-        rewards = filter_rewards(rewards, trajectories.dones.squeeze())
-        if rewards.ndim > 1:
-            rewards = rewards.sum(dim=-1)
+        rewards = filter_rewards(trajectories.rewards, trajectories.dones[..., 0])
+        # Sum over time to get the return of each individual, (num_envs, num_objectives)
+        # for multi-objective environments
+        reward_size = self.buffer.reward_size
+        rewards = rewards.reshape(self.env.num_envs, -1, reward_size).sum(axis=1)
+        if reward_size == 1:
+            rewards = rewards.squeeze(-1)
+        if self.novelty_settings is not None:
+            rewards = self._novelty(trajectories)
         for i in range(actor_epochs):
             log = self.updater(
                 rewards=rewards,
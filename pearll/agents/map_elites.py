@@ -0,0 +1,158 @@
+from functools import partial
+from typing import Callable, List, Optional, Type
+
+import numpy as np
+from gym.vector.vector_env import VectorEnv
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.buffers import RolloutBuffer
+from pearll.buffers.base_buffer import BaseBuffer
+from pearll.callbacks.base_callback import BaseCallback
+from pearll.common.archives import (
+    BaseArchive,
+    GridArchive,
+    final_observation_descriptor,
+)
+from pearll.common.type_aliases import Log, Trajectories
+from pearll.common.utils import filter_rewards
+from pearll.explorers.base_explorer import BaseExplorer
+from pearll.models import ActorCritic, Dummy
+from pearll.settings import (
+    ArchiveSettings,
+    BufferSettings,
+    ExplorerSettings,
+    GridArchiveSettings,
+    LoggerSettings,
+    MiscellaneousSettings,
+    MutationSettings,
+    PopulationSettings,
+    RacingSettings,
+    Settings,
+)
+from pearll.signal_processing import mutation_operators
+from pearll.updaters.evolution import BaseEvolutionUpdater, MAPElitesUpdater
+
+
+def default_model(env: VectorEnv):
+    """
+    Returns a default model for the given environment.
+    """
+    actor = Dummy(space=env.single_action_space)
+    critic = Dummy(space=env.single_action_space)
+
+    return ActorCritic(
+        actor=actor,
+        critic=critic,
+        population_settings=PopulationSettings(
+            actor_population_size=env.num_envs, actor_distribution="uniform"
+        ),
+    )
+
+
+class MAP_Elites(BaseAgent):
+    """
+    Multi-dimensional Archive of Phenotypic Elites (MAP-Elites)
+    https://arxiv.org/abs/1504.04909
+
+    :param env: the gym-like environment to be used, should be a VectorEnv
+    :param model: the neural network model
+    :param updater_class: the updater class to be used
+    :param descriptor_fn: function mapping the population trajectories to their behaviour descriptors
+    :param archive_class: the archive class storing the elites
+    :param archive_settings: the archive settings to be used
+    :param mutation_operator: the mutation operator to be used
+    :param mutation_settings: the mutation settings to be used
+    :param buffer_class: the buffer class for storing and sampling trajectories
+    :param buffer_settings: settings for the buffer
+    :param action_explorer_class: the explorer class for random search at beginning of training and
+        adding noise to actions
+    :param explorer settings: settings for the action explorer
+    :param callbacks: an optional list of callbacks (e.g. if you want to save the model)
+    :param callback_settings: settings for callbacks
+    :param logger_settings: settings for the logger
+    :param misc_settings: settings for miscellaneous parameters
+    :param racing_settings: optional settings to stop evaluating poor individuals early
+    """
+
+    def __init__(
+        self,
+        env: VectorEnv,
+        model: Optional[ActorCritic] = None,
+        updater_class: Type[BaseEvolutionUpdater] = MAPElitesUpdater,
+        descriptor_fn: Callable[
+            [Trajectories], np.ndarray
+        ] = final_observation_descriptor,
+        archive_class: Type[BaseArchive] = GridArchive,
+        archive_settings: ArchiveSettings = GridArchiveSettings(),
+        mutation_operator: Callable = mutation_operators.gaussian_mutation,
+        mutation_settings: MutationSettings = MutationSettings(
+            mutation_rate=1, mutation_std=0.1
+        ),
+        buffer_class: Type[BaseBuffer] = RolloutBuffer,
+        buffer_settings: BufferSettings = BufferSettings(),
+        action_explorer_class: Type[BaseExplorer] = BaseExplorer,
+        explorer_settings: ExplorerSettings = ExplorerSettings(start_steps=0),
+        callbacks: Optional[List[Type[BaseCallback]]] = None,
+        callback_settings: Optional[List[Settings]] = None,
+        logger_settings: LoggerSettings = LoggerSettings(),
+        misc_settings: MiscellaneousSettings = MiscellaneousSettings(),
+        racing_settings: Optional[RacingSettings] = None,
+    ) -> None:
+        model = model if model is not None else default_model(env)
+        super().__init__(
+            env=env,
+            model=model,
+            action_explorer_class=action_explorer_class,
+            explorer_settings=explorer_settings,
+            buffer_class=buffer_class,
+            buffer_settings=buffer_settings,
+            logger_settings=logger_settings,
+            callbacks=callbacks,
+            callback_settings=callback_settings,
+            misc_settings=misc_settings,
+            racing_settings=racing_settings,
+        )
+
+        archive_settings = archive_settings.filter_none()
+        if "descriptor_bounds" not in archive_settings:
+            archive_settings["descriptor_bounds"] = (
+                env.single_observation_space.low.flatten(),
+                env.single_observation_space.high.flatten(),
+            )
+        self.archive = archive_class(
+            genome_shape=self.model.actor.space_shape,
+            genome_dtype=self.model.actor.space.dtype,
+            **archive_settings,
+        )
+        self.updater = updater_class(self.model, archive=self.archive)
+        self.descriptor_fn = descriptor_fn
+        self.mutation_operator = partial(
+            mutation_operator, **mutation_settings.filter_none()
+        )
+
+    def _fit(
+        self, batch_size: int, actor_epochs: int = 1, critic_epochs: int = 1
+    ) -> Log:
+        divergences = np.zeros(actor_epochs)
+        entropies = np.zeros(actor_epochs)
+
+        trajectories = self.buffer.all(dtype="numpy")
+        rewards = trajectories.rewards.squeeze()
+        rewards = filter_rewards(rewards, trajectories.dones.squeeze())
+        if rewards.ndim > 1:
+            rewards = rewards.sum(axis=-1)
+        descriptors = self.descriptor_fn(trajectories)
+        for i in range(actor_epochs):
+            log = self.updater(
+                rewards=rewards,
+                descriptors=descriptors,
+                mutation_operator=self.mutation_operator,
+            )
+            divergences[i] = log.divergence
+            entropies[i] = log.entropy
+        self.logger.debug(
+            f"Archive coverage {self.archive.coverage:.3f}, QD score {self.archive.qd_score:.3f}"
+        )
+        self.buffer.reset()
+
+        return Log(divergence=divergences.sum(), entropy=entropies.mean())
@@ -0,0 +1,327 @@
+import multiprocessing as mp
+import os
+import pickle
+from dataclasses import is_dataclass, replace
+from functools import partial
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from gym.vector import VectorEnv
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.buffers.base_buffer import BaseBuffer
+from pearll.callbacks.checkpoint_callback import CheckpointCallback
+from pearll.common.utils import to_numpy
+from pearll.settings import PBTSettings, Settings
+from pearll.signal_processing import selection_operators
+
+
+def get_hyperparameter(agent: BaseAgent, path: str) -> Any:
+    """
+    Get an agent hyperparameter
+
+    :param agent: the agent
+    :param path: attribute path from the agent, e.g. "actor_optimizer_settings.learning_rate"
+    :return: the hyperparameter value
+    """
+    value = agent
+    for name in path.split("."):
+        value = getattr(value, name)
+    return value
+
+
+def set_hyperparameter(obj: Any, path: str, value: Any) -> Any:
+    """
+    Set an agent hyperparameter. Settings dataclasses along the path are copied before
+    being changed since default settings objects are shared between agents.
+
+    :param obj: the agent or settings object
+    :param path: attribute path from the object, e.g. "actor_optimizer_settings.learning_rate"
+    :param value: the new hyperparameter value
+    :return: the updated object
+    """
+    name, _, rest = path.partition(".")
+    if rest:
+        child = getattr(obj, name)
+        if is_dataclass(child):
+            child = replace(child)
+        value = set_hyperparameter(child, rest, value)
+    setattr(obj, name, value)
+    return obj
+
+
+def evaluate_agent(agent: BaseAgent, num_episodes: int = 1) -> float:
+    """
+    Score an agent by the mean return of its global actor over full episodes
+
+    :param agent: the agent to evaluate
+    :param num_episodes: number of episodes to average over
+    :return: the mean episode return
+    """
+    num_envs = agent.env.num_envs if isinstance(agent.env, VectorEnv) else 1
+    episode_returns = np.zeros((num_episodes, num_envs))
+    for i in range(num_episodes):
+        observation = agent.env.reset()
+        dones = np.zeros(num_envs, dtype=bool)
+        while not np.all(dones):
+            action = to_numpy(agent.predict(observation))
+            observation, reward, done, _ = agent.env.step(action)
+            episode_returns[i] += np.where(dones, 0, reward)
+            dones = np.logical_or(dones, done)
+    return float(episode_returns.mean())
+
+
+def _save_buffer(buffer: BaseBuffer, path: str) -> None:
+    with open(path + "_buffer.pkl", "wb") as f:
+        pickle.dump({k: v for k, v in vars(buffer).items() if k != "env"}, f)
+
+
+def _load_buffer(buffer: BaseBuffer, path: str) -> None:
+    with open(path + "_buffer.pkl", "rb") as f:
+        vars(buffer).update(pickle.load(f))
+
+
+def _worker(
+    remote: Connection,
+    agent_fn: Callable[[], BaseAgent],
+    eval_fn: Callable[[BaseAgent], float],
+    fit_kwargs: Dict[str, Any],
+    hyperparameters: Dict[str, Any],
+    checkpoint_path: str,
+) -> None:
+    agent = agent_fn()
+    for path, value in hyperparameters.items():
+        set_hyperparameter(agent, path, value)
+    checkpoint = CheckpointCallback(
+        logger=agent.logger,
+        model=agent.model,
+        save_freq=1,
+        save_path=checkpoint_path,
+    )
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "fit":
+                agent.fit(num_steps=data, **fit_kwargs)
+                remote.send(eval_fn(agent))
+            elif command == "evaluate":
+                remote.send(eval_fn(agent))
+            elif command == "save":
+                path, copy_buffer = data
+                checkpoint.save(path)
+                if copy_buffer:
+                    _save_buffer(agent.buffer, path)
+                remote.send(None)
+            elif command == "load":
+                path, copy_buffer, hyperparameters = data
+                checkpoint.load(path)
+                if copy_buffer:
+                    _load_buffer(agent.buffer, path)
+                for path, value in hyperparameters.items():
+                    set_hyperparameter(agent, path, value)
+                remote.send(None)
+            elif command == "close":
+                remote.close()
+                break
+            else:
+                raise RuntimeError(f"Received unknown command `{command}`")
+    except KeyboardInterrupt:
+        pass
+
+
+class PBT(object):
+    """
+    Population Based Training
+    https://arxiv.org/abs/1711.09846
+
+    Trains a population of agents in parallel worker processes. Every `ready_steps` environment
+    steps each agent is scored, then the worst agents exploit a better agent chosen by the
+    selection operator by loading its checkpoint (and optionally its buffer) and explore by
+    perturbing the copied hyperparameters.
+
+    Hyperparameters are given as attribute paths from the agent mapped to their (low, high) bounds:
+        ```
+        hyperparameters = {
+            "actor_optimizer_settings.learning_rate": (1e-5, 1e-2),
+            "entropy_coeff": (0, 0.1),
+        }
+        ```
+
+    :param agent_fn: function which creates a new agent, called in each worker process
+    :param hyperparameters: the hyperparameter paths to tune mapped to their (low, high) bounds
+    :param population_size: number of agents trained in parallel
+    :param pbt_settings: settings for the exploit/explore schedule
+    :param selection_operator: the selection operator choosing which agents can be exploited,
+        called on the agent indices and their scores
+    :param selection_settings: the selection settings to be used
+    :param eval_fn: function which scores an agent, by default the mean return of a greedy episode
+    :param fit_kwargs: keyword arguments passed to the agent `fit()` besides `num_steps`, e.g. `batch_size`
+    :param initial_hyperparameters: optional starting hyperparameters for each agent,
+        sampled uniformly from the bounds if None
+    """
+
+    def __init__(
+        self,
+        agent_fn: Callable[[], BaseAgent],
+        hyperparameters: Dict[str, Tuple[float, float]],
+        population_size: int = 10,
+        pbt_settings: PBTSettings = PBTSettings(),
+        selection_operator: Callable = selection_operators.naive_selection,
+        selection_settings: Settings = Settings(),
+        eval_fn: Callable[[BaseAgent], float] = evaluate_agent,
+        fit_kwargs: Optional[Dict[str, Any]] = None,
+        initial_hyperparameters: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        self.bounds = hyperparameters
+        self.population_size = population_size
+        self.pbt_settings = pbt_settings
+        self.selection_operator = partial(
+            selection_operator, **selection_settings.filter_none()
+        )
+        if initial_hyperparameters is None:
+            initial_hyperparameters = [
+                {
+                    path: self._cast(path, np.random.uniform(low, high))
+                    for path, (low, high) in self.bounds.items()
+                }
+                for _ in range(population_size)
+            ]
+        assert (
+            len(initial_hyperparameters) == population_size
+        ), "There should be a hyperparameter dictionary for each agent"
+        self.hyperparameters = [dict(h) for h in initial_hyperparameters]
+        self.scores = np.full(population_size, -np.inf)
+        self.history = []
+
+        os.makedirs(pbt_settings.checkpoint_path, exist_ok=True)
+        ctx = mp.get_context(pbt_settings.start_method)
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(population_size)])
+        self.processes = []
+        for work_remote, h in zip(work_remotes, self.hyperparameters):
+            process = ctx.Process(
+                target=_worker,
+                args=(
+                    work_remote,
+                    agent_fn,
+                    eval_fn,
+                    fit_kwargs or {},
+                    h,
+                    pbt_settings.checkpoint_path,
+                ),
+                daemon=True,
+            )
+            process.start()
+            work_remote.close()
+            self.processes.append(process)
+
+    def _cast(self, path: str, value: float) -> Any:
+        """Round the hyperparameter value if its bounds are integers"""
+        low, high = self.bounds[path]
+        if isinstance(low, int) and isinstance(high, int):
+            return int(round(value))
+        return float(value)
+
+    def _request(self, command: str, data: List[Any]) -> List[Any]:
+        """Send a command to every worker and gather the results"""
+        for remote, d in zip(self.remotes, data):
+            remote.send((command, d))
+        return [remote.recv() for remote in self.remotes]
+
+    def explore(self, hyperparameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Perturb or resample the hyperparameters
+
+        :param hyperparameters: the hyperparameters to explore from
+        :return: the new hyperparameters
+        """
+        new_hyperparameters = {}
+        for path, value in hyperparameters.items():
+            low, high = self.bounds[path]
+            if np.random.rand() < self.pbt_settings.resample_probability:
+                value = np.random.uniform(low, high)
+            else:
+                value = value * np.random.choice(self.pbt_settings.perturb_factors)
+            new_hyperparameters[path] = self._cast(path, np.clip(value, low, high))
+        return new_hyperparameters
+
+    def exploit_and_explore(self) -> List[Tuple[int, int]]:
+        """
+        Replace the worst agents with a copy of the agents picked by the selection operator
+        and explore their hyperparameters.
+
+        :return: the (replaced, copied) agent index pairs
+        """
+        num_replaced = int(self.pbt_settings.exploit_ratio * self.population_size)
+        replaced = np.argsort(self.scores)[:num_replaced]
+        candidates = self.selection_operator(
+            np.arange(self.population_size), self.scores
+        )
+        pairs = []
+        for i in replaced:
+            donors = candidates[np.logical_not(np.isin(candidates, replaced))]
+            if donors.size > 0:
+                pairs.append((int(i), int(np.random.choice(donors))))
+
+        # Save all donors before loading so checkpoints aren't overwritten by replaced agents
+        paths = {}
+        for _, donor in pairs:
+            if donor not in paths:
+                paths[donor] = os.path.join(
+                    self.pbt_settings.checkpoint_path, f"agent_{donor}"
+                )
+                self.remotes[donor].send(
+                    ("save", (paths[donor], self.pbt_settings.copy_buffer))
+                )
+                self.remotes[donor].recv()
+        for i, donor in pairs:
+            self.hyperparameters[i] = self.explore(self.hyperparameters[donor])
+            self.scores[i] = self.scores[donor]
+            self.remotes[i].send(
+                (
+                    "load",
+                    (
+                        paths[donor],
+                        self.pbt_settings.copy_buffer,
+                        self.hyperparameters[i],
+                    ),
+                )
+            )
+            self.remotes[i].recv()
+        return pairs
+
+    def evaluate(self) -> np.ndarray:
+        """Score every agent in the population without training"""
+        self.scores = np.array(self._request("evaluate", [None] * self.population_size))
+        return self.scores
+
+    def fit(self, num_steps: int) -> Dict[str, Any]:
+        """
+        Train the population
+
+        :param num_steps: number of environment steps to train each agent over
+        :return: the hyperparameters of the best agent
+        """
+        num_rounds = max(1, num_steps // self.pbt_settings.ready_steps)
+        for i in range(num_rounds):
+            self.scores = np.array(
+                self._request(
+                    "fit", [self.pbt_settings.ready_steps] * self.population_size
+                )
+            )
+            self.history.append(
+                {
+                    "scores": self.scores.copy(),
+                    "hyperparameters": [dict(h) for h in self.hyperparameters],
+                }
+            )
+            if i < num_rounds - 1:
+                self.history[-1]["exploited"] = self.exploit_and_explore()
+        return self.hyperparameters[int(np.argmax(self.scores))]
+
+    def close(self) -> None:
+        """Close the worker processes"""
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
@@ -1,6 +1,25 @@
 from pearll.buffers.base_buffer import BaseBuffer
+from pearll.buffers.compressed_buffer import CompressedReplayBuffer
+from pearll.buffers.frame_stack_buffer import FrameStackBuffer
 from pearll.buffers.her_buffer import HERBuffer
+from pearll.buffers.n_step_buffer import NStepReplayBuffer
+from pearll.buffers.packed_buffer import PackedReplayBuffer
 from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.buffers.replay_server import ReplayClient, ReplayServer
 from pearll.buffers.rollout_buffer import RolloutBuffer
+from pearll.buffers.shared_buffer import SharedHERBuffer, SharedReplayBuffer
 
-__all__ = ["BaseBuffer", "ReplayBuffer", "RolloutBuffer", "HERBuffer"]
+__all__ = [
+    "BaseBuffer",
+    "ReplayBuffer",
+    "PackedReplayBuffer",
+    "FrameStackBuffer",
+    "CompressedReplayBuffer",
+    "NStepReplayBuffer",
+    "RolloutBuffer",
+    "HERBuffer",
+    "ReplayServer",
+    "ReplayClient",
+    "SharedReplayBuffer",
+    "SharedHERBuffer",
+]
@@ -1,17 +1,44 @@
 import warnings
 from abc import ABC, abstractmethod
-from typing import Union
+from dataclasses import replace
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
 import numpy as np
 import psutil
 import torch as T
-from gym import Env
+from gym import Env, spaces
 from gym.vector import VectorEnv
 
 from pearll import settings
 from pearll.common.enumerations import TrajectoryType
-from pearll.common.type_aliases import Observation, Trajectories
+from pearll.common.type_aliases import NStepTrajectories, Observation, Trajectories
 from pearll.common.utils import get_space_shape
+from pearll.settings import StorageSettings
+
+# Fields of the sampled trajectories
+TRAJECTORY_FIELDS = ("observations", "actions", "rewards", "next_observations", "dones")
+# Modulus of the episode starts stored in the episode index
+_STEP_MODULUS = 2 ** 32
+
+
+def _map_arrays(
+    fn: Callable[[np.ndarray], np.ndarray],
+    data: Union[np.ndarray, Dict[str, np.ndarray]],
+) -> Union[np.ndarray, Dict[str, np.ndarray]]:
+    """Apply a function to an array, or to each array of dictionary observations"""
+    if isinstance(data, dict):
+        return {key: fn(value) for key, value in data.items()}
+    return fn(data)
 
 
 class BaseBuffer(ABC):
@@ -20,15 +47,26 @@ class BaseBuffer(ABC):
 
     :param env: the environment
     :param buffer_size: max number of elements in the buffer
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
     """
 
+    # Number of the oldest transitions overwritten before the write position reaches them,
+    # e.g. by a next observation sharing their storage
+    _overwritten_ahead: int = 0
+    # Type of the trajectories given by the episode and sequence queries
+    _trajectories_class: Type = Trajectories
+
     def __init__(
         self,
         env: Env,
         buffer_size: int,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
     ) -> None:
         self.env = env
         self.buffer_size = buffer_size
+        self.reward_size = reward_size
         self.full = False
         self.pos = 0
 
@@ -43,21 +81,106 @@ class BaseBuffer(ABC):
         self.obs_shape = get_space_shape(env.observation_space)
         self.action_shape = get_space_shape(env.action_space)
 
+        observation_dtype = np.dtype(env.observation_space.dtype)
+        self.compute_dtypes = {
+            "observations": observation_dtype,
+            "actions": np.dtype(env.action_space.dtype),
+            "rewards": np.dtype(np.float32),
+            "next_observations": observation_dtype,
+            "dones": np.dtype(np.float32),
+        }
+        self.storage_dtypes = self._storage_dtypes(
+            storage_settings or StorageSettings()
+        )
+
         self.observations = np.zeros(
-            (self.buffer_size,) + self.obs_shape,
-            dtype=env.observation_space.dtype,
+            self._observation_storage_shape(),
+            dtype=self.storage_dtypes["observations"],
         )
         self.actions = np.zeros(
             (self.buffer_size,) + self.action_shape,
-            dtype=env.action_space.dtype,
+            dtype=self.storage_dtypes["actions"],
         )
         # Use 3 dims for easier calculations without having to think about broadcasting
-        self.rewards = np.zeros(self.batch_shape + (1,), dtype=np.float32)
-        self.dones = np.zeros(self.batch_shape + (1,), dtype=np.float32)
+        self.rewards = np.zeros(
+            self.batch_shape + (reward_size,), dtype=self.storage_dtypes["rewards"]
+        )
+        self.dones = np.zeros(
+            self.batch_shape + (1,), dtype=self.storage_dtypes["dones"]
+        )
+        self._init_episode_index()
+
+    def _observation_storage_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the array storing the observations"""
+        return (self.buffer_size,) + self.obs_shape
+
+    def _storage_dtypes(self, storage_settings: StorageSettings) -> Dict[str, np.dtype]:
+        """
+        Get the dtypes to store each field in, samples are converted back to `compute_dtypes`
+
+        :param storage_settings: the compact storage settings
+        :return: the storage dtype of each field
+        """
+        storage_dtypes = dict(self.compute_dtypes)
+        observation_dtype = storage_settings.observation_dtype
+        # Integer observations, e.g. images, are already compact
+        if observation_dtype is not None and np.issubdtype(
+            self.compute_dtypes["observations"], np.floating
+        ):
+            storage_dtypes["observations"] = np.dtype(observation_dtype)
+            storage_dtypes["next_observations"] = np.dtype(observation_dtype)
+        if storage_settings.reward_dtype is not None:
+            storage_dtypes["rewards"] = np.dtype(storage_settings.reward_dtype)
+        if storage_settings.compact_dones:
+            storage_dtypes["dones"] = np.dtype(np.uint8)
+        if storage_settings.compact_actions:
+            action_space = getattr(
+                self.env, "single_action_space", self.env.action_space
+            )
+            if isinstance(action_space, spaces.Discrete):
+                max_action = action_space.n - 1
+            elif isinstance(action_space, spaces.MultiDiscrete):
+                max_action = int(np.max(action_space.nvec)) - 1
+            elif isinstance(action_space, spaces.MultiBinary):
+                max_action = 1
+            else:
+                max_action = None
+            if max_action is not None:
+                storage_dtypes["actions"] = next(
+                    np.dtype(dtype)
+                    for dtype in (np.uint8, np.int16, np.int32, np.int64)
+                    if max_action <= np.iinfo(dtype).max
+                )
+        return storage_dtypes
+
+    def _to_compute_dtype(
+        self, name: str, data: np.ndarray, dtype: TrajectoryType
+    ) -> Union[np.ndarray, T.Tensor]:
+        """
+        Convert stored data to the output type and the compute dtype of its field. Tensors are
+        moved to the device before converting so less data is transferred.
+
+        :param name: the field of the data
+        :param data: the stored data, or a dictionary of it for dictionary observations
+        :param dtype: whether to return the data as numpy or torch
+        :return: the converted data
+        """
+        if isinstance(data, dict):
+            return {
+                key: self._to_compute_dtype(name, value, dtype)
+                for key, value in data.items()
+            }
+        compute_dtype = self.compute_dtypes[name]
+        if dtype == TrajectoryType.TORCH:
+            tensor = T.from_numpy(data).to(settings.DEVICE, non_blocking=True)
+            if data.dtype != compute_dtype:
+                tensor = tensor.to(T.from_numpy(np.empty(0, compute_dtype)).dtype)
+            return tensor
+        return data.astype(compute_dtype, copy=False)
 
     @staticmethod
     def _check_system_memory(*buffers) -> None:
-        """Check that the replay buffer can fit into memory"""
+        """Check that the replay buffer can fit into memory, in the dtypes it's stored in"""
         mem_available = psutil.virtual_memory().available
         total_memory_usage = sum([buffer.nbytes for buffer in buffers])
 
@@ -97,11 +220,13 @@ class BaseBuffer(ABC):
         rewards: np.ndarray,
         next_observations: np.ndarray,
         dones: np.ndarray,
+        discounts: Optional[np.ndarray] = None,
     ) -> Trajectories:
         """
         Handle post-processing of sampled trajectories:
-        1. Transform to torch tensor if specified
-        2. Flatten the n_env axis if specified
+        1. Flatten the n_env axis if specified
+        2. Transform to torch tensor if specified
+        3. Convert from the storage dtypes to the compute dtypes
 
         :param flatten_env: whether to flatten the num_envs axis
         :param dtype: the data type to return (torch or numpy)
@@ -110,6 +235,7 @@ class BaseBuffer(ABC):
         :param rewards: the rewards
         :param next_observations: the next observations
         :param dones: the done flags
+        :param discounts: optional discounts to bootstrap with, for n-step trajectories
         :return: the final transformed trajectories
         """
         if isinstance(dtype, str):
@@ -121,31 +247,32 @@ class BaseBuffer(ABC):
             rewards = self._flatten_env_axis(rewards)
             next_observations = self._flatten_env_axis(next_observations)
             dones = self._flatten_env_axis(dones)
+            if discounts is not None:
+                discounts = self._flatten_env_axis(discounts)
         elif self.num_envs > 1:
             observations = observations.swapaxes(0, 1)
             actions = actions.swapaxes(0, 1)
             rewards = rewards.swapaxes(0, 1)
             next_observations = next_observations.swapaxes(0, 1)
             dones = dones.swapaxes(0, 1)
-
-        # return torch tensors instead of numpy arrays
-        if dtype == TrajectoryType.TORCH:
-            observations = T.from_numpy(observations).to(
-                settings.DEVICE, non_blocking=True
-            )
-            actions = T.from_numpy(actions).to(settings.DEVICE, non_blocking=True)
-            rewards = T.from_numpy(rewards).to(settings.DEVICE, non_blocking=True)
-            next_observations = T.from_numpy(next_observations).to(
-                settings.DEVICE, non_blocking=True
-            )
-            dones = T.from_numpy(dones).to(settings.DEVICE, non_blocking=True)
-
-        return Trajectories(
-            observations=observations,
-            actions=actions,
-            rewards=rewards,
-            next_observations=next_observations,
-            dones=dones,
+            if discounts is not None:
+                discounts = discounts.swapaxes(0, 1)
+
+        # return torch tensors instead of numpy arrays, in the compute dtypes
+        trajectories = Trajectories(
+            observations=self._to_compute_dtype("observations", observations, dtype),
+            actions=self._to_compute_dtype("actions", actions, dtype),
+            rewards=self._to_compute_dtype("rewards", rewards, dtype),
+            next_observations=self._to_compute_dtype(
+                "next_observations", next_observations, dtype
+            ),
+            dones=self._to_compute_dtype("dones", dones, dtype),
+        )
+        if discounts is None:
+            return trajectories
+        return NStepTrajectories(
+            **vars(trajectories),
+            discounts=self._to_compute_dtype("discounts", discounts, dtype),
         )
 
     @abstractmethod
@@ -156,15 +283,244 @@ class BaseBuffer(ABC):
         self.full = False
 
         self.observations = np.zeros(
-            (self.buffer_size,) + self.obs_shape,
-            dtype=self.env.observation_space.dtype,
+            self._observation_storage_shape(),
+            dtype=self.storage_dtypes["observations"],
         )
         self.actions = np.zeros(
             (self.buffer_size,) + self.action_shape,
-            dtype=self.env.action_space.dtype,
+            dtype=self.storage_dtypes["actions"],
+        )
+        self.rewards = np.zeros(
+            self.batch_shape + (self.reward_size,), dtype=self.storage_dtypes["rewards"]
+        )
+        self.dones = np.zeros(
+            self.batch_shape + (1,), dtype=self.storage_dtypes["dones"]
+        )
+        self._init_episode_index()
+
+    def _init_episode_index(self, num_steps: int = 0) -> None:
+        """
+        Clear the episode index. Each environment has a ring of its complete episodes in
+        the buffer, oldest first, holding the absolute step each episode starts on, where step
+        `t` is stored at index `t % buffer_size`, and its return. An episode ends where the next
+        one starts. The starts are stored modulo 2 ** 32 and the returns in the rewards' storage
+        dtype to keep the rings small next to the transitions.
+
+        :param num_steps: the number of steps added to the buffer so far
+        """
+        ring_shape = (self.buffer_size, self.num_envs)
+        self._episode_starts = np.zeros(ring_shape, dtype=np.uint32)
+        self._episode_returns = np.zeros(
+            ring_shape + (self.reward_size,), dtype=self.storage_dtypes["rewards"]
+        )
+        # Number of episodes evicted and completed by each environment
+        self._episode_heads = np.zeros(self.num_envs, dtype=np.int64)
+        self._episode_tails = np.zeros(self.num_envs, dtype=np.int64)
+        # The first step of the running episode of each environment
+        self._current_starts = np.full(self.num_envs, num_steps, dtype=np.int64)
+        self._num_steps = num_steps
+
+    def _record_step(self, done: Union[bool, np.ndarray]) -> None:
+        """
+        Count a stored step and record the episodes it ends in the episode index, called at the
+        end of `add_trajectory`. Steps which don't end an episode only increment the count.
+
+        :param done: the trajectory done flag
+        """
+        self._num_steps += 1
+        if isinstance(done, (bool, np.bool_)):
+            if not done:
+                return
+        elif not np.any(done):
+            return
+        self._record_episodes(np.flatnonzero(np.asarray(done).reshape(self.num_envs)))
+
+    def _record_episodes(self, done_envs: np.ndarray) -> None:
+        """
+        Add the episodes which just ended to the index, their returns are summed from the
+        stored rewards once per episode
+
+        :param done_envs: the environments whose episode ended on the newest step
+        """
+        oldest_step = self._evict_episodes()
+        starts = self._current_starts[done_envs]
+        self._current_starts[done_envs] = self._num_steps
+        # An episode longer than the buffer is never complete in it
+        kept = starts >= oldest_step
+        for env, start in zip(done_envs[kept], starts[kept]):
+            steps = np.arange(start, self._num_steps) % self.buffer_size
+            rewards = self._get_samples(steps, ["rewards"])["rewards"]
+            if self.num_envs > 1:
+                rewards = rewards[:, env]
+            slot = self._episode_tails[env] % self.buffer_size
+            self._episode_starts[slot, env] = start % _STEP_MODULUS
+            self._episode_returns[slot, env] = rewards.sum(axis=0, dtype=np.float64)
+            self._episode_tails[env] += 1
+
+    def _episode_steps(self, stored_steps: np.ndarray) -> np.ndarray:
+        """Recover the absolute steps of episode starts stored modulo 2 ** 32"""
+        return self._num_steps - (self._num_steps - stored_steps.astype(np.int64)) % (
+            _STEP_MODULUS
+        )
+
+    def _evict_episodes(self) -> int:
+        """
+        Lazily drop the episodes whose first step has been overwritten from the index,
+        called when episodes are recorded or queried
+
+        :return: the oldest stored step
+        """
+        oldest_step = self._num_steps - self.buffer_size + self._overwritten_ahead
+        envs = np.arange(self.num_envs)
+        while True:
+            slots = self._episode_heads % self.buffer_size
+            evicted = (self._episode_heads < self._episode_tails) & (
+                self._episode_steps(self._episode_starts[slots, envs]) < oldest_step
+            )
+            if not evicted.any():
+                return oldest_step
+            self._episode_heads += evicted
+
+    def _episode_bounds(
+        self, envs: np.ndarray, episodes: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the first and last (exclusive) absolute steps of episodes in the index
+
+        :param envs: the environment of each episode
+        :param episodes: the number of episodes each environment completed before each episode
+        :return: the first and last steps of each episode
+        """
+        starts = self._episode_steps(
+            self._episode_starts[episodes % self.buffer_size, envs]
         )
-        self.rewards = np.zeros(self.batch_shape + (1,), dtype=np.float32)
-        self.dones = np.zeros(self.batch_shape + (1,), dtype=np.float32)
+        next_episodes = episodes + 1
+        # The newest episode of an environment ends where its running episode starts
+        ends = np.where(
+            next_episodes < self._episode_tails[envs],
+            self._episode_steps(
+                self._episode_starts[next_episodes % self.buffer_size, envs]
+            ),
+            self._current_starts[envs],
+        )
+        return starts, ends
+
+    @property
+    def num_episodes(self) -> int:
+        """Get the number of complete episodes stored in the buffer"""
+        self._evict_episodes()
+        return int((self._episode_tails - self._episode_heads).sum())
+
+    def _last_episode_refs(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most recently completed episodes in the index, oldest first
+
+        :param k: the number of episodes
+        :return: the environment of each episode and the number of episodes the environment
+            completed before it
+        """
+        self._evict_episodes()
+        counts = np.minimum(self._episode_tails - self._episode_heads, k)
+        envs = np.repeat(np.arange(self.num_envs), counts)
+        # Offsets from the newest episode of each environment
+        offsets = np.arange(len(envs)) - np.repeat(np.cumsum(counts), counts)
+        episodes = self._episode_tails[envs] + offsets
+        # Merge the environments by the step the episodes ended on
+        order = np.argsort(self._episode_bounds(envs, episodes)[1], kind="stable")
+        order = order[max(len(order) - k, 0) :]
+        return envs[order], episodes[order]
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Gather the fields of the transitions at the given indices
+
+        :param batch_inds: the indices of the transitions, of any shape
+        :param fields: the fields to gather
+        :return: the gathered fields (*batch_inds.shape, [num_envs], ...)
+        """
+        return {name: getattr(self, name)[batch_inds] for name in fields}
+
+    def _get_episodes(
+        self,
+        envs: np.ndarray,
+        episodes: np.ndarray,
+        dtype: Union[str, TrajectoryType],
+    ) -> List[Trajectories]:
+        """Gather the transitions of the given episodes in the index"""
+        if isinstance(dtype, str):
+            dtype = TrajectoryType(dtype.lower())
+
+        trajectories = []
+        for env, start, end in zip(envs, *self._episode_bounds(envs, episodes)):
+            steps = np.arange(start, end) % self.buffer_size
+            samples = self._get_samples(steps, TRAJECTORY_FIELDS)
+            if self.num_envs > 1:
+                samples = {
+                    name: _map_arrays(lambda array: array[:, env], data)
+                    for name, data in samples.items()
+                }
+            trajectories.append(
+                self._trajectories_class(
+                    **{
+                        name: self._to_compute_dtype(name, data, dtype)
+                        for name, data in samples.items()
+                    }
+                )
+            )
+        return trajectories
+
+    def sample_episodes(
+        self, k: int, dtype: Union[str, TrajectoryType] = "torch"
+    ) -> List[Trajectories]:
+        """
+        Sample complete episodes uniformly, with replacement, from the episode index
+        rather than by scanning the done flags
+
+        :param k: the number of episodes to sample
+        :param dtype: whether to return the trajectories as "numpy" or "torch", default torch
+        :return: the transitions of each episode (episode_length, ...), without the num_envs axis
+        """
+        self._evict_episodes()
+        counts = self._episode_tails - self._episode_heads
+        total = int(counts.sum())
+        if total == 0:
+            raise RuntimeError("No complete episodes are stored in the buffer")
+        ends = np.cumsum(counts)
+        samples = np.random.randint(0, total, size=k)
+        envs = np.searchsorted(ends, samples, side="right")
+        offsets = samples - (ends - counts)[envs]
+        return self._get_episodes(envs, self._episode_heads[envs] + offsets, dtype)
+
+    def last_episodes(
+        self, k: int, dtype: Union[str, TrajectoryType] = "torch"
+    ) -> List[Trajectories]:
+        """
+        Get the k most recently completed episodes stored, oldest first
+
+        :param k: the number of episodes, fewer are returned if fewer are stored
+        :param dtype: whether to return the trajectories as "numpy" or "torch", default torch
+        :return: the transitions of each episode (episode_length, ...), without the num_envs axis
+        """
+        return self._get_episodes(*self._last_episode_refs(k), dtype)
+
+    def episode_summaries(self, k: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Get the returns and lengths of the k most recently completed episodes stored,
+        oldest first, from the episode index without reading the transitions
+
+        :param k: the number of episodes, all stored episodes if None
+        :return: the episode "returns" (k, reward_size), "lengths" (k,) and "envs" (k,),
+            the environment each episode was collected in
+        """
+        envs, episodes = self._last_episode_refs(self.num_episodes if k is None else k)
+        starts, ends = self._episode_bounds(envs, episodes)
+        return {
+            "returns": self._episode_returns[episodes % self.buffer_size, envs],
+            "lengths": ends - starts,
+            "envs": envs,
+        }
 
     @abstractmethod
     def add_trajectory(
@@ -221,6 +577,156 @@ class BaseBuffer(ABC):
         :return: the sampled trajectories
         """
 
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Sample the indices of several batches at once and gather the requested fields
+
+        :param num_batches: the number of batches
+        :param batch_size: the batch size
+        :param fields: the fields to gather
+        :return: the gathered fields (num_batches, batch_size, [num_envs], ...), or None if
+            the buffer only samples batch by batch
+        """
+        return None
+
+    def sample_many(
+        self,
+        num_batches: int,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+        fields: Optional[Sequence[str]] = None,
+    ) -> Iterator[Trajectories]:
+        """
+        Sample several batches of trajectories, e.g. one for each epoch of a training step.
+        The indices of every batch are drawn at once, each field is gathered into a single
+        (num_batches, batch_size, ...) block and moved to the device once, then each batch is
+        yielded as a view of the block. Buffers which can't gather the batches together
+        fall back to calling `sample` for each batch.
+
+        :param num_batches: the number of batches
+        :param batch_size: the batch size
+        :param flatten_env: useful for multiple environments, whether to sample with the num_envs axis
+        :param dtype: whether to return the trajectories as "numpy" or "torch", default torch
+        :param fields: optional names of the fields to sample, the other fields are None,
+            all fields are sampled if None
+        :return: iterator over the sampled trajectories
+        """
+        fields = TRAJECTORY_FIELDS if fields is None else tuple(fields)
+        unknown = set(fields) - set(TRAJECTORY_FIELDS)
+        assert not unknown, f"Unknown trajectory fields {unknown}"
+        if isinstance(dtype, str):
+            dtype = TrajectoryType(dtype.lower())
+
+        block = self._sample_block(num_batches, batch_size, fields)
+        if block is None:
+            skipped = {name: None for name in TRAJECTORY_FIELDS if name not in fields}
+            for _ in range(num_batches):
+                yield replace(self.sample(batch_size, flatten_env, dtype), **skipped)
+            return
+
+        for name, data in block.items():
+            if self.num_envs > 1:
+                if flatten_env:
+                    # As in `_flatten_env_axis`, keep batch_size transitions in total
+                    data = data[:, -(batch_size // self.num_envs) :]
+                    data = data.reshape((num_batches, -1) + data.shape[3:])
+                else:
+                    data = data.swapaxes(1, 2)
+            block[name] = self._to_compute_dtype(name, data, dtype)
+
+        trajectories_class = NStepTrajectories if "discounts" in block else Trajectories
+        for i in range(num_batches):
+            batch = dict.fromkeys(TRAJECTORY_FIELDS)
+            batch.update((name, data[i]) for name, data in block.items())
+            yield trajectories_class(**batch)
+
+    def _sequence_layout(self, data: np.ndarray, flatten_env: bool) -> np.ndarray:
+        """
+        Move the num_envs axis of sampled windows to the front or flatten it into the batch,
+        keeping batch_size windows in total as in `_flatten_env_axis`
+
+        :param data: the windows (batch_size, seq_len, [num_envs], ...)
+        :return: the windows (num_envs, batch_size, seq_len, ...) or (batch_size, seq_len, ...)
+        """
+        if self.num_envs == 1:
+            return data
+        if flatten_env:
+            num_windows = data.shape[0] // self.num_envs
+            data = np.moveaxis(data[-num_windows:], 2, 1)
+            return data.reshape((num_windows * self.num_envs,) + data.shape[2:])
+        return np.moveaxis(data, 2, 0)
+
+    def sample_sequences(
+        self,
+        batch_size: int,
+        seq_len: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Tuple[Trajectories, Union[np.ndarray, T.Tensor]]:
+        """
+        Sample windows of consecutive transitions, e.g. for recurrent policies or n-step targets.
+        The windows start on uniformly sampled transitions and each field is gathered once with
+        a (batch_size, seq_len) index grid. Windows can run past the end of their episode or
+        past the newest transition, the mask flags the steps still in the window's episode and
+        in the buffer.
+
+        :param batch_size: the number of windows
+        :param seq_len: the number of transitions in each window
+        :param flatten_env: useful for multiple environments, whether to sample with the num_envs axis
+        :param dtype: whether to return the trajectories as "numpy" or "torch", default torch
+        :return: the windows (batch_size, seq_len, ...) and their boolean validity mask
+            (batch_size, seq_len, 1), with a leading num_envs axis unless it's flattened
+        """
+        assert (
+            seq_len <= self.buffer_size
+        ), f"Windows of {seq_len} transitions don't fit in a buffer of {self.buffer_size}"
+        if isinstance(dtype, str):
+            dtype = TrajectoryType(dtype.lower())
+
+        # Absolute steps of the stored transitions
+        first_step = max(
+            self._num_steps - self.buffer_size + self._overwritten_ahead, 0
+        )
+        if self._num_steps <= first_step:
+            raise RuntimeError("No transitions have been added to the buffer")
+        starts = np.random.randint(first_step, self._num_steps, size=batch_size)
+        steps = starts[:, np.newaxis] + np.arange(seq_len)
+
+        samples = self._get_samples(
+            (steps % self.buffer_size).ravel(), TRAJECTORY_FIELDS
+        )
+        samples = {
+            name: _map_arrays(
+                lambda array: array.reshape((batch_size, seq_len) + array.shape[1:]),
+                data,
+            )
+            for name, data in samples.items()
+        }
+        # A window leaves its episode on the step after a done
+        dones = samples["dones"].reshape(batch_size, seq_len, self.num_envs) != 0
+        ended = (np.cumsum(dones, axis=1) - dones) > 0
+        mask = (steps < self._num_steps)[:, :, np.newaxis] & ~ended
+        mask = self._sequence_layout(mask.reshape(samples["dones"].shape), flatten_env)
+
+        trajectories = self._trajectories_class(
+            **{
+                name: self._to_compute_dtype(
+                    name,
+                    _map_arrays(
+                        lambda array: self._sequence_layout(array, flatten_env), data
+                    ),
+                    dtype,
+                )
+                for name, data in samples.items()
+            }
+        )
+        if dtype == TrajectoryType.TORCH:
+            mask = T.from_numpy(mask).to(settings.DEVICE, non_blocking=True)
+        return trajectories, mask
+
     @abstractmethod
     def last(
         self,
@@ -0,0 +1,350 @@
+import lzma
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from gym import Env
+
+from pearll.buffers.base_buffer import TRAJECTORY_FIELDS
+from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.common.enumerations import CompressionCodec, TrajectoryType
+from pearll.common.type_aliases import Observation, Trajectories
+from pearll.settings import CompressionSettings, StorageSettings
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Arrays of a chunk by field
+Chunk = Dict[str, np.ndarray]
+
+# Fields stored in the chunks, next observations use the next observation trick
+_CHUNK_FIELDS = ("observations", "actions", "rewards", "dones")
+
+
+def _get_codec(
+    codec: CompressionCodec, level: Optional[int]
+) -> Tuple[Callable[[memoryview], bytes], Callable[[bytes], bytes]]:
+    """Get the compression and decompression functions of a codec"""
+    if codec == CompressionCodec.ZLIB:
+        level = 1 if level is None else level
+        return lambda data: zlib.compress(data, level), zlib.decompress
+    if codec == CompressionCodec.LZMA:
+        level = 0 if level is None else level
+        return lambda data: lzma.compress(data, preset=level), lzma.decompress
+    if lz4_frame is None:
+        raise ImportError("The lz4 codec requires the lz4 package to be installed")
+    level = 0 if level is None else level
+    return (
+        lambda data: lz4_frame.compress(data, compression_level=level),
+        lz4_frame.decompress,
+    )
+
+
+class CompressedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer which compresses cold transitions to trade CPU for memory in long running
+    off-policy jobs. Transitions are grouped into fixed size chunks. Once the buffer moves on
+    from a chunk, the chunk is compressed in a thread pool, and the raw chunk is kept only
+    until compression finishes. Sampling only decompresses the chunks the batch touches, in
+    the thread pool, and keeps the most recently used decompressed chunks in an LRU cache.
+    The chunks being written stay uncompressed.
+
+    Larger chunks compress better, while smaller chunks decode less data per sampled
+    transition. The compression ratio, memory use and decode latency are recorded in `stats()`.
+    The transitions only live in the chunks, so the `observations`, `actions`, `rewards` and
+    `dones` arrays aren't used.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in the buffer
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
+    :param compression_settings: the chunk compression settings
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        buffer_size: int,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
+        compression_settings: CompressionSettings = CompressionSettings(),
+    ) -> None:
+        super().__init__(env, buffer_size, reward_size, storage_settings)
+        self.chunk_size = compression_settings.chunk_size
+        self.cache_size = compression_settings.cache_size
+        codec = compression_settings.codec
+        if isinstance(codec, str):
+            codec = CompressionCodec(codec.lower())
+        self._compress, self._decompress = _get_codec(codec, compression_settings.level)
+        self._row_specs = {
+            name: (getattr(self, name).shape[1:], getattr(self, name).dtype)
+            for name in _CHUNK_FIELDS
+        }
+        for name in _CHUNK_FIELDS:
+            setattr(self, name, None)
+        self._executor = ThreadPoolExecutor(compression_settings.num_threads)
+        self._init_chunks()
+
+    def _observation_storage_shape(self) -> Tuple[int, ...]:
+        # Observations are stored in the chunks
+        return (0,) + self.obs_shape
+
+    def _init_chunks(self) -> None:
+        # Chunks being written
+        self._open: Dict[int, Chunk] = {}
+        # Chunks being compressed, kept raw until compression finishes
+        self._sealing: Dict[int, Tuple[Chunk, Future]] = {}
+        self._compressed: Dict[int, Dict[str, bytes]] = {}
+        self._cache: "OrderedDict[int, Chunk]" = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Reset the decoding statistics"""
+        self._num_lookups = 0
+        self._num_hits = 0
+        self._num_decoded = 0
+        self._decode_time = 0.0
+        self._num_encoded = 0
+        self._encode_time = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the compression statistics
+
+        :return: the number of compressed chunks, their raw and compressed sizes in bytes and
+            the compression ratio, the bytes used by all the chunks and the cache, the cache hit
+            rate of chunk lookups when sampling and the mean seconds to encode and decode a chunk
+        """
+        self._collect_sealed()
+        compressed_bytes = sum(
+            len(data) for chunk in self._compressed.values() for data in chunk.values()
+        )
+        raw_bytes = sum(
+            self._chunk_nbytes(chunk_id) for chunk_id in self._compressed.keys()
+        )
+        raw_chunks = list(self._open.values()) + [
+            raw for raw, _ in self._sealing.values()
+        ]
+        memory_bytes = compressed_bytes + sum(
+            array.nbytes
+            for chunk in raw_chunks + list(self._cache.values())
+            for array in chunk.values()
+        )
+        return {
+            "num_compressed_chunks": len(self._compressed),
+            "raw_bytes": raw_bytes,
+            "compressed_bytes": compressed_bytes,
+            "compression_ratio": raw_bytes / max(compressed_bytes, 1),
+            "memory_bytes": memory_bytes,
+            "cache_hit_rate": self._num_hits / max(self._num_lookups, 1),
+            "mean_encode_latency": self._encode_time / max(self._num_encoded, 1),
+            "mean_decode_latency": self._decode_time / max(self._num_decoded, 1),
+        }
+
+    def _chunk_length(self, chunk_id: int) -> int:
+        return min(self.chunk_size, self.buffer_size - chunk_id * self.chunk_size)
+
+    def _chunk_nbytes(self, chunk_id: int) -> int:
+        length = self._chunk_length(chunk_id)
+        return sum(
+            length * int(np.prod(shape)) * dtype.itemsize
+            for shape, dtype in self._row_specs.values()
+        )
+
+    def _encode(self, chunk: Chunk) -> Tuple[Dict[str, bytes], float]:
+        start = time.perf_counter()
+        data = {
+            name: self._compress(memoryview(np.ascontiguousarray(array)).cast("B"))
+            for name, array in chunk.items()
+        }
+        return data, time.perf_counter() - start
+
+    def _decode(self, chunk_id: int) -> Tuple[Chunk, float]:
+        start = time.perf_counter()
+        length = self._chunk_length(chunk_id)
+        chunk = {}
+        for name, data in self._compressed[chunk_id].items():
+            shape, dtype = self._row_specs[name]
+            chunk[name] = np.frombuffer(self._decompress(data), dtype=dtype).reshape(
+                (length,) + shape
+            )
+        return chunk, time.perf_counter() - start
+
+    def _collect_sealed(self, wait: bool = False) -> None:
+        """Store the chunks which have finished compressing and free their raw arrays"""
+        for chunk_id, (_, future) in list(self._sealing.items()):
+            if wait or future.done():
+                data, seconds = future.result()
+                self._compressed[chunk_id] = data
+                self._num_encoded += 1
+                self._encode_time += seconds
+                del self._sealing[chunk_id]
+
+    def flush(self) -> None:
+        """Wait for the chunks being compressed"""
+        self._collect_sealed(wait=True)
+
+    def _seal(self, chunk_id: int) -> None:
+        """Compress a chunk in the background once the buffer has moved on from it"""
+        chunk = self._open.pop(chunk_id)
+        self._sealing[chunk_id] = (chunk, self._executor.submit(self._encode, chunk))
+
+    def _writable(self, chunk_id: int) -> Chunk:
+        """Get a chunk to write to, reopening it if it has been compressed"""
+        chunk = self._open.get(chunk_id)
+        if chunk is not None:
+            return chunk
+        if chunk_id in self._sealing:
+            chunk, future = self._sealing.pop(chunk_id)
+            # Don't write while the chunk is being read by the compression
+            future.result()
+        elif chunk_id in self._compressed:
+            chunk, _ = self._decode(chunk_id)
+            chunk = {name: array.copy() for name, array in chunk.items()}
+        else:
+            length = self._chunk_length(chunk_id)
+            chunk = {
+                name: np.zeros((length,) + shape, dtype=dtype)
+                for name, (shape, dtype) in self._row_specs.items()
+            }
+        self._compressed.pop(chunk_id, None)
+        self._cache.pop(chunk_id, None)
+        self._open[chunk_id] = chunk
+        return chunk
+
+    def _load(self, chunk_ids: Sequence[int]) -> Dict[int, Chunk]:
+        """Get the chunks to read from, decompressing the missing ones in the thread pool"""
+        self._collect_sealed()
+        chunks = {}
+        missing = []
+        for chunk_id in chunk_ids:
+            if chunk_id in self._open:
+                chunks[chunk_id] = self._open[chunk_id]
+            elif chunk_id in self._sealing:
+                chunks[chunk_id] = self._sealing[chunk_id][0]
+            else:
+                self._num_lookups += 1
+                if chunk_id in self._cache:
+                    self._num_hits += 1
+                    self._cache.move_to_end(chunk_id)
+                    chunks[chunk_id] = self._cache[chunk_id]
+                else:
+                    missing.append(chunk_id)
+
+        for chunk_id, (chunk, seconds) in zip(
+            missing, self._executor.map(self._decode, missing)
+        ):
+            self._num_decoded += 1
+            self._decode_time += seconds
+            chunks[chunk_id] = chunk
+            self._cache[chunk_id] = chunk
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return chunks
+
+    def reset(self) -> None:
+        self.pos = 0
+        self.full = False
+        self.flush()
+        self._init_chunks()
+        self._init_episode_index()
+
+    def add_trajectory(
+        self,
+        observation: Observation,
+        action: Union[np.ndarray, int],
+        reward: Union[float, np.ndarray],
+        next_observation: Observation,
+        done: Union[bool, np.ndarray],
+    ) -> None:
+        chunk_id, row = divmod(self.pos, self.chunk_size)
+        chunk = self._writable(chunk_id)
+        chunk["observations"][row] = observation
+        chunk["actions"][row] = np.array(action).reshape(chunk["actions"].shape[1:])
+        chunk["rewards"][row] = np.array(reward).reshape(chunk["rewards"].shape[1:])
+        chunk["dones"][row] = np.array(done).reshape(chunk["dones"].shape[1:])
+        next_chunk_id, next_row = divmod(
+            (self.pos + 1) % self.buffer_size, self.chunk_size
+        )
+        self._writable(next_chunk_id)["observations"][next_row] = next_observation
+
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+        if next_chunk_id != chunk_id:
+            self._seal(chunk_id)
+        self._collect_sealed()
+        self._record_step(done)
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """Gather the fields of the transitions at the given indices from their chunks"""
+        inds = batch_inds.ravel()
+        next_inds = (inds + 1) % self.buffer_size
+        chunk_inds, rows = np.divmod(inds, self.chunk_size)
+        next_chunk_inds, next_rows = np.divmod(next_inds, self.chunk_size)
+        chunks = self._load(np.unique(np.concatenate([chunk_inds, next_chunk_inds])))
+
+        samples = {}
+        for name in fields:
+            source = "observations" if name == "next_observations" else name
+            shape, dtype = self._row_specs[source]
+            samples[name] = np.empty((len(inds),) + shape, dtype=dtype)
+        for chunk_id, chunk in chunks.items():
+            mask = chunk_inds == chunk_id
+            next_mask = next_chunk_inds == chunk_id
+            for name in fields:
+                if name == "next_observations":
+                    samples[name][next_mask] = chunk["observations"][
+                        next_rows[next_mask]
+                    ]
+                else:
+                    samples[name][mask] = chunk[name][rows[mask]]
+        return {
+            name: data.reshape(batch_inds.shape + data.shape[1:])
+            for name, data in samples.items()
+        }
+
+    def _transform_inds(
+        self,
+        flatten_env: bool,
+        dtype: Union[str, TrajectoryType],
+        batch_inds: np.ndarray,
+    ) -> Trajectories:
+        samples = self._get_samples(batch_inds, TRAJECTORY_FIELDS)
+        return self._transform_samples(flatten_env, dtype, **samples)
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        return self._transform_inds(flatten_env, dtype, self._sample_inds(batch_size))
+
+    def last(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        assert batch_size < self.buffer_size
+
+        batch_inds = np.arange(self.pos - batch_size, self.pos) % self.buffer_size
+        return self._transform_inds(flatten_env, dtype, batch_inds)
+
+    def all(
+        self, flatten_env: bool = False, dtype: Union[str, TrajectoryType] = "torch"
+    ) -> Trajectories:
+        return self._transform_inds(flatten_env, dtype, np.arange(self.pos))
+
+    def close(self) -> None:
+        """Stop the compression threads"""
+        self._executor.shutdown()
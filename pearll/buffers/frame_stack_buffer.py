@@ -0,0 +1,179 @@
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from gym import Env
+
+from pearll.buffers.base_buffer import TRAJECTORY_FIELDS
+from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.common.enumerations import TrajectoryType
+from pearll.common.type_aliases import Trajectories
+from pearll.settings import StorageSettings
+
+
+class FrameStackBuffer(ReplayBuffer):
+    """
+    Replay buffer for stacked image observations, e.g. Atari frames stacked for the `CNNEncoder`.
+    Storing the stacked observations in a `ReplayBuffer` keeps every frame `frame_stack` times,
+    instead each frame is stored once and the stacks are rebuilt when sampling with vectorized
+    index arithmetic. The same next observation trick as `ReplayBuffer` is used, so the
+    `observations` array holds the newest frame of each observation.
+
+    Observations are stacked along their first axis, the last `frame_stack`th of which is the
+    newest frame. A stack never reaches back past the start of its episode, given by `dones`,
+    or past the oldest frame still in the buffer; the first frame is repeated instead, the same
+    padding as gym's `FrameStack` wrapper after a reset.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in the buffer
+    :param frame_stack: the number of frames stacked in each observation
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        buffer_size: int,
+        frame_stack: int = 4,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
+    ) -> None:
+        self.frame_stack = frame_stack
+        super().__init__(env, buffer_size, reward_size, storage_settings)
+        # Index of the newest frame in an observation
+        self._newest = (slice(None),) * self._env_axes + (
+            slice(-self._frame_channels, None),
+        )
+
+    @property
+    def _env_axes(self) -> int:
+        return 1 if self.num_envs > 1 else 0
+
+    @property
+    def _frame_channels(self) -> int:
+        stack_size = self.obs_shape[self._env_axes]
+        assert (
+            stack_size % self.frame_stack == 0
+        ), f"Observation axis of size {stack_size} can't hold {self.frame_stack} frames"
+        return stack_size // self.frame_stack
+
+    def _observation_storage_shape(self) -> Tuple[int, ...]:
+        env_axes = self._env_axes
+        return (
+            (self.buffer_size,)
+            + self.obs_shape[:env_axes]
+            + (self._frame_channels,)
+            + self.obs_shape[env_axes + 1 :]
+        )
+
+    def add_trajectory(
+        self,
+        observation: np.ndarray,
+        action: Union[np.ndarray, int],
+        reward: Union[float, np.ndarray],
+        next_observation: np.ndarray,
+        done: Union[bool, np.ndarray],
+    ) -> None:
+        super().add_trajectory(
+            np.asarray(observation)[self._newest],
+            action,
+            reward,
+            np.asarray(next_observation)[self._newest],
+            done,
+        )
+
+    def _ages(self, batch_inds: np.ndarray) -> np.ndarray:
+        """Get how many older frames are still stored before each index"""
+        oldest = (self.pos + 1) % self.buffer_size if self.full else 0
+        return (batch_inds - oldest) % self.buffer_size
+
+    def _stack(self, batch_inds: np.ndarray, ages: np.ndarray) -> np.ndarray:
+        """
+        Rebuild the stacked observations at the given indices
+
+        :param batch_inds: the indices of the observations (batch_size,)
+        :param ages: how many older frames are still stored before each index (batch_size,)
+        :return: the stacked observations (batch_size, [num_envs], ...)
+        """
+        dones = self.dones.reshape(self.buffer_size, -1)
+        # Steps of each frame in the stacks, not yet wrapped around the buffer
+        steps = batch_inds[:, np.newaxis] + np.arange(1 - self.frame_stack, 1)
+        first_steps = (batch_inds - ages)[:, np.newaxis]
+        # An episode ending on a step starts on the next one
+        episode_starts = np.where(
+            dones[steps[:, :-1] % self.buffer_size] != 0,
+            steps[:, :-1, np.newaxis] + 1,
+            first_steps[:, np.newaxis],
+        )
+        first_steps = np.maximum(
+            episode_starts.max(axis=1, initial=np.iinfo(np.int64).min), first_steps
+        )
+        steps = np.maximum(steps[:, :, np.newaxis], first_steps[:, np.newaxis])
+        steps %= self.buffer_size
+
+        batch_size = len(batch_inds)
+        if self.num_envs > 1:
+            # (batch_size, frame_stack, num_envs, ...) -> (batch_size, num_envs, frame_stack, ...)
+            frames = self.observations[steps, np.arange(self.num_envs)].swapaxes(1, 2)
+            return frames.reshape((batch_size,) + self.obs_shape)
+        frames = self.observations[steps[..., 0]]
+        return frames.reshape((batch_size,) + self.obs_shape)
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """Gather the fields of the transitions at the given indices (batch_size,)"""
+        ages = self._ages(batch_inds)
+        samples = {}
+        for name in fields:
+            if name == "observations":
+                samples[name] = self._stack(batch_inds, ages)
+            elif name == "next_observations":
+                samples[name] = self._stack(
+                    (batch_inds + 1) % self.buffer_size, ages + 1
+                )
+            else:
+                samples[name] = getattr(self, name)[batch_inds]
+        return samples
+
+    def _transform_inds(
+        self,
+        flatten_env: bool,
+        dtype: Union[str, TrajectoryType],
+        batch_inds: np.ndarray,
+    ) -> Trajectories:
+        samples = self._get_samples(batch_inds, TRAJECTORY_FIELDS)
+        return self._transform_samples(flatten_env, dtype, **samples)
+
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        samples = self._get_samples(self._sample_inds(num_batches * batch_size), fields)
+        return {
+            name: data.reshape((num_batches, batch_size) + data.shape[1:])
+            for name, data in samples.items()
+        }
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        return self._transform_inds(flatten_env, dtype, self._sample_inds(batch_size))
+
+    def last(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        assert batch_size < self.buffer_size
+
+        batch_inds = np.arange(self.pos - batch_size, self.pos) % self.buffer_size
+        return self._transform_inds(flatten_env, dtype, batch_inds)
+
+    def all(
+        self, flatten_env: bool = False, dtype: Union[str, TrajectoryType] = "torch"
+    ) -> Trajectories:
+        return self._transform_inds(flatten_env, dtype, np.arange(self.pos))
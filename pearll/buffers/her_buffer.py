@@ -1,4 +1,4 @@
-from typing import Dict, Tuple, Union
+from typing import Dict, Sequence, Tuple, Union
 
 import numpy as np
 import torch as T
@@ -20,6 +20,8 @@ class HERBuffer(BaseBuffer):
     goals every time we add transitions, instead we do it all at once when
     sampling for vectorized (fast) processing.
 
+    The episode and sequence queries give the stored goals and rewards, without relabelling.
+
     TODO: DOES NOT YET SUPPORT MULTIPLE ENVIRONEMTS!! More testing needed for this.
 
     :param env: the environment
@@ -28,6 +30,10 @@ class HERBuffer(BaseBuffer):
     :param n_sampled_goal: ratio of HER data to data coming from normal experience replay
     """
 
+    # The oldest observation is overwritten by the newest next observation
+    _overwritten_ahead = 1
+    _trajectories_class = DictTrajectories
+
     def __init__(
         self,
         env: GoalEnv,
@@ -60,6 +66,8 @@ class HERBuffer(BaseBuffer):
             self.desired_goals,
             self.next_achieved_goals,
             self.index_episode_map,
+            self._episode_starts,
+            self._episode_returns,
         )
 
         if isinstance(goal_selection_strategy, str):
@@ -119,6 +127,28 @@ class HERBuffer(BaseBuffer):
         if self.pos == self.buffer_size:
             self.full = True
             self.pos = 0
+        self._record_step(done)
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, Union[np.ndarray, Dict[str, np.ndarray]]]:
+        samples = {}
+        for name in fields:
+            if name == "observations":
+                samples[name] = {
+                    "observation": self.observations[batch_inds],
+                    "desired_goal": self.desired_goals[batch_inds],
+                }
+            elif name == "next_observations":
+                samples[name] = {
+                    "observation": self.observations[
+                        (batch_inds + 1) % self.buffer_size
+                    ],
+                    "desired_goal": self.desired_goals[batch_inds],
+                }
+            else:
+                samples[name] = getattr(self, name)[batch_inds]
+        return samples
 
     def _sample_goals(self, her_inds: np.ndarray) -> np.ndarray:
         """
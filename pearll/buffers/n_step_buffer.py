@@ -0,0 +1,132 @@
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+from gym import Env
+
+from pearll.buffers.base_buffer import TRAJECTORY_FIELDS
+from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.common.enumerations import TrajectoryType
+from pearll.common.type_aliases import NStepTrajectories
+from pearll.settings import StorageSettings
+
+# Fields replaced by their n-step targets
+_N_STEP_FIELDS = ("rewards", "next_observations", "dones")
+
+
+class NStepReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer sampling n-step transitions for off-policy algorithms. The rewards of a sampled
+    transition are the discounted sum of up to `n_step` rewards, the next observation is the
+    observation to bootstrap from and the done flag is whether the episode ended before it.
+    A window stops early at the end of its episode or at the newest transition, so each
+    transition also gets the discount to bootstrap with, `gamma ** k` after k steps, in the
+    `discounts` of the `NStepTrajectories` to pass to `TD_zero`. The windows of a whole batch
+    are gathered at once when sampling, so the transitions are stored exactly as in a
+    `ReplayBuffer`.
+
+    Only `sample` and `sample_many` give n-step transitions, `last`, `all` and the episode and
+    sequence queries give the stored one-step transitions.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in the buffer
+    :param n_step: the max number of rewards summed in each return
+    :param gamma: the discount of the returns, should match the agent's `td_gamma`
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        buffer_size: int,
+        n_step: int = 3,
+        gamma: float = 0.99,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
+    ) -> None:
+        assert (
+            1 <= n_step < buffer_size
+        ), f"n_step should be between 1 and {buffer_size - 1}, got {n_step}"
+        super().__init__(env, buffer_size, reward_size, storage_settings)
+        self.n_step = n_step
+        self.gamma = gamma
+        self.compute_dtypes["discounts"] = np.dtype(np.float32)
+
+    def _n_step_targets(self, batch_inds: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Compute the n-step targets of the transitions at the given indices from a single
+        gather of the windows following them
+
+        :param batch_inds: the indices of the transitions, of any shape
+        :return: the discounted reward sums "rewards", the observations to bootstrap from
+            "next_observations", whether the episode ended within the window "dones" and the
+            discounts to bootstrap with "discounts" (*batch_inds.shape, [num_envs], ...)
+        """
+        window_axis = batch_inds.ndim
+        env_axes = (1,) * (self.dones.ndim - 1)
+        offsets = np.arange(self.n_step)
+        window_inds = (batch_inds[..., np.newaxis] + offsets) % self.buffer_size
+
+        # Number of transitions stored from each index up to the newest one
+        num_stored = (self.pos - batch_inds - 1) % self.buffer_size + 1
+        stored = offsets < num_stored[..., np.newaxis]
+        dones = self.dones[window_inds] != 0
+        # A window stops after the first done
+        ended = (np.cumsum(dones, axis=window_axis) - dones) > 0
+        valid = stored.reshape(stored.shape + env_axes) & ~ended
+        num_steps = valid.sum(axis=window_axis)
+
+        step_discounts = (self.gamma ** offsets).reshape((-1,) + env_axes)
+        returns = (self.rewards[window_inds] * (valid * step_discounts)).sum(
+            axis=window_axis
+        )
+        # The next observation of the last step in each window, one per environment
+        bootstrap_inds = (
+            batch_inds.reshape(batch_inds.shape + env_axes) + num_steps
+        ) % self.buffer_size
+        if self.num_envs > 1:
+            next_observations = self.observations[
+                bootstrap_inds[..., 0], np.arange(self.num_envs)
+            ]
+        else:
+            next_observations = self.observations[bootstrap_inds[..., 0]]
+
+        return {
+            "rewards": returns,
+            "next_observations": next_observations,
+            "dones": (valid & dones).any(axis=window_axis).astype(self.dones.dtype),
+            "discounts": self.gamma ** num_steps,
+        }
+
+    def _get_n_step_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """Gather the fields of the n-step transitions at the given indices, with their discounts"""
+        samples = self._get_samples(
+            batch_inds, [name for name in fields if name not in _N_STEP_FIELDS]
+        )
+        if any(name in _N_STEP_FIELDS for name in fields):
+            targets = self._n_step_targets(batch_inds)
+            for name in fields:
+                if name in _N_STEP_FIELDS:
+                    samples[name] = targets[name]
+            samples["discounts"] = targets["discounts"]
+        return samples
+
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        return self._get_n_step_samples(
+            self._sample_inds((num_batches, batch_size)), fields
+        )
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> NStepTrajectories:
+        samples = self._get_n_step_samples(
+            self._sample_inds(batch_size), TRAJECTORY_FIELDS
+        )
+        return self._transform_samples(flatten_env, dtype, **samples)
@@ -0,0 +1,149 @@
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+from gym import Env
+
+from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.common.enumerations import TrajectoryType
+from pearll.common.type_aliases import Observation, Trajectories
+from pearll.settings import StorageSettings
+
+# Fields of a packed row
+_ROW_FIELDS = ("observations", "actions", "rewards", "next_observations", "dones")
+
+
+class PackedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer storing each transition in a single packed row rather than one array per field.
+    The rows form a numpy structured array, so sampling is one gather of contiguous rows and the
+    fields of the batch are zero-copy column views of the gathered rows. With the
+    struct-of-arrays layout of `ReplayBuffer` each field is gathered separately from a different
+    region of memory, which gets cache-hostile for large buffers.
+
+    Rows hold their next observation so a transition never spans two rows. This costs the
+    memory of a second observation array, unlike the next observation trick of `ReplayBuffer`,
+    so the packed layout suits small observations best. The `observations`, `actions`,
+    `rewards`, `dones` and `next_observations` attributes are views of the rows.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in the buffer
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
+    """
+
+    _overwritten_ahead = 0
+
+    def __init__(
+        self,
+        env: Env,
+        buffer_size: int,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
+    ) -> None:
+        super().__init__(env, buffer_size, reward_size, storage_settings)
+        # Aligned fields keep the column strides a multiple of each field's item size
+        self.row_dtype = np.dtype(
+            [
+                ("observations", self.observations.dtype, self.obs_shape),
+                ("actions", self.actions.dtype, self.action_shape),
+                ("rewards", self.rewards.dtype, self.rewards.shape[1:]),
+                ("next_observations", self.observations.dtype, self.obs_shape),
+                ("dones", self.dones.dtype, self.dones.shape[1:]),
+            ],
+            align=True,
+        )
+        self._allocate_rows()
+        self._check_system_memory(
+            self.rows, self._episode_starts, self._episode_returns
+        )
+
+    def _allocate_rows(self) -> None:
+        """Allocate the rows and point the field attributes at their columns"""
+        self.rows = np.zeros(self.buffer_size, dtype=self.row_dtype)
+        # numpy gathers plain bytes much faster than structured items
+        self._row_bytes = self.rows.view(np.uint8).reshape(self.buffer_size, -1)
+        for name in _ROW_FIELDS:
+            setattr(self, name, self.rows[name])
+
+    def _gather(self, inds: np.ndarray) -> np.ndarray:
+        """Gather the rows at the indices with a single copy"""
+        rows = np.take(self._row_bytes, inds, axis=0)
+        return rows.view(self.row_dtype).reshape(inds.shape)
+
+    def reset(self) -> None:
+        self.pos = 0
+        self.full = False
+        self._allocate_rows()
+        self._init_episode_index()
+
+    def add_trajectory(
+        self,
+        observation: Observation,
+        action: Union[np.ndarray, int],
+        reward: Union[float, np.ndarray],
+        next_observation: Observation,
+        done: Union[bool, np.ndarray],
+    ) -> None:
+        row = self.rows[self.pos]
+        row["observations"] = observation
+        row["actions"] = np.array(action).reshape(self.action_shape)
+        row["rewards"] = np.array(reward).reshape(self.rewards.shape[1:])
+        row["next_observations"] = next_observation
+        row["dones"] = np.array(done).reshape(self.dones.shape[1:])
+
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+        self._record_step(done)
+
+    def _sample_inds(self, size: Union[int, tuple]) -> np.ndarray:
+        # Every row holds a complete transition
+        upper_bound = self.buffer_size if self.full else self.pos
+        return np.random.randint(0, upper_bound, size=size)
+
+    def _transform_rows(
+        self,
+        flatten_env: bool,
+        dtype: Union[str, TrajectoryType],
+        rows: np.ndarray,
+    ) -> Trajectories:
+        return self._transform_samples(
+            flatten_env, dtype, *(rows[name] for name in _ROW_FIELDS)
+        )
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        rows = self._gather(batch_inds)
+        return {name: rows[name] for name in fields}
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        rows = self._gather(self._sample_inds(batch_size))
+        return self._transform_rows(flatten_env, dtype, rows)
+
+    def last(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        assert batch_size <= self.buffer_size
+
+        start_idx = self.pos - batch_size
+        if start_idx < 0:
+            batch_inds = np.concatenate((np.arange(start_idx, 0), np.arange(self.pos)))
+        else:
+            batch_inds = np.arange(start_idx, self.pos)
+
+        return self._transform_rows(flatten_env, dtype, self._gather(batch_inds))
+
+    def all(
+        self, flatten_env: bool = False, dtype: Union[str, TrajectoryType] = "torch"
+    ) -> Trajectories:
+        return self._transform_rows(flatten_env, dtype, self.rows[: self.pos])
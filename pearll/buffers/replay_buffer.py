@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Dict, Optional, Sequence, Union
 
 import numpy as np
 from gym import Env
@@ -6,6 +6,7 @@ from gym import Env
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.common.enumerations import TrajectoryType
 from pearll.common.type_aliases import Trajectories
+from pearll.settings import StorageSettings
 
 
 class ReplayBuffer(BaseBuffer):
@@ -19,19 +20,33 @@ class ReplayBuffer(BaseBuffer):
 
     :param env: the environment
     :param buffer_size: max number of elements in the buffer
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
     """
 
+    # The oldest observation is overwritten by the newest next observation
+    _overwritten_ahead = 1
+
     def __init__(
         self,
         env: Env,
         buffer_size: int,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
     ) -> None:
         super().__init__(
             env,
             buffer_size,
+            reward_size,
+            storage_settings,
         )
         self._check_system_memory(
-            self.observations, self.actions, self.rewards, self.dones
+            self.observations,
+            self.actions,
+            self.rewards,
+            self.dones,
+            self._episode_starts,
+            self._episode_returns,
         )
 
     def reset(self) -> None:
@@ -55,6 +70,31 @@ class ReplayBuffer(BaseBuffer):
         if self.pos == self.buffer_size:
             self.full = True
             self.pos = 0
+        self._record_step(done)
+
+    def _sample_inds(self, size: Union[int, tuple]) -> np.ndarray:
+        """Sample indices of stored transitions, skipping the write position once full"""
+        if self.full:
+            return (
+                np.random.randint(1, self.buffer_size, size=size) + self.pos
+            ) % self.buffer_size
+        return np.random.randint(0, self.pos, size=size)
+
+    def _get_samples(
+        self, batch_inds: np.ndarray, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        samples = {}
+        for name in fields:
+            if name == "next_observations":
+                samples[name] = self.observations[(batch_inds + 1) % self.buffer_size]
+            else:
+                samples[name] = getattr(self, name)[batch_inds]
+        return samples
+
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        return self._get_samples(self._sample_inds((num_batches, batch_size)), fields)
 
     def sample(
         self,
@@ -62,12 +102,7 @@ class ReplayBuffer(BaseBuffer):
         flatten_env: bool = False,
         dtype: Union[str, TrajectoryType] = "torch",
     ) -> Trajectories:
-        if self.full:
-            batch_inds = (
-                np.random.randint(1, self.buffer_size, size=batch_size) + self.pos
-            ) % self.buffer_size
-        else:
-            batch_inds = np.random.randint(0, self.pos, size=batch_size)
+        batch_inds = self._sample_inds(batch_size)
 
         observations = self.observations[batch_inds]
         actions = self.actions[batch_inds]
@@ -0,0 +1,448 @@
+import multiprocessing as mp
+import socket
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch as T
+
+from pearll import settings as pearll_settings
+from pearll.buffers.base_buffer import BaseBuffer
+from pearll.common.enumerations import TrajectoryType
+from pearll.common.remote_env import (
+    MAX_MESSAGE_SIZE,
+    authenticate_client,
+    connect,
+    recv_message,
+    send_message,
+)
+from pearll.common.type_aliases import Observation, Trajectories
+from pearll.settings import ReplayServerSettings
+
+INSERT = b"I"
+SAMPLE = b"S"
+STATS = b"T"
+TIMEOUT = b"O"
+CLOSE = b"C"
+
+_STATS_KEYS = (
+    "num_inserted",
+    "num_sampled",
+    "insert_rate",
+    "sample_rate",
+    "samples_per_insert",
+    "insert_wait_time",
+    "sample_wait_time",
+)
+
+
+class RateLimiter(object):
+    """
+    Keeps the ratio of sampled to inserted transitions close to a target so that the
+    learner neither overfits to a small amount of data nor falls behind the collectors.
+    https://arxiv.org/abs/2102.04736
+
+    The difference `num_inserted * samples_per_insert - num_sampled` is kept within
+    `error_buffer` of its value once `min_size_to_sample` transitions are inserted. Requests
+    are admitted while the difference is within bounds, so a single batch can overshoot the
+    bounds by its own size but batches larger than the error buffer never deadlock.
+
+    :param samples_per_insert: optional target number of sampled transitions per inserted transition, no limit if None
+    :param min_size_to_sample: number of inserted transitions required before sampling is allowed
+    :param error_buffer: allowed deviation from the target ratio in sampled transitions
+    """
+
+    def __init__(
+        self,
+        samples_per_insert: Optional[float] = None,
+        min_size_to_sample: int = 1,
+        error_buffer: float = 100,
+    ) -> None:
+        self.samples_per_insert = samples_per_insert
+        self.min_size_to_sample = max(min_size_to_sample, 1)
+        self.error_buffer = error_buffer
+        self.num_inserted = 0
+        self.num_sampled = 0
+
+    @property
+    def _diff(self) -> float:
+        """Deviation from the target ratio, relative to when sampling was allowed"""
+        return (
+            self.num_inserted - self.min_size_to_sample
+        ) * self.samples_per_insert - self.num_sampled
+
+    def can_insert(self) -> bool:
+        """Whether an insert is allowed now"""
+        if self.samples_per_insert is None:
+            return True
+        if self.num_inserted < self.min_size_to_sample:
+            return True
+        return self._diff <= self.error_buffer
+
+    def can_sample(self) -> bool:
+        """Whether a sample is allowed now"""
+        if self.num_inserted < self.min_size_to_sample:
+            return False
+        if self.samples_per_insert is None:
+            return True
+        return self._diff >= -self.error_buffer
+
+    def insert(self, num_transitions: int) -> None:
+        """Record inserted transitions"""
+        self.num_inserted += num_transitions
+
+    def sample(self, num_transitions: int) -> None:
+        """Record sampled transitions"""
+        self.num_sampled += num_transitions
+
+
+class ReplayServer(object):
+    """
+    Server hosting a replay buffer for collectors and learners in other processes, possibly
+    on other hosts. Collectors insert batches of transitions with `ReplayClient.add_batch_trajectories`
+    and learners sample batches with `ReplayClient.sample`, the data is sent over a plain TCP
+    socket as raw numpy arrays. Each client is served by its own thread and requests are
+    blocked while the `RateLimiter` holds them back, so fast clients are slowed down
+    to keep the samples per insert ratio.
+
+    Inserts are counted per buffer step, i.e. one count per `add_trajectory` call, and
+    samples per sampled buffer step, i.e. `batch_size` per `sample` call. Only buffers with
+    array observations are supported.
+
+    The server and its clients authenticate each other with the secret `authkey` of the
+    settings, see `pearll.common.remote_env.authenticate_client`, and requests larger than
+    `max_message_size` close the connection before they're read. The traffic isn't encrypted
+    so the server should only listen on a trusted network.
+
+    :param buffer: the buffer to serve
+    :param settings: the server settings
+    """
+
+    def __init__(
+        self,
+        buffer: BaseBuffer,
+        settings: ReplayServerSettings,
+    ) -> None:
+        self.buffer = buffer
+        self.settings = settings
+        self.rate_limiter = RateLimiter(
+            samples_per_insert=settings.samples_per_insert,
+            min_size_to_sample=settings.min_size_to_sample,
+            error_buffer=settings.error_buffer,
+        )
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((settings.host, settings.port))
+        self.socket.listen()
+        self.address = self.socket.getsockname()
+
+        self._condition = threading.Condition()
+        self._closed = False
+        self._start_time = time.monotonic()
+        self._insert_wait_time = 0.0
+        self._sample_wait_time = 0.0
+
+    def _wait_for(self, predicate: Callable[[], bool]) -> Tuple[bool, float]:
+        """
+        Wait until the predicate holds, the condition lock must be held
+
+        :param predicate: the rate limiter check
+        :return: whether the predicate holds and the seconds waited
+        """
+        start = time.monotonic()
+        allowed = self._condition.wait_for(
+            lambda: self._closed or predicate(), timeout=self.settings.timeout
+        )
+        return allowed and not self._closed, time.monotonic() - start
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the insert and sample statistics
+
+        :return: the transition counts, rates per second, the achieved samples per insert ratio
+            and the total seconds requests were blocked by the rate limiter
+        """
+        with self._condition:
+            num_inserted = self.rate_limiter.num_inserted
+            num_sampled = self.rate_limiter.num_sampled
+            elapsed = max(time.monotonic() - self._start_time, 1e-9)
+            return {
+                "num_inserted": num_inserted,
+                "num_sampled": num_sampled,
+                "insert_rate": num_inserted / elapsed,
+                "sample_rate": num_sampled / elapsed,
+                "samples_per_insert": num_sampled / max(num_inserted, 1),
+                "insert_wait_time": self._insert_wait_time,
+                "sample_wait_time": self._sample_wait_time,
+            }
+
+    def _insert(self, arrays: List[np.ndarray]) -> bytes:
+        with self._condition:
+            allowed, waited = self._wait_for(self.rate_limiter.can_insert)
+            self._insert_wait_time += waited
+            if not allowed:
+                return CLOSE if self._closed else TIMEOUT
+            self.buffer.add_batch_trajectories(*arrays)
+            self.rate_limiter.insert(len(arrays[0]))
+            self._condition.notify_all()
+        return INSERT
+
+    def _sample(
+        self, batch_size: int, flatten_env: bool
+    ) -> Tuple[bytes, List[np.ndarray]]:
+        with self._condition:
+            allowed, waited = self._wait_for(self.rate_limiter.can_sample)
+            self._sample_wait_time += waited
+            if not allowed:
+                return CLOSE if self._closed else TIMEOUT, []
+            trajectories = self.buffer.sample(
+                batch_size, flatten_env=flatten_env, dtype=TrajectoryType.NUMPY
+            )
+            self.rate_limiter.sample(batch_size)
+            self._condition.notify_all()
+        return SAMPLE, [
+            trajectories.observations,
+            trajectories.actions,
+            trajectories.rewards,
+            trajectories.next_observations,
+            trajectories.dones,
+        ]
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Serve requests from a client until it disconnects"""
+        try:
+            try:
+                authenticate_client(conn, self.settings.authkey)
+            except AuthenticationError:
+                return
+            while not self._closed:
+                try:
+                    op, arrays = recv_message(conn, self.settings.max_message_size)
+                except (EOFError, OSError, ValueError):
+                    return
+                if op == INSERT:
+                    send_message(conn, self._insert(arrays))
+                elif op == SAMPLE:
+                    batch_size, flatten_env = arrays[0].tolist()
+                    send_message(conn, *self._sample(batch_size, bool(flatten_env)))
+                elif op == STATS:
+                    stats = self.stats()
+                    send_message(
+                        conn,
+                        STATS,
+                        [
+                            np.array(
+                                [stats[key] for key in _STATS_KEYS], dtype=np.float64
+                            )
+                        ],
+                    )
+                else:
+                    # Closing, or an unknown operation from a broken client
+                    return
+        except OSError:
+            # The client disconnected while waiting for a response
+            pass
+        finally:
+            conn.close()
+
+    def serve(self) -> None:
+        """Serve clients until the server is closed, each client is handled by its own thread"""
+        while not self._closed:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                # The server was closed
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self) -> None:
+        """Stop listening and release blocked requests"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+def run_replay_server(
+    buffer_fn: Callable[[], BaseBuffer],
+    settings: ReplayServerSettings,
+    address_conn: Optional[Connection] = None,
+) -> None:
+    """
+    Build a buffer and serve it until the process is terminated
+
+    :param buffer_fn: function which creates the buffer to serve
+    :param settings: the server settings
+    :param address_conn: optional connection the server address is sent through once listening
+    """
+    server = ReplayServer(buffer_fn(), settings)
+    if address_conn is not None:
+        address_conn.send(server.address)
+        address_conn.close()
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def start_replay_server(
+    buffer_fn: Callable[[], BaseBuffer],
+    settings: ReplayServerSettings,
+    start_method: Optional[str] = None,
+) -> Tuple[mp.Process, Tuple[str, int]]:
+    """
+    Start a replay server process on this host
+
+    :param buffer_fn: function which creates the buffer to serve
+    :param settings: the server settings
+    :param start_method: optional multiprocessing start method for the server process
+    :return: the server process and the address it listens on
+    """
+    ctx = mp.get_context(start_method)
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(
+        target=run_replay_server, args=(buffer_fn, settings, child_conn), daemon=True
+    )
+    process.start()
+    child_conn.close()
+    address = parent_conn.recv()
+    parent_conn.close()
+    return process, address
+
+
+class ReplayClient(object):
+    """
+    Client of a `ReplayServer`, it exposes the buffer methods used by collectors and learners.
+    Requests block while the server's rate limiter holds them back.
+
+    :param host: the host name or IP address of the server
+    :param port: the port of the server
+    :param authkey: the secret key shared with the server
+    :param connect_timeout: seconds to keep retrying to connect to the server
+    :param max_message_size: the maximum size of a received response in bytes
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        authkey: bytes,
+        connect_timeout: float = 10,
+        max_message_size: int = MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.socket = connect(host, port, authkey, connect_timeout)
+        self.max_message_size = max_message_size
+
+    def _request(self, op: bytes, arrays: List[np.ndarray] = ()) -> List[np.ndarray]:
+        send_message(self.socket, op, arrays)
+        received_op, arrays = recv_message(self.socket, self.max_message_size)
+        if received_op == TIMEOUT:
+            raise TimeoutError(
+                "The request was held back by the replay server for too long"
+            )
+        if received_op == CLOSE:
+            raise EOFError("The replay server was closed")
+        assert received_op == op
+        return arrays
+
+    def add_trajectory(
+        self,
+        observation: Observation,
+        action: Union[np.ndarray, int],
+        reward: Union[float, np.ndarray],
+        next_observation: Observation,
+        done: Union[bool, np.ndarray],
+    ) -> None:
+        """
+        Add a trajectory to the server buffer, prefer `add_batch_trajectories` to save round trips
+
+        :param observation: the observation
+        :param action: the action taken
+        :param reward: the reward received
+        :param next_observation: the next observation collected
+        :param done: the trajectory done flag
+        """
+        self.add_batch_trajectories(
+            *[
+                np.expand_dims(data, 0)
+                for data in (observation, action, reward, next_observation, done)
+            ]
+        )
+
+    def add_batch_trajectories(
+        self,
+        observations: Observation,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_observations: Observation,
+        dones: np.ndarray,
+    ) -> None:
+        """
+        Add a batch of trajectories to the server buffer in a single request
+
+        :param observations: the observations
+        :param actions: the actions taken
+        :param rewards: the rewards received
+        :param next_observations: the next observations collected
+        :param dones: the trajectory done flags
+        """
+        self._request(
+            INSERT,
+            [
+                np.asarray(data)
+                for data in (observations, actions, rewards, next_observations, dones)
+            ],
+        )
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        """
+        Sample a batch of trajectories from the server buffer
+
+        :param batch_size: the batch size
+        :param flatten_env: useful for multiple environments, whether to sample with the num_envs axis
+        :param dtype: whether to return the trajectories as "numpy" or "torch", default torch
+        :return: the sampled trajectories
+        """
+        if isinstance(dtype, str):
+            dtype = TrajectoryType(dtype.lower())
+        arrays = self._request(
+            SAMPLE, [np.array([batch_size, flatten_env], dtype=np.int64)]
+        )
+        if dtype == TrajectoryType.TORCH:
+            arrays = [
+                T.from_numpy(array).to(pearll_settings.DEVICE, non_blocking=True)
+                for array in arrays
+            ]
+        return Trajectories(*arrays)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the insert and sample statistics of the server, see `ReplayServer.stats`
+
+        :return: the server statistics
+        """
+        (values,) = self._request(STATS)
+        return dict(zip(_STATS_KEYS, values.tolist()))
+
+    def close(self) -> None:
+        """Disconnect from the server"""
+        try:
+            send_message(self.socket, CLOSE)
+        except OSError:
+            pass
+        self.socket.close()
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Dict, Optional, Sequence, Union
 
 import numpy as np
 import torch as T
@@ -7,6 +7,7 @@ from gym import Env
 from pearll.buffers.base_buffer import BaseBuffer
 from pearll.common.enumerations import TrajectoryType
 from pearll.common.type_aliases import Trajectories
+from pearll.settings import StorageSettings
 
 
 class RolloutBuffer(BaseBuffer):
@@ -15,20 +16,26 @@ class RolloutBuffer(BaseBuffer):
 
     :param env: the environment
     :param buffer_size: max number of elements in the buffer
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
     """
 
     def __init__(
         self,
         env: Env,
         buffer_size: int,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
     ) -> None:
         super().__init__(
             env,
             buffer_size,
+            reward_size,
+            storage_settings,
         )
         self.next_observations = np.zeros(
             (self.buffer_size,) + self.obs_shape,
-            dtype=env.observation_space.dtype,
+            dtype=self.storage_dtypes["next_observations"],
         )
         self._check_system_memory(
             self.observations,
@@ -36,13 +43,15 @@ class RolloutBuffer(BaseBuffer):
             self.rewards,
             self.dones,
             self.next_observations,
+            self._episode_starts,
+            self._episode_returns,
         )
 
     def reset(self) -> None:
         super().reset()
         self.next_observations = np.zeros(
             (self.buffer_size,) + self.obs_shape,
-            dtype=self.env.observation_space.dtype,
+            dtype=self.storage_dtypes["next_observations"],
         )
 
     def add_trajectory(
@@ -63,13 +72,10 @@ class RolloutBuffer(BaseBuffer):
         if self.pos == self.buffer_size:
             self.full = True
             self.pos = 0
+        self._record_step(done)
 
-    def sample(
-        self,
-        batch_size: int,
-        flatten_env: bool = False,
-        dtype: Union[str, TrajectoryType] = "torch",
-    ) -> Trajectories:
+    def _upper_bound(self, batch_size: int) -> int:
+        """Get the number of stored samples a contiguous batch can be drawn from"""
         if self.full:
             assert (
                 batch_size <= self.buffer_size
@@ -80,6 +86,25 @@ class RolloutBuffer(BaseBuffer):
                 batch_size <= self.pos
             ), f"Requesting {batch_size} samples when only {self.pos} samples have been collected"
             upper_bound = self.pos
+        return upper_bound
+
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        upper_bound = self._upper_bound(batch_size)
+        start_inds = np.random.randint(
+            0, (upper_bound + 1) - batch_size, size=num_batches
+        )
+        batch_inds = start_inds[:, np.newaxis] + np.arange(batch_size)
+        return self._get_samples(batch_inds, fields)
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        upper_bound = self._upper_bound(batch_size)
         start_idx = np.random.randint(0, (upper_bound + 1) - batch_size)
         last_idx = start_idx + batch_size
 
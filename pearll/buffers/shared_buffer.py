@@ -0,0 +1,362 @@
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch as T
+from gym import Env
+from gym.core import GoalEnv
+
+from pearll import settings
+from pearll.buffers.her_buffer import HERBuffer
+from pearll.buffers.replay_buffer import ReplayBuffer
+from pearll.common.enumerations import GoalSelectionStrategy, TrajectoryType
+from pearll.common.type_aliases import DictTrajectories, Observation, Trajectories
+from pearll.settings import StorageSettings
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# Write cursor columns: number of transitions added, number of episodes completed
+_COUNT = 0
+_EPISODE = 1
+
+
+def _release_segments(segments: List, unlink: bool) -> None:
+    """Detach from shared memory segments and optionally free them"""
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # Arrays returned by the buffer still view the segment, it's unmapped with them
+            pass
+        if unlink:
+            segment.unlink()
+
+
+class SharedMemoryMixin(object):
+    """
+    Moves the buffer arrays into `multiprocessing.shared_memory` segments split into shards,
+    one per writer process. Each writer appends to its own shard with the unmodified buffer
+    `add_trajectory` and then publishes the transition by advancing the shard's write cursor,
+    a shared int64 only that writer modifies, so the data path needs no locks. Readers only
+    see transitions whose cursor has been advanced. As in Hogwild, a reader can see a
+    transition being overwritten once a shard wraps around.
+
+    The buffer pickles as the names of its segments, so it can be passed to `Process`
+    workers with any start method, and `shard(shard_id)` gives a handle writing to another shard.
+    The segments are freed when the creating buffer is closed or garbage collected.
+    """
+
+    # Buffer arrays moved into shared memory
+    _shared_names: Tuple[str, ...] = ("observations", "actions", "rewards", "dones")
+
+    def _init_shared(self, num_shards: int) -> None:
+        """
+        Allocate the shared memory segments and copy the buffer arrays into them
+
+        :param num_shards: the number of shards, i.e. the number of writer processes
+        """
+        if shared_memory is None:
+            raise ImportError("Shared memory buffers require Python 3.8 or later")
+        self.num_shards = num_shards
+        self.shard_id = 0
+        self._owner = True
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+        self._shared: Dict[str, np.ndarray] = {}
+        self._staging: Dict[str, np.ndarray] = {}
+        for name in self._shared_names:
+            array = getattr(self, name)
+            self._allocate(name, (num_shards,) + array.shape, array.dtype)
+            self._shared[name][:] = array
+        self._allocate("_cursors", (num_shards, 2), np.dtype(np.int64))
+        # Free the segments even if the buffer is dropped without being closed
+        self._finalizer = weakref.finalize(
+            self, _release_segments, list(self._segments.values()), True
+        )
+        self._bind()
+        self._check_system_memory(*self._shared.values())
+
+    def _allocate(self, name: str, shape: Tuple[int, ...], dtype: np.dtype) -> None:
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        self._segments[name] = segment
+        self._shared[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        self._shared[name].fill(0)
+
+    def _bind(self) -> None:
+        """Point the buffer arrays at the current shard"""
+        for name in self._shared_names:
+            setattr(self, name, self._shared[name][self.shard_id])
+        self._cursors = self._shared["_cursors"]
+
+    def _use_shard(self, shard_id: int) -> None:
+        """Switch to a shard and load its write position"""
+        self.shard_id = shard_id
+        self._bind()
+        count, episode = self._cursors[shard_id].tolist()
+        self.pos = count % self.buffer_size
+        self.full = count >= self.buffer_size
+        if hasattr(self, "episode"):
+            self.episode = episode
+
+    def shard(self, shard_id: int) -> "SharedMemoryMixin":
+        """
+        Get a handle of the buffer writing to another shard, e.g. for a collector process.
+        Each shard should only be written by one handle at a time.
+
+        :param shard_id: the shard to write to
+        :return: the shard handle
+        """
+        assert 0 <= shard_id < self.num_shards
+        # Copying goes through pickling so the handle attaches its own segments
+        handle = self.__class__.__new__(self.__class__)
+        handle.__setstate__(self.__getstate__())
+        handle._use_shard(shard_id)
+        # The episode index only covers the steps added through the handle
+        handle._init_episode_index(int(handle._cursors[shard_id, _COUNT]))
+        return handle
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_layout"] = {
+            name: (segment.name, self._shared[name].shape, self._shared[name].dtype.str)
+            for name, segment in self._segments.items()
+        }
+        state["_owner"] = False
+        for name in (
+            "_segments",
+            "_shared",
+            "_staging",
+            "_cursors",
+            "_finalizer",
+        ) + tuple(self._shared_names):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        layout = state.pop("_layout")
+        self.__dict__.update(state)
+        self._segments = {}
+        self._shared = {}
+        self._staging = {}
+        for name, (segment_name, shape, dtype) in layout.items():
+            segment = shared_memory.SharedMemory(name=segment_name)
+            self._segments[name] = segment
+            self._shared[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        self._bind()
+
+    def add_trajectory(
+        self,
+        observation: Observation,
+        action: Union[np.ndarray, int],
+        reward: Union[float, np.ndarray],
+        next_observation: Observation,
+        done: Union[bool, np.ndarray],
+    ) -> None:
+        super().add_trajectory(observation, action, reward, next_observation, done)
+        # Publish the transition once its data is written
+        if hasattr(self, "episode"):
+            self._cursors[self.shard_id, _EPISODE] = self.episode
+        self._cursors[self.shard_id, _COUNT] += 1
+
+    def reset(self) -> None:
+        """Clear the current shard"""
+        for name in self._shared_names:
+            getattr(self, name).fill(0)
+        self._cursors[self.shard_id] = 0
+        self._use_shard(self.shard_id)
+        self._init_episode_index()
+
+    def _sample_indices(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sample transitions uniformly over the published transitions of every shard
+
+        :param batch_size: the number of transitions to sample
+        :return: the shard and the index within the shard of each transition
+        """
+        counts = self._cursors[:, _COUNT].copy()
+        full = counts >= self.buffer_size
+        pos = counts % self.buffer_size
+        # The observation at the write position is only a next observation
+        num_valid = np.where(full, self.buffer_size - 1, pos)
+        total = int(num_valid.sum())
+        if total == 0:
+            raise RuntimeError("No transitions have been added to the buffer")
+        ends = np.cumsum(num_valid)
+        samples = np.random.randint(0, total, size=batch_size)
+        shards = np.searchsorted(ends, samples, side="right")
+        offsets = samples - (ends - num_valid)[shards]
+        inds = np.where(
+            full[shards], (offsets + pos[shards] + 1) % self.buffer_size, offsets
+        )
+        return shards, inds
+
+    def close(self) -> None:
+        """Detach from the shared memory, the segments are freed when the creating buffer closes"""
+        for name in tuple(self._shared_names) + ("_cursors",):
+            setattr(self, name, None)
+        self._shared = {}
+        self._staging = {}
+        if self._owner:
+            self._finalizer()
+        else:
+            _release_segments(list(self._segments.values()), unlink=False)
+        self._segments = {}
+
+
+class SharedReplayBuffer(SharedMemoryMixin, ReplayBuffer):
+    """
+    Replay buffer stored in shared memory for collectors in several local processes, see
+    `SharedMemoryMixin`. Each collector writes to its own shard, `sample` draws uniformly
+    from all shards while `last` and `all` only use the handle's own shard, and the episode
+    queries only the episodes the handle added.
+
+    The sampled transitions are gathered from the shared arrays directly into staging arrays
+    reused across calls, so on the CPU a sampled batch is only valid until the next sample.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in each shard
+    :param num_shards: the number of shards, i.e. the number of writer processes
+    :param reward_size: number of reward objectives, greater than 1 for multi-objective environments
+    :param storage_settings: optional compact dtypes to store the transitions in
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        buffer_size: int,
+        num_shards: int = 1,
+        reward_size: int = 1,
+        storage_settings: Optional[StorageSettings] = None,
+    ) -> None:
+        super().__init__(env, buffer_size, reward_size, storage_settings)
+        self._init_shared(num_shards)
+
+    def _gather(self, name: str, inds: np.ndarray, key: str) -> np.ndarray:
+        """Gather rows of every shard into the staging array of `key`"""
+        source = self._shared[name]
+        source = source.reshape((-1,) + source.shape[2:])
+        shape = (len(inds),) + source.shape[1:]
+        staging = self._staging.get(key)
+        if staging is None or staging.shape != shape:
+            staging = np.empty(shape, dtype=source.dtype)
+            self._staging[key] = staging
+        return np.take(source, inds, axis=0, out=staging)
+
+    def _sample_block(
+        self, num_batches: int, batch_size: int, fields: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        # The block outlives the next sample so it isn't gathered into the staging arrays
+        shards, inds = self._sample_indices(num_batches * batch_size)
+        offsets = shards * self.buffer_size
+        batch_inds = (offsets + inds).reshape(num_batches, batch_size)
+        next_inds = (offsets + (inds + 1) % self.buffer_size).reshape(
+            num_batches, batch_size
+        )
+        block = {}
+        for name in fields:
+            if name == "next_observations":
+                source, rows = self._shared["observations"], next_inds
+            else:
+                source, rows = self._shared[name], batch_inds
+            block[name] = source.reshape((-1,) + source.shape[2:])[rows]
+        return block
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> Trajectories:
+        shards, inds = self._sample_indices(batch_size)
+        offsets = shards * self.buffer_size
+        batch_inds = offsets + inds
+        next_inds = offsets + (inds + 1) % self.buffer_size
+
+        return self._transform_samples(
+            flatten_env,
+            dtype,
+            self._gather("observations", batch_inds, "observations"),
+            self._gather("actions", batch_inds, "actions"),
+            self._gather("rewards", batch_inds, "rewards"),
+            self._gather("observations", next_inds, "next_observations"),
+            self._gather("dones", batch_inds, "dones"),
+        )
+
+
+class SharedHERBuffer(SharedMemoryMixin, HERBuffer):
+    """
+    HER buffer stored in shared memory for collectors in several local processes, see
+    `SharedMemoryMixin`. Each collector writes to its own shard, `sample` splits the batch over
+    the shards in proportion to their size and samples each one as a `HERBuffer`, since goals
+    are relabelled within an episode. `last` and `all` only use the handle's own shard.
+
+    :param env: the environment
+    :param buffer_size: max number of elements in each shard
+    :param num_shards: the number of shards, i.e. the number of writer processes
+    :param goal_selection_strategy: the goal selection strategy to be used, defaults to future
+    :param n_sampled_goal: ratio of HER data to data coming from normal experience replay
+    """
+
+    _shared_names = SharedMemoryMixin._shared_names + (
+        "desired_goals",
+        "next_achieved_goals",
+        "episode_end_indices",
+        "index_episode_map",
+    )
+
+    def __init__(
+        self,
+        env: GoalEnv,
+        buffer_size: int,
+        num_shards: int = 1,
+        goal_selection_strategy: Union[str, GoalSelectionStrategy] = "future",
+        n_sampled_goal: int = 4,
+    ) -> None:
+        super().__init__(env, buffer_size, goal_selection_strategy, n_sampled_goal)
+        self._init_shared(num_shards)
+
+    def sample(
+        self,
+        batch_size: int,
+        flatten_env: bool = False,
+        dtype: Union[str, TrajectoryType] = "torch",
+    ) -> DictTrajectories:
+        if isinstance(dtype, str):
+            dtype = TrajectoryType(dtype.lower())
+
+        shards, _ = self._sample_indices(batch_size)
+        shard_id = self.shard_id
+        parts: List[DictTrajectories] = []
+        try:
+            for shard, num_samples in enumerate(
+                np.bincount(shards, minlength=self.num_shards)
+            ):
+                if num_samples > 0:
+                    self._use_shard(shard)
+                    parts.append(
+                        super().sample(
+                            int(num_samples), flatten_env, TrajectoryType.NUMPY
+                        )
+                    )
+        finally:
+            self._use_shard(shard_id)
+
+        def combine(arrays: List[np.ndarray]) -> Union[np.ndarray, T.Tensor]:
+            array = np.concatenate(arrays)
+            if dtype == TrajectoryType.TORCH:
+                return T.from_numpy(array).to(settings.DEVICE, non_blocking=True)
+            return array
+
+        def combine_dict(dicts: List[Dict[str, np.ndarray]]) -> Dict:
+            return {key: combine([d[key] for d in dicts]) for key in dicts[0]}
+
+        return DictTrajectories(
+            observations=combine_dict([part.observations for part in parts]),
+            actions=combine([part.actions for part in parts]),
+            rewards=combine([part.rewards for part in parts]),
+            next_observations=combine_dict([part.next_observations for part in parts]),
+            dones=combine([part.dones for part in parts]),
+        )
@@ -0,0 +1,322 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import KDTree
+
+from pearll.common.type_aliases import Trajectories
+
+
+def final_observation_descriptor(trajectories: Trajectories) -> np.ndarray:
+    """
+    Use the observation at the end of each individual's episode as its behaviour descriptor
+
+    :param trajectories: the numpy trajectories of the population (num_envs, num_steps, ...)
+    :return: the behaviour descriptors (num_envs, descriptor_size)
+    """
+    dones = trajectories.dones.reshape(trajectories.dones.shape[:2])
+    num_envs, num_steps = dones.shape
+    last_steps = np.where(dones.any(axis=1), dones.argmax(axis=1), num_steps - 1)
+    final_observations = trajectories.next_observations[np.arange(num_envs), last_steps]
+    return final_observations.reshape(num_envs, -1)
+
+
+class BaseArchive(ABC):
+    """
+    The base quality-diversity archive storing the best individual (elite) found in each cell
+    of the behaviour descriptor space. Fitness and genomes are kept in dense numpy arrays with
+    one row per cell so insertion and sampling are vectorized over whole batches.
+
+    :param num_cells: the number of cells in the archive
+    :param genome_shape: the shape of a single genome
+    :param descriptor_bounds: the (low, high) bounds of the behaviour descriptors
+    :param genome_dtype: the data type of the genomes
+    """
+
+    def __init__(
+        self,
+        num_cells: int,
+        genome_shape: Tuple[int, ...],
+        descriptor_bounds: Tuple[Union[float, np.ndarray], Union[float, np.ndarray]],
+        genome_dtype: np.dtype = np.float32,
+    ) -> None:
+        self.num_cells = num_cells
+        self.low = np.atleast_1d(np.asarray(descriptor_bounds[0], dtype=np.float64))
+        self.high = np.atleast_1d(np.asarray(descriptor_bounds[1], dtype=np.float64))
+        self.descriptor_size = max(self.low.size, self.high.size)
+        self.low = np.broadcast_to(self.low, (self.descriptor_size,))
+        self.high = np.broadcast_to(self.high, (self.descriptor_size,))
+
+        self.fitness = np.full(num_cells, -np.inf)
+        self.genomes = np.zeros((num_cells,) + tuple(genome_shape), dtype=genome_dtype)
+        self.descriptors = np.zeros((num_cells, self.descriptor_size))
+        self.occupied = np.zeros(num_cells, dtype=bool)
+
+    @abstractmethod
+    def index(self, descriptors: np.ndarray) -> np.ndarray:
+        """
+        Get the cell ids of a batch of behaviour descriptors
+
+        :param descriptors: the behaviour descriptors (batch_size, descriptor_size)
+        :return: the cell ids (batch_size,)
+        """
+
+    def add(
+        self, genomes: np.ndarray, fitness: np.ndarray, descriptors: np.ndarray
+    ) -> int:
+        """
+        Insert a batch of individuals, each individual replaces the elite of its cell if it has
+        a higher fitness. Collisions within the batch are resolved with a scatter-max: the batch
+        is sorted by cell and fitness so only the best individual of each cell is written.
+
+        :param genomes: the genomes (batch_size, *genome_shape)
+        :param fitness: the fitness of each individual (batch_size,)
+        :param descriptors: the behaviour descriptors (batch_size, descriptor_size)
+        :return: the number of cells improved
+        """
+        fitness = np.asarray(fitness, dtype=np.float64).reshape(-1)
+        descriptors = np.asarray(descriptors, dtype=np.float64).reshape(
+            fitness.shape[0], self.descriptor_size
+        )
+        cells = self.index(descriptors)
+
+        # Best individual of each cell in the batch
+        order = np.lexsort((-fitness, cells))
+        sorted_cells = cells[order]
+        first = np.ones(order.shape[0], dtype=bool)
+        first[1:] = sorted_cells[1:] != sorted_cells[:-1]
+        winners = order[first]
+        winner_cells = cells[winners]
+
+        improved = fitness[winners] > self.fitness[winner_cells]
+        winners = winners[improved]
+        winner_cells = winner_cells[improved]
+        self.fitness[winner_cells] = fitness[winners]
+        self.genomes[winner_cells] = genomes[winners]
+        self.descriptors[winner_cells] = descriptors[winners]
+        self.occupied[winner_cells] = True
+
+        return int(winners.shape[0])
+
+    def sample(self, num_samples: int) -> np.ndarray:
+        """
+        Sample elites uniformly from the occupied cells
+
+        :param num_samples: the number of genomes to sample
+        :return: the sampled genomes (num_samples, *genome_shape)
+        """
+        occupied_cells = np.flatnonzero(self.occupied)
+        assert occupied_cells.size > 0, "Can't sample from an empty archive"
+        return self.genomes[np.random.choice(occupied_cells, size=num_samples)].copy()
+
+    def best(self) -> Tuple[np.ndarray, float]:
+        """Get the best genome in the archive and its fitness"""
+        cell = int(np.argmax(self.fitness))
+        return self.genomes[cell].copy(), float(self.fitness[cell])
+
+    @property
+    def size(self) -> int:
+        """The number of occupied cells"""
+        return int(np.sum(self.occupied))
+
+    @property
+    def coverage(self) -> float:
+        """The fraction of occupied cells"""
+        return self.size / self.num_cells
+
+    @property
+    def qd_score(self) -> float:
+        """The sum of the fitness over the occupied cells"""
+        return float(np.sum(self.fitness[self.occupied]))
+
+
+class GridArchive(BaseArchive):
+    """
+    Archive with a regular grid over the behaviour descriptor space
+
+    :param genome_shape: the shape of a single genome
+    :param descriptor_bounds: the (low, high) bounds of the behaviour descriptors,
+        descriptors outside of the bounds are clipped to the edge cells
+    :param cells_per_dim: the number of cells along each descriptor dimension
+    :param genome_dtype: the data type of the genomes
+    """
+
+    def __init__(
+        self,
+        genome_shape: Tuple[int, ...],
+        descriptor_bounds: Tuple[Union[float, np.ndarray], Union[float, np.ndarray]],
+        cells_per_dim: Union[int, Sequence[int]] = 10,
+        genome_dtype: np.dtype = np.float32,
+    ) -> None:
+        low, high, self.dims = np.broadcast_arrays(
+            descriptor_bounds[0],
+            descriptor_bounds[1],
+            np.asarray(cells_per_dim, dtype=np.int64),
+        )
+        self.dims = np.atleast_1d(self.dims)
+        super().__init__(
+            num_cells=int(np.prod(self.dims)),
+            genome_shape=genome_shape,
+            descriptor_bounds=(low, high),
+            genome_dtype=genome_dtype,
+        )
+
+    def index(self, descriptors: np.ndarray) -> np.ndarray:
+        scaled = (descriptors - self.low) / (self.high - self.low)
+        coords = np.clip(
+            np.floor(scaled * self.dims).astype(np.int64), 0, self.dims - 1
+        )
+        return np.ravel_multi_index(coords.T, self.dims)
+
+
+class CVTArchive(BaseArchive):
+    """
+    Archive with a Centroidal Voronoi Tessellation (CVT) of the behaviour descriptor space,
+    each cell is the region closest to one of the centroids.
+    https://arxiv.org/abs/1610.05729
+
+    :param genome_shape: the shape of a single genome
+    :param descriptor_bounds: the (low, high) bounds of the behaviour descriptors
+    :param num_cells: the number of cells, ignored if centroids are given
+    :param centroids: optional precomputed centroids (num_cells, descriptor_size), otherwise they're
+        found by k-means clustering of points sampled uniformly within the bounds
+    :param num_samples: number of points to sample for the k-means clustering, defaults to 10 per cell
+    :param genome_dtype: the data type of the genomes
+    """
+
+    def __init__(
+        self,
+        genome_shape: Tuple[int, ...],
+        descriptor_bounds: Tuple[Union[float, np.ndarray], Union[float, np.ndarray]],
+        num_cells: int = 1000,
+        centroids: Optional[np.ndarray] = None,
+        num_samples: Optional[int] = None,
+        genome_dtype: np.dtype = np.float32,
+    ) -> None:
+        if centroids is not None:
+            num_cells = centroids.shape[0]
+        super().__init__(
+            num_cells=num_cells,
+            genome_shape=genome_shape,
+            descriptor_bounds=descriptor_bounds,
+            genome_dtype=genome_dtype,
+        )
+        if centroids is None:
+            num_samples = num_samples or 10 * num_cells
+            samples = np.random.uniform(
+                self.low, self.high, (num_samples, self.descriptor_size)
+            )
+            kmeans = MiniBatchKMeans(n_clusters=num_cells, n_init=1)
+            centroids = kmeans.fit(samples).cluster_centers_
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.tree = KDTree(self.centroids)
+
+    def index(self, descriptors: np.ndarray) -> np.ndarray:
+        return self.tree.query(descriptors, k=1, return_distance=False)[:, 0]
+
+
+class NoveltyArchive(object):
+    """
+    Archive of past behaviour descriptors used to score novelty, the mean distance of a behaviour
+    to its k nearest neighbours among the current population and the archive.
+    https://www.cs.ucf.edu/eplex/noveltysearch/userspage/
+
+    The archive is indexed by a KD-tree which is rebuilt every `rebuild_frequency` insertions.
+    Descriptors added since the last rebuild are searched by brute force, so each k-NN query
+    is a batched tree query plus a small dense distance matrix.
+
+    :param descriptor_size: the size of a behaviour descriptor
+    :param num_neighbours: the number of nearest neighbours k used to score novelty
+    :param rebuild_frequency: the number of insertions before the KD-tree is rebuilt
+    """
+
+    def __init__(
+        self,
+        descriptor_size: int,
+        num_neighbours: int = 15,
+        rebuild_frequency: int = 1000,
+    ) -> None:
+        self.descriptor_size = descriptor_size
+        self.num_neighbours = num_neighbours
+        self.rebuild_frequency = rebuild_frequency
+        self.descriptors = np.zeros((rebuild_frequency, descriptor_size))
+        self.size = 0
+        self.tree = None
+        self.tree_size = 0
+
+    def add(self, descriptors: np.ndarray) -> None:
+        """
+        Add a batch of behaviour descriptors to the archive
+
+        :param descriptors: the behaviour descriptors (batch_size, descriptor_size)
+        """
+        descriptors = np.asarray(descriptors, dtype=np.float64).reshape(
+            -1, self.descriptor_size
+        )
+        new_size = self.size + descriptors.shape[0]
+        if new_size > self.descriptors.shape[0]:
+            capacity = max(new_size, 2 * self.descriptors.shape[0])
+            self.descriptors = np.concatenate(
+                [
+                    self.descriptors[: self.size],
+                    np.zeros((capacity - self.size, self.descriptor_size)),
+                ]
+            )
+        self.descriptors[self.size : new_size] = descriptors
+        self.size = new_size
+        if self.size - self.tree_size >= self.rebuild_frequency:
+            self.tree = KDTree(self.descriptors[: self.size])
+            self.tree_size = self.size
+
+    @staticmethod
+    def _pairwise_distances(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Euclidean distance matrix between two batches of descriptors"""
+        squared = (
+            np.sum(x ** 2, axis=1)[:, np.newaxis]
+            + np.sum(y ** 2, axis=1)[np.newaxis]
+            - 2 * x @ y.T
+        )
+        return np.sqrt(np.maximum(squared, 0))
+
+    def novelty(self, descriptors: np.ndarray) -> np.ndarray:
+        """
+        Score the novelty of a population, each individual is compared to the rest of the
+        population and the archive.
+
+        :param descriptors: the behaviour descriptors of the population (population_size, descriptor_size)
+        :return: the novelty scores (population_size,)
+        """
+        descriptors = np.asarray(descriptors, dtype=np.float64).reshape(
+            -1, self.descriptor_size
+        )
+        population_size = descriptors.shape[0]
+        k = self.num_neighbours
+        distances = []
+
+        # Rest of the population, the nearest neighbour is the individual itself
+        num_population_neighbours = min(k + 1, population_size)
+        population_distances, _ = KDTree(descriptors).query(
+            descriptors, k=num_population_neighbours
+        )
+        distances.append(population_distances[:, 1:])
+
+        # Indexed archive
+        if self.tree is not None:
+            tree_distances, _ = self.tree.query(descriptors, k=min(k, self.tree_size))
+            distances.append(tree_distances)
+
+        # Descriptors added since the last rebuild
+        if self.size > self.tree_size:
+            distances.append(
+                self._pairwise_distances(
+                    descriptors, self.descriptors[self.tree_size : self.size]
+                )
+            )
+
+        distances = np.concatenate(distances, axis=1)
+        if distances.shape[1] == 0:
+            return np.zeros(population_size)
+        k = min(k, distances.shape[1])
+        nearest = np.partition(distances, k - 1, axis=1)[:, :k]
+        return nearest.mean(axis=1)
@@ -0,0 +1,125 @@
+from abc import abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from gym import spaces
+from gym.vector import VectorEnv
+from gym.vector.utils import batch_space
+
+
+class BatchedSpace(spaces.Tuple):
+    """
+    Tuple of identical sub environment spaces which samples the whole batch in a single call
+    rather than sampling each sub space in turn.
+
+    :param space: the space of a single sub environment
+    :param n: the number of sub environments
+    """
+
+    def __init__(self, space: spaces.Space, n: int) -> None:
+        super().__init__((space,) * n)
+        self.batched_space = batch_space(space, n)
+
+    def sample(self) -> np.ndarray:
+        return self.batched_space.sample()
+
+    def seed(self, seed: Optional[int] = None) -> None:
+        self.batched_space.seed(seed)
+
+
+class BatchedEnv(VectorEnv):
+    """
+    Base class for numpy-native vectorized environments which hold their state as arrays over
+    the batch and step every sub environment in one call, without a python environment object
+    per sub environment. Since this is a `VectorEnv`, the agents, explorers, `Logger`, `Racing`
+    and buffers treat it like any other vectorized environment.
+
+    Subclasses implement the batched protocol:
+        - `reset_batch(mask)` resets the rows where `mask` is True and returns their new
+          observations, (mask.sum(), ...)
+        - `step_batch(actions)` steps every row with the actions (num_envs, ...) and returns
+          new observation, reward and done arrays of length num_envs along with a dictionary
+          of batched info arrays
+
+    Rows which are done are automatically reset with `reset_batch` after `step_batch`, their
+    final observations are returned in `infos["terminal_observation"]`. Infos are returned as
+    a dictionary of batched arrays rather than a list of dictionaries.
+
+    :param num_envs: the number of sub environments
+    :param observation_space: the observation space of a single sub environment
+    :param action_space: the action space of a single sub environment
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        observation_space: spaces.Space,
+        action_space: spaces.Space,
+    ) -> None:
+        super().__init__(num_envs, observation_space, action_space)
+        self.action_space = BatchedSpace(action_space, num_envs)
+        self.observations = None
+        self._actions = None
+
+    @abstractmethod
+    def reset_batch(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Reset a subset of the sub environments
+
+        :param mask: boolean mask of the sub environments to reset (num_envs,)
+        :return: the new observations of the reset sub environments (mask.sum(), ...)
+        """
+
+    @abstractmethod
+    def step_batch(
+        self, actions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        """
+        Step every sub environment, the returned arrays shouldn't be modified by later steps
+
+        :param actions: the batch of actions (num_envs, ...)
+        :return: next observations, rewards, dones and batched infos
+        """
+
+    def reset(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Reset the sub environments
+
+        :param mask: optional boolean mask of the sub environments to reset, all are reset if None
+        :return: the batch of observations
+        """
+        self.reset_async()
+        return self.reset_wait(mask=mask)
+
+    def reset_wait(self, mask: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+        if mask is None or self.observations is None:
+            self.observations = np.array(
+                self.reset_batch(np.ones(self.num_envs, dtype=bool))
+            )
+        else:
+            mask = np.asarray(mask, dtype=bool)
+            if mask.any():
+                # Don't modify observations already returned
+                self.observations = self.observations.copy()
+                self.observations[mask] = self.reset_batch(mask)
+        return self.observations
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions)
+
+    def step_wait(
+        self, **kwargs
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        observations, rewards, dones, infos = self.step_batch(self._actions)
+        observations = np.asarray(observations)
+        dones = np.asarray(dones, dtype=bool)
+        infos = dict(infos or {})
+        if dones.any():
+            infos["terminal_observation"] = observations[dones]
+            observations = observations.copy()
+            observations[dones] = self.reset_batch(dones)
+        self.observations = observations
+        return observations, np.asarray(rewards), dones, infos
+
+    def close_extras(self, **kwargs) -> None:
+        pass
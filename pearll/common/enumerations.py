@@ -24,6 +24,14 @@ class GoalSelectionStrategy(Enum):
     EPISODE = "episode"
 
 
+class CompressionCodec(Enum):
+    """Compression codecs for buffer chunks"""
+
+    ZLIB = "zlib"
+    LZMA = "lzma"
+    LZ4 = "lz4"
+
+
 class Distribution(Enum):
     """Distribution types"""
 
@@ -0,0 +1,119 @@
+from abc import abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from gym import spaces
+
+from pearll.common.batched_env import BatchedEnv
+
+
+class FunctionEnv(BatchedEnv):
+    """
+    Batched environment for optimizing a test function with evolutionary algorithms.
+    Each sub environment evaluates one individual, where the action is the function input
+    and the reward is the negative function value so the global minimum is the best reward.
+    The whole population is evaluated with a single vectorized call rather than stepping a
+    python environment for each individual, and every step is a complete episode.
+
+    :param num_envs: the number of environments, i.e. the population size
+    :param dimension: the number of function inputs
+    :param bounds: optional (low, high) bounds of each input, defaults to the standard
+        search domain of the function
+    """
+
+    default_bounds: Tuple[float, float] = (-5.12, 5.12)
+
+    def __init__(
+        self,
+        num_envs: int,
+        dimension: int = 2,
+        bounds: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        low, high = bounds or self.default_bounds
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=spaces.Discrete(1),
+            action_space=spaces.Box(
+                low=low, high=high, shape=(dimension,), dtype=np.float32
+            ),
+        )
+        self.dimension = dimension
+
+    @staticmethod
+    @abstractmethod
+    def function(x: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the function
+
+        :param x: the function inputs (num_individuals, dimension)
+        :return: the function values (num_individuals,)
+        """
+
+    def reset_batch(self, mask: np.ndarray) -> np.ndarray:
+        return np.zeros(np.count_nonzero(mask), dtype=np.int64)
+
+    def step_batch(
+        self, actions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        x = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, self.dimension)
+        return (
+            np.zeros(self.num_envs, dtype=np.int64),
+            -self.function(x),
+            np.ones(self.num_envs, dtype=bool),
+            {},
+        )
+
+
+class Sphere(FunctionEnv):
+    """
+    Sphere function, global minimum f(0, ..., 0) = 0
+    """
+
+    default_bounds = (-100, 100)
+
+    @staticmethod
+    def function(x: np.ndarray) -> np.ndarray:
+        return np.einsum("ij,ij->i", x, x)
+
+
+class Rastrigin(FunctionEnv):
+    """
+    Rastrigin function, global minimum f(0, ..., 0) = 0
+    """
+
+    default_bounds = (-5.12, 5.12)
+
+    @staticmethod
+    def function(x: np.ndarray) -> np.ndarray:
+        return 10 * x.shape[1] + np.sum(x ** 2 - 10 * np.cos(2 * np.pi * x), axis=1)
+
+
+class Rosenbrock(FunctionEnv):
+    """
+    Rosenbrock function, global minimum f(1, ..., 1) = 0, requires a dimension of at least 2
+    """
+
+    default_bounds = (-5, 10)
+
+    @staticmethod
+    def function(x: np.ndarray) -> np.ndarray:
+        return np.sum(
+            100 * (x[:, 1:] - x[:, :-1] ** 2) ** 2 + (1 - x[:, :-1]) ** 2, axis=1
+        )
+
+
+class Ackley(FunctionEnv):
+    """
+    Ackley function, global minimum f(0, ..., 0) = 0
+    """
+
+    default_bounds = (-32.768, 32.768)
+
+    @staticmethod
+    def function(x: np.ndarray) -> np.ndarray:
+        return (
+            -20 * np.exp(-0.2 * np.sqrt(np.mean(x ** 2, axis=1)))
+            - np.exp(np.mean(np.cos(2 * np.pi * x), axis=1))
+            + 20
+            + np.e
+        )
@@ -0,0 +1,241 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch as T
+
+from pearll.common.type_aliases import Observation
+from pearll.common.utils import to_numpy
+from pearll.explorers.base_explorer import BaseExplorer
+from pearll.models.actor_critics import Actor, ActorCritic
+
+
+class InferenceClient(object):
+    """
+    Handle an environment worker uses to get actions from an `InferenceServer`, it can be passed
+    to a thread or to a worker `Process`. A client has at most one request in flight so each
+    environment worker should use its own client.
+
+    :param conn: the connection to the server
+    """
+
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+
+    def predict_batch(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Get the actions for a batch of observations, e.g. from a `VectorEnv`
+
+        :param observations: the observations (batch_size, ...)
+        :return: the actions (batch_size, ...)
+        """
+        self.conn.send((np.asarray(observations), time.monotonic()))
+        return self.conn.recv()
+
+    def predict(self, observation: Observation) -> np.ndarray:
+        """
+        Get the action for a single observation
+
+        :param observation: the observation
+        :return: the action
+        """
+        return self.predict_batch(np.asarray(observation)[np.newaxis])[0]
+
+    def close(self) -> None:
+        """Disconnect from the server"""
+        self.conn.close()
+
+
+class InferenceServer(object):
+    """
+    Centralized inference for many environment workers, GA3C/SEED style
+    (https://arxiv.org/abs/1611.06256, https://arxiv.org/abs/1910.06591).
+    Rather than each worker running its own copy of the actor on a single observation, workers
+    submit observations through `InferenceClient` handles and a single inference thread gathers
+    them into dynamically sized batches. A batch is run as soon as it holds `max_batch_size`
+    observations or `max_latency` seconds after its first request arrived, whichever comes first.
+    Requests aren't split, so a batch can exceed `max_batch_size` by the size of its last request.
+    The server runs in the process holding the model, so the actions always come from the
+    latest weights.
+
+    The achieved batch sizes and the queue latency, the seconds between a worker submitting
+    its observations and the batch running, are recorded in `stats()`.
+
+    :param model: the model computing the actions
+    :param explorer: optional explorer adding exploration to the actions, it's called on the
+        whole batch so its random start steps should be disabled, the global actor
+        `model.predict` is used if None
+    :param max_batch_size: the maximum number of observations in a batch
+    :param max_latency: the maximum seconds to wait for more requests once a request arrives
+    """
+
+    def __init__(
+        self,
+        model: Union[Actor, ActorCritic],
+        explorer: Optional[BaseExplorer] = None,
+        max_batch_size: int = 64,
+        max_latency: float = 0.005,
+    ) -> None:
+        self.model = model
+        self.explorer = explorer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.step = 0
+        self._conns: List[Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.reset_stats()
+
+    def connect(self) -> InferenceClient:
+        """
+        Create a client handle, clients can be added while the server is running
+
+        :return: the client handle
+        """
+        server_conn, client_conn = mp.Pipe()
+        with self._lock:
+            self._conns.append(server_conn)
+        return InferenceClient(client_conn)
+
+    def reset_stats(self) -> None:
+        """Reset the batch statistics"""
+        self._num_batches = 0
+        self._num_observations = 0
+        self._max_batch = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._num_requests = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the batch statistics since the last reset
+
+        :return: the number of batches run, the mean and max batch sizes in observations and
+            the mean and max queue latency of the requests in seconds
+        """
+        num_batches = max(self._num_batches, 1)
+        num_requests = max(self._num_requests, 1)
+        return {
+            "num_batches": self._num_batches,
+            "mean_batch_size": self._num_observations / num_batches,
+            "max_batch_size": self._max_batch,
+            "mean_queue_latency": self._total_latency / num_requests,
+            "max_queue_latency": self._max_latency,
+        }
+
+    def _infer(self, observations: np.ndarray) -> np.ndarray:
+        """Compute the actions of a batch of observations"""
+        self.model.eval()
+        with T.no_grad():
+            if self.explorer is None:
+                return to_numpy(self.model.predict(observations))
+            return np.asarray(self.explorer(self.model, observations, self.step))
+
+    def _drop(self, conn: Connection) -> None:
+        with self._lock:
+            self._conns.remove(conn)
+        conn.close()
+
+    def _receive(
+        self,
+        conns: List[Connection],
+        batch: List[Tuple[Connection, np.ndarray, float]],
+        capacity: int,
+    ) -> int:
+        """Receive requests from ready clients until the batch is full, returns the number of observations added"""
+        num_observations = 0
+        for conn in conns:
+            if num_observations >= capacity:
+                break
+            try:
+                observations, submit_time = conn.recv()
+            except (EOFError, OSError):
+                self._drop(conn)
+                continue
+            batch.append((conn, observations, submit_time))
+            num_observations += len(observations)
+        return num_observations
+
+    def run_batch(self, timeout: Optional[float] = None) -> int:
+        """
+        Gather a batch of requests, compute their actions and send them back
+
+        :param timeout: optional seconds to wait for the first request, waits forever if None
+        :return: the number of observations in the batch
+        """
+        with self._lock:
+            conns = list(self._conns)
+        if not conns:
+            time.sleep(timeout or 0)
+            return 0
+        batch = []
+        num_observations = self._receive(
+            wait(conns, timeout=timeout), batch, self.max_batch_size
+        )
+        if not batch:
+            return 0
+        deadline = time.monotonic() + self.max_latency
+        while num_observations < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Each client has at most one request in flight
+            in_batch = {conn for conn, _, _ in batch}
+            with self._lock:
+                waiting = [conn for conn in self._conns if conn not in in_batch]
+            if not waiting:
+                break
+            num_observations += self._receive(
+                wait(waiting, timeout=remaining),
+                batch,
+                self.max_batch_size - num_observations,
+            )
+
+        start = time.monotonic()
+        latencies = [start - submit_time for _, _, submit_time in batch]
+        self._num_requests += len(batch)
+        self._num_batches += 1
+        self._num_observations += num_observations
+        self._max_batch = max(self._max_batch, num_observations)
+        self._total_latency += sum(latencies)
+        self._max_latency = max(self._max_latency, max(latencies))
+
+        actions = self._infer(
+            np.concatenate([observations for _, observations, _ in batch])
+        )
+        self.step += 1
+        offset = 0
+        for conn, observations, _ in batch:
+            try:
+                conn.send(actions[offset : offset + len(observations)])
+            except (BrokenPipeError, OSError):
+                self._drop(conn)
+            offset += len(observations)
+        return num_observations
+
+    def _serve(self) -> None:
+        while not self._closed:
+            # Wake up regularly to check for new clients and closing
+            self.run_batch(timeout=0.1)
+
+    def start(self) -> "InferenceServer":
+        """Run the server in a background thread"""
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the server thread and disconnect the clients"""
+        self._closed = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
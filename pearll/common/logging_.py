@@ -53,7 +53,7 @@ class Logger(object):
         self.entropies = []
         self.rewards = []
         # Keep track of which environments have completed an episode
-        self.episode_dones = np.array([False for _ in range(num_envs)])
+        self.episode_dones = np.zeros(num_envs, dtype=bool)
 
     def reset_log(self) -> None:
         self.actor_losses = []
@@ -61,7 +61,7 @@ class Logger(object):
         self.divergences = []
         self.entropies = []
         self.rewards = []
-        self.episode_dones = np.array([False for _ in range(self.num_envs)])
+        self.episode_dones = np.zeros(self.num_envs, dtype=bool)
 
     def add_train_log(self, train_log: Log) -> None:
         if train_log.actor_loss is not None:
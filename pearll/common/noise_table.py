@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class NoiseTable(object):
+    """
+    A shared table of Gaussian noise, the noise of an individual is the slice
+    `table[index : index + size]` so it can be communicated with a single integer.
+    The table is generated deterministically from the seed so processes on different
+    hosts build identical tables without sending any noise.
+    https://arxiv.org/abs/1703.03864
+
+    :param size: the number of noise values in the table
+    :param seed: the seed used to generate the table
+    """
+
+    def __init__(self, size: int = 2 ** 24, seed: int = 0) -> None:
+        self.size = size
+        self.seed = seed
+        self.noise = np.random.default_rng(seed).standard_normal(size, dtype=np.float32)
+
+    def get(self, index: int, size: int) -> np.ndarray:
+        """
+        Get the noise slice of a single individual
+
+        :param index: the start index of the slice
+        :param size: the number of noise values
+        :return: the noise (size,)
+        """
+        return self.noise[index : index + size]
+
+    def gather(self, indices: np.ndarray, size: int) -> np.ndarray:
+        """
+        Get the noise slices of a batch of individuals
+
+        :param indices: the start index of each slice (num_individuals,)
+        :param size: the number of noise values per individual
+        :return: the noise (num_individuals, size)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return np.stack([self.noise[i : i + size] for i in indices]).astype(np.float64)
+
+    def sample_indices(self, num_individuals: int, size: int) -> np.ndarray:
+        """
+        Sample random noise slice start indices
+
+        :param num_individuals: the number of indices to sample
+        :param size: the number of noise values per individual
+        :return: the sampled indices (num_individuals,)
+        """
+        assert size <= self.size, "The noise table is smaller than an individual"
+        return np.random.randint(0, self.size - size + 1, size=num_individuals)
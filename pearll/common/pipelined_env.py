@@ -0,0 +1,130 @@
+from typing import Callable, List, Tuple
+
+import gym
+import numpy as np
+from gym.vector import AsyncVectorEnv, SyncVectorEnv, VectorEnv
+
+# Policy computing the actions of a group: (sub environment slice, observations) -> actions
+GroupPolicy = Callable[[slice, np.ndarray], np.ndarray]
+
+
+class PipelinedVectorEnv(VectorEnv):
+    """
+    Vectorized environment split into groups of sub environments which are stepped out of phase,
+    EnvPool style (https://arxiv.org/abs/2206.10558). With `step_pipelined` the actions of each
+    group are computed as soon as that group's step returns and are sent straight away, so while
+    the policy runs on one group the other groups are still simulating. Simulation and inference
+    overlap instead of the policy waiting for every sub environment and the sub environments
+    waiting for the policy.
+
+    `BaseAgent.step_env` uses the pipeline automatically, each agent step is still one step of
+    every sub environment so the buffers and `_fit` see a normal `VectorEnv`. The actions of the
+    next step are computed before `step_env` returns, so they come from the model as it was at
+    the previous step. Used through `step`, it behaves like any `VectorEnv`.
+
+    :param env_fns: functions which create each environment instance
+    :param num_groups: the number of groups, the sub environments are split as evenly as possible
+    :param asynchronous: whether to step each group in parallel subprocesses, the groups only
+        overlap with the policy if True
+    """
+
+    def __init__(
+        self,
+        env_fns: List[Callable[[], gym.Env]],
+        num_groups: int = 2,
+        asynchronous: bool = True,
+    ) -> None:
+        assert 1 <= num_groups <= len(env_fns)
+        sizes = [len(s) for s in np.array_split(np.arange(len(env_fns)), num_groups)]
+        bounds = np.cumsum([0] + sizes)
+        self.slices = [
+            slice(int(start), int(end)) for start, end in zip(bounds, bounds[1:])
+        ]
+        vector_env_class = AsyncVectorEnv if asynchronous else SyncVectorEnv
+        self.groups = [vector_env_class(env_fns[s]) for s in self.slices]
+        super().__init__(
+            len(env_fns),
+            self.groups[0].single_observation_space,
+            self.groups[0].single_action_space,
+        )
+        # Actions sent to the groups whose results haven't been received yet
+        self._actions = None
+
+    @property
+    def in_flight(self) -> bool:
+        """Whether actions have been sent that haven't been stepped yet"""
+        return self._actions is not None
+
+    def _drain(self) -> None:
+        """Discard the results of actions in flight"""
+        if self.in_flight:
+            for group in self.groups:
+                group.step_wait()
+            self._actions = None
+
+    def seed(self, seeds=None) -> None:
+        if seeds is None or isinstance(seeds, int):
+            seeds = [None if seeds is None else seeds + i for i in range(self.num_envs)]
+        for group, s in zip(self.groups, self.slices):
+            group.seed(seeds[s])
+
+    def reset_async(self) -> None:
+        self._drain()
+        for group in self.groups:
+            group.reset_async()
+
+    def reset_wait(self, **kwargs) -> np.ndarray:
+        return np.concatenate([group.reset_wait(**kwargs) for group in self.groups])
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._drain()
+        self._actions = np.asarray(actions)
+        for group, s in zip(self.groups, self.slices):
+            group.step_async(self._actions[s])
+
+    def step_wait(self, **kwargs) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List]:
+        results = [group.step_wait(**kwargs) for group in self.groups]
+        self._actions = None
+        return self._concatenate(results)
+
+    def step_pipelined(
+        self, policy: GroupPolicy
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List]:
+        """
+        Receive the results of the actions in flight group by group, computing and sending the
+        next actions of each group as soon as its results arrive
+
+        :param policy: function computing the actions of a group from its slice of the sub
+            environments and its observations
+        :return: the actions taken, then the next observations, rewards, dones and infos of every
+            sub environment
+        """
+        assert self.in_flight, "Send the first actions with `step_async`"
+        actions = self._actions
+        next_actions = []
+        results = []
+        for group, s in zip(self.groups, self.slices):
+            result = group.step_wait()
+            group_actions = np.asarray(policy(s, result[0]))
+            group.step_async(group_actions)
+            next_actions.append(group_actions)
+            results.append(result)
+        self._actions = np.concatenate(next_actions)
+        return (actions,) + self._concatenate(results)
+
+    @staticmethod
+    def _concatenate(
+        results: List[Tuple],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List]:
+        observations, rewards, dones, infos = zip(*results)
+        return (
+            np.concatenate(observations),
+            np.concatenate(rewards),
+            np.concatenate(dones),
+            [info for group_infos in infos for info in group_infos],
+        )
+
+    def close_extras(self, **kwargs) -> None:
+        self._drain()
+        for group in self.groups:
+            group.close(**kwargs)
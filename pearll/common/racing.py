@@ -0,0 +1,146 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from gym.vector import SyncVectorEnv, VectorEnv
+
+from pearll.common.type_aliases import Observation
+
+
+class Racing(object):
+    """
+    Racing handles early termination of poorly performing individuals when evaluating a
+    population in a `VectorEnv`, where each sub environment evaluates one individual.
+    The partial return of each individual is tracked and an individual is stopped once its
+    optimistic return bound can no longer reach the selection cutoff:
+        R_i + r_max * (H - t) < k-th largest (R_j + r_min * (H - t))
+    where R is the partial return, t is the current step, H is the episode length, k is the
+    number of individuals kept by selection and (r_min, r_max) bound the reward of a single step.
+
+    Stopped individuals are reported as done with zero reward so the usual `filter_rewards` path
+    gives their partial return. If the environment is a `SyncVectorEnv`, only the sub environments
+    still racing are stepped. For other vector environments all sub environments are stepped but
+    the generation still ends as soon as every individual is either done or stopped.
+
+    :param num_envs: the number of environments, i.e. the population size
+    :param selection_ratio: fraction of the population kept by selection, defines the cutoff
+    :param reward_bounds: optional (min, max) bounds of the reward of a single step,
+        if None they are estimated from the rewards seen so far
+    :param episode_length: optional evaluation horizon after which individuals are treated as done,
+        if None it's estimated from the length of previous generations
+    :param min_steps: number of steps to run before any individual can be stopped
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        selection_ratio: float = 0.5,
+        reward_bounds: Optional[Tuple[float, float]] = None,
+        episode_length: Optional[int] = None,
+        min_steps: int = 0,
+    ) -> None:
+        self.num_envs = num_envs
+        self.num_selected = min(
+            num_envs, max(1, int(np.ceil(selection_ratio * num_envs)))
+        )
+        self.reward_bounds = reward_bounds
+        self.episode_length = episode_length
+        self.min_steps = min_steps
+
+        # Estimates used when bounds aren't given
+        self.estimated_reward_bounds = None
+        self.estimated_episode_length = None
+
+        # Diagnostics accumulated over all generations
+        self.num_stopped = 0
+        self.skipped_steps = 0
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset the race for a new generation"""
+        if getattr(self, "t", 0) > 0:
+            self.estimated_episode_length = max(
+                self.estimated_episode_length or 0, self.t
+            )
+        self.t = 0
+        self.returns = np.zeros(self.num_envs, dtype=np.float64)
+        self.active = np.ones(self.num_envs, dtype=bool)
+
+    def _update_reward_bounds(self, rewards: np.ndarray) -> None:
+        """Update the estimated single step reward bounds"""
+        if rewards.size == 0:
+            return
+        low, high = np.min(rewards), np.max(rewards)
+        if self.estimated_reward_bounds is not None:
+            low = min(low, self.estimated_reward_bounds[0])
+            high = max(high, self.estimated_reward_bounds[1])
+        self.estimated_reward_bounds = (low, high)
+
+    def _stop_mask(self) -> np.ndarray:
+        """
+        Find the racing individuals which can no longer reach the selection cutoff
+
+        :return: boolean mask of individuals to stop
+        """
+        stop = np.zeros(self.num_envs, dtype=bool)
+        horizon = self.episode_length or self.estimated_episode_length
+        bounds = self.reward_bounds or self.estimated_reward_bounds
+        if horizon is None or bounds is None or self.t < self.min_steps:
+            return stop
+
+        remaining_steps = max(horizon - self.t, 0)
+        # Individuals no longer racing have their final return
+        upper = np.where(
+            self.active, self.returns + bounds[1] * remaining_steps, self.returns
+        )
+        lower = np.where(
+            self.active, self.returns + bounds[0] * remaining_steps, self.returns
+        )
+        cutoff = np.partition(lower, -self.num_selected)[-self.num_selected]
+        stop[self.active & (upper < cutoff)] = True
+
+        return stop
+
+    def step(
+        self, env: VectorEnv, observation: Observation, action: np.ndarray
+    ) -> Tuple[Observation, np.ndarray, np.ndarray, List[dict]]:
+        """
+        Step the individuals still racing in the environment
+
+        :param env: the vector environment, one sub environment per individual
+        :param observation: the current observation
+        :param action: the population actions
+        :return: next observation, rewards, dones, infos
+        """
+        racing = self.active.copy()
+        if isinstance(env, SyncVectorEnv):
+            next_observation = np.array(observation, copy=True)
+            rewards = np.zeros(self.num_envs, dtype=np.float64)
+            dones = np.ones(self.num_envs, dtype=bool)
+            infos = [{} for _ in range(self.num_envs)]
+            for i in np.flatnonzero(racing):
+                obs, rewards[i], dones[i], infos[i] = env.envs[i].step(action[i])
+                next_observation[i] = obs
+        else:
+            next_observation, rewards, dones, infos = env.step(action)
+            mask = racing.reshape((-1,) + (1,) * (np.ndim(next_observation) - 1))
+            next_observation = np.where(mask, next_observation, observation)
+            rewards = np.where(racing, rewards, 0)
+            dones = np.where(racing, dones, True)
+
+        self.t += 1
+        self.skipped_steps += int(np.sum(~racing))
+        self.returns[racing] += rewards[racing]
+        self._update_reward_bounds(rewards[racing])
+
+        # Individuals finishing their episode have their final return
+        finished = racing & dones
+        if self.episode_length is not None and self.t >= self.episode_length:
+            finished = racing
+        self.active[finished] = False
+
+        stop = self._stop_mask()
+        self.active[stop] = False
+        self.num_stopped += int(np.sum(stop))
+
+        return next_observation, rewards, np.logical_or(dones, ~self.active), infos
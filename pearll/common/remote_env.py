@@ -0,0 +1,481 @@
+import hashlib
+import hmac
+import json
+import os
+import socket
+import struct
+import time
+from collections import deque
+from multiprocessing import AuthenticationError
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import gym
+import numpy as np
+from gym import spaces
+from gym.vector import AsyncVectorEnv, SyncVectorEnv, VectorEnv
+
+# Message header: body length, operation code
+_HEADER = struct.Struct("<Qc")
+# Array header: dtype string length, number of dimensions
+_ARRAY_HEADER = struct.Struct("<BB")
+
+HANDSHAKE = b"H"
+RESET = b"R"
+STEP = b"S"
+SEED = b"E"
+CLOSE = b"C"
+
+# Size of the authentication challenge and of its HMAC-SHA256 answer
+_CHALLENGE_SIZE = 32
+# Default limit on the size of a received message body, in bytes
+MAX_MESSAGE_SIZE = 2 ** 30
+# Space kinds sent in the handshake
+_SPACE_KINDS = (spaces.Box, spaces.Discrete, spaces.MultiDiscrete, spaces.MultiBinary)
+
+
+def encode_arrays(arrays: Sequence[np.ndarray]) -> bytes:
+    """
+    Encode numpy arrays as bytes. Each array is written as its dtype string, its shape and
+    its raw C-ordered data.
+
+    :param arrays: the arrays to encode
+    :return: the encoded arrays
+    """
+    chunks = [struct.pack("<I", len(arrays))]
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Can't encode arrays with dtype {array.dtype}")
+        dtype = array.dtype.str.encode()
+        chunks.append(_ARRAY_HEADER.pack(len(dtype), array.ndim))
+        chunks.append(dtype)
+        chunks.append(struct.pack(f"<{array.ndim}Q", *array.shape))
+        chunks.append(array.tobytes())
+    return b"".join(chunks)
+
+
+def decode_arrays(data: memoryview) -> List[np.ndarray]:
+    """
+    Decode numpy arrays encoded with `encode_arrays`, the arrays share memory with the data
+
+    :param data: the encoded arrays
+    :return: the decoded arrays
+    """
+    (num_arrays,) = struct.unpack_from("<I", data, 0)
+    offset = 4
+    arrays = []
+    for _ in range(num_arrays):
+        dtype_length, ndim = _ARRAY_HEADER.unpack_from(data, offset)
+        offset += _ARRAY_HEADER.size
+        dtype = np.dtype(bytes(data[offset : offset + dtype_length]).decode())
+        if dtype.hasobject:
+            raise TypeError(f"Can't decode arrays with dtype {dtype}")
+        offset += dtype_length
+        shape = struct.unpack_from(f"<{ndim}Q", data, offset)
+        offset += 8 * ndim
+        count = int(np.prod(shape))
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        arrays.append(array.reshape(shape))
+        offset += count * dtype.itemsize
+    return arrays
+
+
+def send_message(
+    sock: socket.socket, op: bytes, arrays: Sequence[np.ndarray] = ()
+) -> None:
+    """
+    Send an operation and its arrays
+
+    :param sock: the connected socket
+    :param op: the single byte operation code
+    :param arrays: the arrays to send
+    """
+    body = encode_arrays(arrays)
+    sock.sendall(_HEADER.pack(len(body), op) + body)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise EOFError("The connection was closed")
+        received += n
+    return buffer
+
+
+def recv_message(
+    sock: socket.socket, max_size: int = MAX_MESSAGE_SIZE
+) -> Tuple[bytes, List[np.ndarray]]:
+    """
+    Receive an operation and its arrays. The body size is checked before it's allocated,
+    after an error the connection should be closed since the rest of the message is unread.
+
+    :param sock: the connected socket
+    :param max_size: the maximum size of the message body in bytes
+    :return: the operation code and the arrays
+    """
+    size, op = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if size > max_size:
+        raise ValueError(
+            f"Received a message of {size} bytes, more than the maximum of {max_size}"
+        )
+    return op, decode_arrays(memoryview(_recv_exactly(sock, size)))
+
+
+def encode_space(space: gym.Space) -> List[np.ndarray]:
+    """
+    Encode a `Box`, `Discrete`, `MultiDiscrete` or `MultiBinary` space as its kind and
+    bounds arrays, the dtype and shape of a `Box` are those of its bounds
+
+    :param space: the space to encode
+    :return: the kind, lower bounds and upper bounds arrays
+    """
+    if isinstance(space, spaces.Box):
+        bounds = [space.low, space.high]
+    elif isinstance(space, spaces.Discrete):
+        bounds = [np.array(space.n), np.zeros(0)]
+    elif isinstance(space, spaces.MultiDiscrete):
+        bounds = [space.nvec, np.zeros(0)]
+    elif isinstance(space, spaces.MultiBinary):
+        bounds = [np.array(space.n), np.zeros(0)]
+    else:
+        raise TypeError(f"Can't encode spaces of type {type(space)}")
+    kind = np.array(_SPACE_KINDS.index(type(space)), dtype=np.uint8)
+    return [kind] + bounds
+
+
+def decode_space(arrays: Sequence[np.ndarray]) -> gym.Space:
+    """
+    Decode a space encoded with `encode_space`
+
+    :param arrays: the kind, lower bounds and upper bounds arrays
+    :return: the decoded space
+    """
+    kind, low, high = arrays
+    space_class = _SPACE_KINDS[int(kind)]
+    if space_class is spaces.Box:
+        return spaces.Box(low=low.copy(), high=high.copy(), dtype=low.dtype)
+    if space_class is spaces.MultiDiscrete:
+        return spaces.MultiDiscrete(low.copy())
+    return space_class(int(low))
+
+
+def encode_infos(infos: Sequence[Dict[str, Any]]) -> List[np.ndarray]:
+    """
+    Encode the step infos as JSON followed by the numpy arrays they hold. Values can be JSON
+    types, numpy scalars or numpy arrays, e.g. terminal observations.
+
+    :param infos: the info dictionary of each environment
+    :return: the JSON bytes and the arrays
+    """
+    arrays = []
+
+    def encode_value(value):
+        if isinstance(value, np.ndarray):
+            arrays.append(value)
+            return {"__ndarray__": len(arrays) - 1}
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Can't encode info values of type {type(value)}")
+
+    text = json.dumps(list(infos), default=encode_value)
+    return [np.frombuffer(text.encode(), dtype=np.uint8)] + arrays
+
+
+def decode_infos(arrays: Sequence[np.ndarray]) -> List[Dict[str, Any]]:
+    """
+    Decode step infos encoded with `encode_infos`
+
+    :param arrays: the JSON bytes and the arrays
+    :return: the info dictionary of each environment
+    """
+
+    def decode_value(value):
+        if value.keys() == {"__ndarray__"}:
+            return arrays[1 + value["__ndarray__"]]
+        return value
+
+    return json.loads(arrays[0].tobytes().decode(), object_hook=decode_value)
+
+
+def _challenge_answer(authkey: bytes, challenge: bytes) -> bytes:
+    return hmac.new(authkey, challenge, hashlib.sha256).digest()
+
+
+def _deliver_challenge(sock: socket.socket, authkey: bytes) -> None:
+    """Challenge the peer to prove it has the authkey"""
+    challenge = os.urandom(_CHALLENGE_SIZE)
+    sock.sendall(challenge)
+    answer = bytes(_recv_exactly(sock, _CHALLENGE_SIZE))
+    if not hmac.compare_digest(answer, _challenge_answer(authkey, challenge)):
+        raise AuthenticationError("The peer doesn't have the authkey")
+
+
+def _answer_challenge(sock: socket.socket, authkey: bytes) -> None:
+    """Prove to the peer that we have the authkey"""
+    challenge = bytes(_recv_exactly(sock, _CHALLENGE_SIZE))
+    sock.sendall(_challenge_answer(authkey, challenge))
+
+
+def _check_authkey(authkey: bytes) -> None:
+    if not isinstance(authkey, bytes) or not authkey:
+        raise ValueError("A non-empty bytes authkey is required")
+
+
+def authenticate_client(
+    conn: socket.socket, authkey: bytes, timeout: Optional[float] = 10
+) -> None:
+    """
+    Server side of the mutual authentication: the client answers an HMAC-SHA256 challenge
+    with the shared authkey, then the server answers the client's challenge
+
+    :param conn: the socket of the accepted client
+    :param authkey: the shared key
+    :param timeout: optional seconds to wait for each step of the handshake
+    """
+    _check_authkey(authkey)
+    conn.settimeout(timeout)
+    try:
+        _deliver_challenge(conn, authkey)
+        _answer_challenge(conn, authkey)
+    except (EOFError, OSError) as error:
+        raise AuthenticationError("The client didn't authenticate") from error
+    conn.settimeout(None)
+
+
+def authenticate_server(
+    sock: socket.socket, authkey: bytes, timeout: Optional[float] = 10
+) -> None:
+    """
+    Client side of the mutual authentication, see `authenticate_client`
+
+    :param sock: the socket connected to the server
+    :param authkey: the shared key
+    :param timeout: optional seconds to wait for each step of the handshake
+    """
+    _check_authkey(authkey)
+    sock.settimeout(timeout)
+    try:
+        _answer_challenge(sock, authkey)
+        _deliver_challenge(sock, authkey)
+    except (EOFError, OSError) as error:
+        # The server closes the connection when it rejects the answer
+        raise AuthenticationError("The server rejected the authkey") from error
+    sock.settimeout(None)
+
+
+def connect(
+    host: str, port: int, authkey: bytes, connect_timeout: float = 10
+) -> socket.socket:
+    """
+    Connect and authenticate to a server, retrying while it isn't listening yet
+
+    :param host: the host name or IP address of the server
+    :param port: the port of the server
+    :param authkey: the key shared with the server
+    :param connect_timeout: seconds to keep retrying to connect to the server
+    :return: the authenticated socket
+    """
+    _check_authkey(authkey)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        authenticate_server(sock, authkey)
+    except AuthenticationError:
+        sock.close()
+        raise
+    return sock
+
+
+class EnvServer(object):
+    """
+    Server hosting environment instances for an `EnvClient` on another host. The instances
+    are stepped together as a `VectorEnv` and the step/reset requests and results are sent
+    over a plain TCP socket as raw numpy arrays.
+
+    The server and its clients authenticate each other with HMAC challenges on a shared
+    `authkey`, like `ESCoordinator` and `run_es_worker`, so the key should be secret, e.g.
+    from `os.urandom`. Nothing received is unpickled, the spaces are sent as their bounds and
+    the infos as JSON and arrays, but the traffic isn't encrypted so the server should only
+    listen on a trusted network.
+
+    :param env_fns: functions which create each environment instance
+    :param authkey: the secret key shared with the clients
+    :param host: the host name or IP address to listen on
+    :param port: the port to listen on, 0 picks a free port
+    :param asynchronous: whether to step the instances in parallel subprocesses
+    :param auth_timeout: seconds to wait for a client to answer the authentication challenge
+    :param max_message_size: the maximum size of a received request in bytes
+    """
+
+    def __init__(
+        self,
+        env_fns: List[Callable[[], gym.Env]],
+        authkey: bytes,
+        host: str = "localhost",
+        port: int = 0,
+        asynchronous: bool = False,
+        auth_timeout: float = 10,
+        max_message_size: int = MAX_MESSAGE_SIZE,
+    ) -> None:
+        _check_authkey(authkey)
+        self.authkey = authkey
+        self.auth_timeout = auth_timeout
+        self.max_message_size = max_message_size
+        self.env = AsyncVectorEnv(env_fns) if asynchronous else SyncVectorEnv(env_fns)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen()
+        self.address = self.socket.getsockname()
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Serve requests from a client until it disconnects"""
+        send_message(
+            conn,
+            HANDSHAKE,
+            [np.array(self.env.num_envs)]
+            + encode_space(self.env.single_observation_space)
+            + encode_space(self.env.single_action_space),
+        )
+        while True:
+            try:
+                op, arrays = recv_message(conn, self.max_message_size)
+            except (EOFError, ConnectionResetError, ValueError):
+                return
+            if op == STEP:
+                observations, rewards, dones, infos = self.env.step(arrays[0])
+                # Infos are usually empty so they're only encoded when needed
+                infos = encode_infos(infos) if any(infos) else []
+                send_message(conn, STEP, [observations, rewards, dones] + infos)
+            elif op == RESET:
+                send_message(conn, RESET, [self.env.reset()])
+            elif op == SEED:
+                self.env.seed(arrays[0].tolist())
+                send_message(conn, SEED)
+            else:
+                # Closing, or an unknown operation from a broken client
+                return
+
+    def serve(self, num_clients: Optional[int] = None) -> None:
+        """
+        Serve clients one at a time, clients failing to authenticate are dropped and not counted
+
+        :param num_clients: optional number of clients to serve before returning, serves forever if None
+        """
+        served = 0
+        while num_clients is None or served < num_clients:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                # The server was closed
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                try:
+                    authenticate_client(conn, self.authkey, self.auth_timeout)
+                except AuthenticationError:
+                    continue
+                self._handle(conn)
+            finally:
+                conn.close()
+            served += 1
+
+    def close(self) -> None:
+        """Stop listening and close the environment instances"""
+        self.socket.close()
+        self.env.close()
+
+
+class EnvClient(VectorEnv):
+    """
+    Client presenting the environment instances of an `EnvServer` as a `VectorEnv`.
+    Requests are pipelined: `step_async` sends the actions and returns straight away so
+    the learner can do other work, e.g. process the previous batch, while the server steps.
+    The results are collected in order by `step_wait`. The client and the server
+    authenticate each other with the server's `authkey` when it connects.
+
+    :param host: the host name or IP address of the server
+    :param port: the port of the server
+    :param authkey: the secret key shared with the server
+    :param connect_timeout: seconds to keep retrying to connect to the server
+    :param max_message_size: the maximum size of a received result in bytes
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        authkey: bytes,
+        connect_timeout: float = 10,
+        max_message_size: int = MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.socket = connect(host, port, authkey, connect_timeout)
+        self.max_message_size = max_message_size
+        _, arrays = recv_message(self.socket, max_message_size)
+        super().__init__(
+            int(arrays[0]), decode_space(arrays[1:4]), decode_space(arrays[4:7])
+        )
+        # Operations sent but not yet received
+        self._pending = deque()
+
+    def _request(self, op: bytes, arrays: Sequence[np.ndarray] = ()) -> None:
+        send_message(self.socket, op, arrays)
+        self._pending.append(op)
+
+    def _response(self, op: bytes) -> List[np.ndarray]:
+        if not self._pending or self._pending[0] != op:
+            raise RuntimeError(
+                f"Waiting for operation `{op}` but the next pending operation is "
+                f"`{self._pending[0] if self._pending else None}`"
+            )
+        self._pending.popleft()
+        received_op, arrays = recv_message(self.socket, self.max_message_size)
+        assert received_op == op
+        return arrays
+
+    @property
+    def num_pending(self) -> int:
+        """The number of requests sent which haven't been received yet"""
+        return len(self._pending)
+
+    def seed(self, seeds=None) -> None:
+        if seeds is None:
+            return
+        if isinstance(seeds, int):
+            seeds = [seeds + i for i in range(self.num_envs)]
+        self._request(SEED, [np.array(seeds, dtype=np.int64)])
+        self._response(SEED)
+
+    def reset_async(self) -> None:
+        self._request(RESET)
+
+    def reset_wait(self, **kwargs) -> np.ndarray:
+        (observations,) = self._response(RESET)
+        return observations
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._request(STEP, [np.asarray(actions)])
+
+    def step_wait(self, **kwargs) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List]:
+        observations, rewards, dones, *infos = self._response(STEP)
+        infos = decode_infos(infos) if infos else [{} for _ in range(self.num_envs)]
+        return observations, rewards, dones, infos
+
+    def close_extras(self, **kwargs) -> None:
+        try:
+            send_message(self.socket, CLOSE)
+        except OSError:
+            pass
+        self.socket.close()
@@ -27,6 +27,13 @@ class Trajectories:
     dones: Tensor
 
 
+@dataclass
+class NStepTrajectories(Trajectories):
+    """Sample n-step trajectory data with the discount to bootstrap each trajectory with"""
+
+    discounts: Tensor
+
+
 @dataclass
 class DictTrajectories:
     """Sample trajectory data with dictionary observations needed for algorithms"""
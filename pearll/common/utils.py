@@ -6,8 +6,6 @@ import numpy as np
 import torch as T
 from gym import Env, spaces
 
-from pearll import settings
-
 
 def get_device(device: Union[T.device, str]) -> T.device:
     """
@@ -36,6 +34,9 @@ def get_device(device: Union[T.device, str]) -> T.device:
 
 def to_torch(*data) -> Union[Tuple[T.Tensor], T.Tensor]:
     """Convert to torch tensors"""
+    # Imported here since the settings module depends on this one
+    from pearll import settings
+
     result = [None] * len(data)
     for i, el in enumerate(data):
         if isinstance(el, np.ndarray):
@@ -146,11 +147,11 @@ def set_seed(seed: int, env: Env) -> None:
 def filter_rewards(rewards: np.ndarray, dones: np.ndarray) -> np.ndarray:
     """
     Filter rewards based on done flags, all rewards after a done are set to 0.
-    :param rewards: The rewards to filter (num_envs, num_steps) or (num_steps,)
+    :param rewards: The rewards to filter (num_envs, num_steps, ...) or (num_steps,)
     :param dones: The done flags (num_envs, num_steps) or (num_steps,)
     :return: The filtered rewards
     """
-    if rewards.ndim == 1:
+    if dones.ndim == 1:
         rewards = rewards[np.newaxis, :]
         dones = dones[np.newaxis, :]
     for i, env_dones in enumerate(dones):
@@ -7,6 +7,7 @@ import torch as T
 
 from pearll.agents import A2C, CEM_RL, DDPG, DQN, ES, GA, PPO, AdamES, DynaQ
 from pearll.buffers import HERBuffer
+from pearll.common.function_envs import Sphere
 from pearll.common.utils import get_space_shape
 from pearll.models import ActorCritic, Critic, Dummy, EpsilonGreedyActor
 from pearll.models.actor_critics import Actor, Model
@@ -24,22 +25,6 @@ from pearll.settings import (
 from pearll.updaters.environment import DeepRegression
 
 
-class Sphere(gym.Env):
-    """
-    Sphere(2) function for testing ES agent.
-    """
-
-    def __init__(self):
-        self.action_space = gym.spaces.Box(low=-100, high=100, shape=(2,))
-        self.observation_space = gym.spaces.Discrete(1)
-
-    def step(self, action):
-        return 0, -(action[0] ** 2 + action[1] ** 2), False, {}
-
-    def reset(self):
-        return 0
-
-
 def dqn_demo():
     env = gym.make("CartPole-v0")
     agent = DQN(
@@ -111,7 +96,7 @@ def ddpg_demo():
 
 def es_demo():
     POPULATION_SIZE = 10
-    env = gym.vector.SyncVectorEnv([lambda: Sphere() for _ in range(POPULATION_SIZE)])
+    env = Sphere(num_envs=POPULATION_SIZE)
     actor = Dummy(space=env.single_action_space, state=np.array([10, 10]))
     critic = Dummy(space=env.single_action_space, state=np.array([10, 10]))
 
@@ -534,7 +519,7 @@ def cem_ddpg_demo():
 
 def adames_demo():
     POPULATION_SIZE = 10
-    env = gym.vector.SyncVectorEnv([lambda: Sphere() for _ in range(POPULATION_SIZE)])
+    env = Sphere(num_envs=POPULATION_SIZE)
     actor = Dummy(space=env.single_action_space, state=np.array([10, 10]))
     critic = Dummy(space=env.single_action_space, state=np.array([10, 10]))
 
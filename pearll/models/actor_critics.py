@@ -1,4 +1,5 @@
 import copy
+import re
 from typing import List, Optional, Union
 
 import numpy as np
@@ -50,6 +51,10 @@ class Critic(T.nn.Module):
     :param head: the head network
     :param create_target: whether to create a target network
     :param polyak_coeff: the polyak coefficient for the target network
+    :param genome: optional regex pattern(s) matched against the start of the `state_dict` names
+        (e.g. "head" for the head only or "torso.model.2" for a single layer) defining the
+        parameters which make up the individual state, if None every parameter is included.
+        Parameters outside of the genome are shared in memory across a population.
     """
 
     def __init__(
@@ -59,17 +64,19 @@ class Critic(T.nn.Module):
         head: BaseCriticHead,
         create_target: bool = False,
         polyak_coeff: float = 0.995,
+        genome: Optional[Union[str, List[str]]] = None,
     ):
         super().__init__()
         self.polyak_coeff = polyak_coeff
+        self.genome = [genome] if isinstance(genome, str) else genome
         self.model = Model(encoder, torso, head)
         self.state_info = {}
         self.make_state_info()
+        if not self.state_info:
+            raise ValueError(f"The genome {self.genome} doesn't match any parameters")
+        state_dict = self.model.state_dict()
         self.state = np.concatenate(
-            [
-                d.flatten().detach().cpu().numpy()
-                for d in self.model.state_dict().values()
-            ]
+            [state_dict[k].flatten().detach().cpu().numpy() for k in self.state_info]
         )
         self.space = Box(low=-1e6, high=1e6, shape=self.state.shape)
         self.space_shape = get_space_shape(self.space)
@@ -83,13 +90,33 @@ class Critic(T.nn.Module):
                 target.requires_grad = False
             self.assign_targets()
 
+    def in_genome(self, name: str) -> bool:
+        """Whether the named parameter is part of the individual state"""
+        return self.genome is None or any(re.match(p, name) for p in self.genome)
+
     def make_state_info(self) -> None:
         """Make the state info dictionary"""
         start_idx = 0
         for k, v in self.model.state_dict().items():
+            if not self.in_genome(k):
+                continue
             self.state_info[k] = (v.shape, (start_idx, start_idx + v.numel()))
             start_idx += v.numel()
 
+    def clone(self) -> "Critic":
+        """
+        Copy the individual, parameters outside of the genome are shared with the copy
+        rather than duplicated.
+
+        :return: the copied individual
+        """
+        shared = {
+            id(v): v
+            for k, v in self.model.state_dict(keep_vars=True).items()
+            if not self.in_genome(k)
+        }
+        return copy.deepcopy(self, memo=shared)
+
     def set_state(self, state: np.ndarray) -> "Actor":
         """
         Set the state of the individual
@@ -103,7 +130,7 @@ class Critic(T.nn.Module):
             k: state[v[1][0] : v[1][1]].reshape(v[0])
             for k, v in zip(self.state_info.keys(), self.state_info.values())
         }
-        self.model.load_state_dict(state_dict)
+        self.model.load_state_dict(state_dict, strict=self.genome is None)
         return self
 
     def numpy(self) -> np.ndarray:
@@ -147,6 +174,8 @@ class Actor(Critic):
     :param head: the head network
     :param create_target: whether to create a target network
     :param polyak_coeff: the polyak coefficient for the target network
+    :param genome: optional regex pattern(s) matched against the start of the `state_dict` names
+        defining the parameters which make up the individual state, if None every parameter is included.
     """
 
     def __init__(
@@ -156,6 +185,7 @@ class Actor(Critic):
         head: BaseActorHead,
         create_target: bool = False,
         polyak_coeff: float = 0.995,
+        genome: Optional[Union[str, List[str]]] = None,
     ):
         super().__init__(
             encoder=encoder,
@@ -163,6 +193,7 @@ class Actor(Critic):
             head=head,
             create_target=create_target,
             polyak_coeff=polyak_coeff,
+            genome=genome,
         )
 
     def action_distribution(
@@ -186,6 +217,8 @@ class EpsilonGreedyActor(Actor):
     :param min_epsilon: the minimum epsilon value allowed
     :param create_target: whether to create a target network
     :param polyak_coeff: the polyak coefficient for the target network
+    :param genome: optional regex pattern(s) matched against the start of the `state_dict` names
+        defining the parameters which make up the individual state, if None every parameter is included.
     """
 
     def __init__(
@@ -198,6 +231,7 @@ class EpsilonGreedyActor(Actor):
         min_epsilon: float = 0,
         create_target: bool = False,
         polyak_coeff: float = 0.995,
+        genome: Optional[Union[str, List[str]]] = None,
     ):
         super().__init__(
             critic_encoder,
@@ -205,6 +239,7 @@ class EpsilonGreedyActor(Actor):
             critic_head,
             create_target=create_target,
             polyak_coeff=polyak_coeff,
+            genome=genome,
         )
         self.epsilon = start_epsilon
         self.epsilon_decay = epsilon_decay
@@ -378,7 +413,7 @@ class ActorCritic(T.nn.Module):
         :param population_std: the standard deviation of the population if a normal distribution
         """
         if population_distribution is None:
-            return [copy.deepcopy(model) for _ in range(population_size)]
+            return [model.clone() for _ in range(population_size)]
         elif population_distribution == Distribution.UNIFORM:
             population = np.random.uniform(
                 model.space_range[0],
@@ -405,7 +440,7 @@ class ActorCritic(T.nn.Module):
             population = np.round(population).astype(np.int32)
         population = np.clip(population, model.space_range[0], model.space_range[1])
 
-        return [copy.deepcopy(model).set_state(ind) for ind in population]
+        return [model.clone().set_state(ind) for ind in population]
 
     def numpy_actors(self) -> np.ndarray:
         """Get the numpy representation of the actor population."""
@@ -8,7 +8,7 @@ import numpy as np
 import torch as T
 from torch.optim.optimizer import Optimizer
 
-from pearll.common.enumerations import Distribution
+from pearll.common.enumerations import CompressionCodec, Distribution
 from pearll.common.utils import get_device
 
 DEVICE = get_device("auto")
@@ -86,15 +86,64 @@ class ExplorerSettings(Settings):
     scale: Optional[float] = None
 
 
+@dataclass
+class StorageSettings(Settings):
+    """
+    Settings for the compact dtypes buffers store transitions in, samples are converted back
+    to the compute dtypes when they're returned
+
+    :param observation_dtype: optional dtype to store float observations in, e.g. "float16"
+    :param reward_dtype: optional dtype to store rewards in, e.g. "float16"
+    :param compact_actions: whether to store discrete actions in the smallest integer dtype that fits
+    :param compact_dones: whether to store the done flags as uint8
+    """
+
+    observation_dtype: Optional[Union[str, np.dtype]] = None
+    reward_dtype: Optional[Union[str, np.dtype]] = None
+    compact_actions: bool = False
+    compact_dones: bool = False
+
+
+@dataclass
+class CompressionSettings(Settings):
+    """
+    Settings for compressing the cold chunks of a `CompressedReplayBuffer`
+
+    :param chunk_size: the number of transitions in each chunk
+    :param codec: the compression codec, "zlib", "lzma" or "lz4" if installed
+    :param level: optional compression level, higher compresses more but slower, defaults to the fastest level
+    :param cache_size: the number of decompressed chunks to keep
+    :param num_threads: the number of threads compressing and decompressing chunks
+    """
+
+    chunk_size: int = 10000
+    codec: Union[str, CompressionCodec] = "zlib"
+    level: Optional[int] = None
+    cache_size: int = 16
+    num_threads: int = 4
+
+
 @dataclass
 class BufferSettings(Settings):
     """
     Settings for buffers
 
     :buffer_size: max number of transitions to store at once in each environment
+    :reward_size: optional number of reward objectives for multi-objective environments
+    :storage_settings: optional compact storage dtypes, see `StorageSettings`
+    :frame_stack: optional number of frames stacked in each observation for the `FrameStackBuffer`
+    :compression_settings: optional chunk compression settings for the `CompressedReplayBuffer`
+    :n_step: optional max number of rewards in each return of the `NStepReplayBuffer`
+    :gamma: optional discount of the `NStepReplayBuffer` returns, should match the agent's `td_gamma`
     """
 
     buffer_size: int = int(1e6)
+    reward_size: Optional[int] = None
+    storage_settings: Optional[StorageSettings] = None
+    frame_stack: Optional[int] = None
+    compression_settings: Optional[CompressionSettings] = None
+    n_step: Optional[int] = None
+    gamma: Optional[float] = None
 
 
 @dataclass
@@ -126,3 +175,146 @@ class MutationSettings(Settings):
 
     mutation_rate: float = 0.1
     mutation_std: Optional[float] = None
+
+
+@dataclass
+class RacingSettings(Settings):
+    """
+    Settings for racing, i.e. early termination of poor individuals during population evaluation
+
+    :param selection_ratio: fraction of the population kept by selection, individuals which can't reach this cutoff are stopped
+    :param reward_bounds: optional (min, max) bounds of the reward of a single step, estimated from the rewards seen so far if None
+    :param episode_length: optional evaluation horizon, estimated from previous generations if None
+    :param min_steps: number of steps to run before any individual can be stopped
+    """
+
+    selection_ratio: float = 0.5
+    reward_bounds: Optional[Tuple[float, float]] = None
+    episode_length: Optional[int] = None
+    min_steps: int = 0
+
+
+@dataclass
+class PBTSettings(Settings):
+    """
+    Settings for Population Based Training
+
+    :param ready_steps: number of environment steps each agent trains for between exploit/explore rounds
+    :param exploit_ratio: fraction of the worst agents which copy a better agent each round
+    :param perturb_factors: factors a hyperparameter is randomly multiplied by when perturbed
+    :param resample_probability: probability of resampling a hyperparameter from its bounds instead of perturbing it
+    :param copy_buffer: whether to copy the buffer along with the model weights
+    :param checkpoint_path: directory to save the checkpoints used to copy agents
+    :param start_method: optional multiprocessing start method for the worker processes
+    """
+
+    ready_steps: int = 1000
+    exploit_ratio: float = 0.2
+    perturb_factors: Tuple[float, ...] = (0.8, 1.2)
+    resample_probability: float = 0.25
+    copy_buffer: bool = False
+    checkpoint_path: str = "pbt_checkpoints"
+    start_method: Optional[str] = None
+
+
+@dataclass
+class DistributedESSettings(Settings):
+    """
+    Settings for distributing the ES population evaluation over workers
+
+    :param authkey: the secret key shared by the coordinator and the workers, e.g. from `os.urandom`
+    :param host: the host name or IP address the coordinator listens on
+    :param port: the port the coordinator listens on, 0 picks a free port
+    :param share_size: number of individuals sent to a worker at a time
+    :param timeout: seconds to wait for the fitnesses of a share before re-dispatching it to another worker
+    :param connect_timeout: seconds to wait for a worker to connect when none are available
+    """
+
+    authkey: bytes
+    host: str = "localhost"
+    port: int = 6000
+    share_size: int = 10
+    timeout: float = 60
+    connect_timeout: float = 60
+
+
+@dataclass
+class ReplayServerSettings(Settings):
+    """
+    Settings for the replay buffer server
+
+    :param authkey: the secret key shared with the clients, e.g. from `os.urandom`
+    :param host: the host name or IP address the server listens on
+    :param port: the port the server listens on, 0 picks a free port
+    :param samples_per_insert: optional target number of sampled transitions per inserted transition, no limit if None
+    :param min_size_to_sample: number of inserted transitions required before sampling is allowed
+    :param error_buffer: allowed deviation from the target ratio, in sampled transitions, before requests are blocked
+    :param timeout: optional seconds a blocked request waits before failing, waits forever if None
+    :param max_message_size: the maximum size of a received request in bytes
+    """
+
+    authkey: bytes
+    host: str = "localhost"
+    port: int = 0
+    samples_per_insert: Optional[float] = None
+    min_size_to_sample: int = 1
+    error_buffer: float = 100
+    timeout: Optional[float] = None
+    max_message_size: int = 2 ** 30
+
+
+@dataclass
+class ArchiveSettings(Settings):
+    """
+    Settings for the quality-diversity archive. Extend this class to add params for each archive.
+
+    :param descriptor_bounds: optional (low, high) bounds of the behaviour descriptors,
+        if None the observation space bounds are used
+    """
+
+    descriptor_bounds: Optional[Tuple[Any, Any]] = None
+
+
+@dataclass
+class GridArchiveSettings(ArchiveSettings):
+    """
+    Settings for the grid archive
+
+    :param descriptor_bounds: optional (low, high) bounds of the behaviour descriptors,
+        if None the observation space bounds are used
+    :param cells_per_dim: the number of cells along each descriptor dimension
+    """
+
+    cells_per_dim: Union[int, Tuple[int, ...]] = 10
+
+
+@dataclass
+class CVTArchiveSettings(ArchiveSettings):
+    """
+    Settings for the CVT archive
+
+    :param descriptor_bounds: optional (low, high) bounds of the behaviour descriptors,
+        if None the observation space bounds are used
+    :param num_cells: the number of cells, ignored if centroids are given
+    :param centroids: optional precomputed centroids
+    :param num_samples: optional number of points to sample for the k-means clustering
+    """
+
+    num_cells: int = 1000
+    centroids: Optional[np.ndarray] = None
+    num_samples: Optional[int] = None
+
+
+@dataclass
+class NoveltySettings(Settings):
+    """
+    Settings for novelty search
+
+    :param num_neighbours: the number of nearest neighbours k used to score novelty
+    :param rebuild_frequency: the number of archive insertions before the spatial index is rebuilt
+    :param add_probability: probability of adding each evaluated behaviour to the novelty archive
+    """
+
+    num_neighbours: int = 15
+    rebuild_frequency: int = 1000
+    add_probability: float = 0.1
@@ -53,8 +53,9 @@ def gaussian_mutation(
 
     # Mutate individuals
     new_population = population.copy().astype(np.float32)
-    for i in mutation_indices:
-        new_population[i] += np.random.normal(0, mutation_std, population.shape[-1])
+    new_population[mutation_indices] += np.random.normal(
+        0, mutation_std, (mutation_indices.shape[0],) + population.shape[1:]
+    )
 
     # Discretize population as required
     if isinstance(action_space, (Discrete, MultiDiscrete)):
@@ -82,8 +83,9 @@ def uniform_mutation(
 
     # Mutate individuals
     new_population = population.copy().astype(np.float32)
-    for i in mutation_indices:
-        new_population[i] += np.random.uniform(-1, 1, population.shape[1])
+    new_population[mutation_indices] += np.random.uniform(
+        -1, 1, (mutation_indices.shape[0],) + population.shape[1:]
+    )
 
     # Discretize population as required
     if isinstance(action_space, (Discrete, MultiDiscrete)):
@@ -1,5 +1,7 @@
 """Methods for estimating the Value and Q functions"""
 
+from typing import Union
+
 import torch as T
 
 from pearll.common.type_aliases import Tensor
@@ -36,7 +38,7 @@ def TD_zero(
     rewards: Tensor,
     next_values: Tensor,
     dones: Tensor,
-    gamma: float = 0.99,
+    gamma: Union[float, Tensor] = 0.99,
 ) -> Tensor:
     """
     TD(0) target: https://lilianweng.github.io/lil-log/2018/02/19/a-long-peek-into-reinforcement-learning.html#combining-td-and-mc-learning
@@ -44,7 +46,8 @@ def TD_zero(
     :param rewards: trajectory rewards
     :param next_values: next values of trajectories from a critic function (e.g. Q function, value function)
     :param dones: the done values of each step of the trajectory, indicates whether to bootstrap
-    :param gamma: the discount factor of future rewards
+    :param gamma: the discount factor of future rewards, or the discount of each trajectory
+        when bootstrapping from different steps ahead, e.g. n-step `Trajectories.discounts`
     """
     returns = rewards + ((1 - dones) * gamma * next_values)
     assert (
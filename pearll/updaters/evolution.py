@@ -1,18 +1,21 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import torch as T
 from gym.spaces import Discrete, MultiDiscrete
 from torch.distributions import Normal, kl_divergence
 
+from pearll.common.archives import BaseArchive
+from pearll.common.noise_table import NoiseTable
 from pearll.common.type_aliases import (
     CrossoverFunc,
     MutationFunc,
     SelectionFunc,
     UpdaterLog,
 )
-from pearll.models.actor_critics import ActorCritic
+from pearll.models.actor_critics import Actor, ActorCritic, Critic, Dummy
+from pearll.signal_processing.selection_operators import crowded_comparison_order
 
 
 class BaseEvolutionUpdater(ABC):
@@ -70,6 +73,33 @@ class NoisyGradientAscent(BaseEvolutionUpdater):
     def __init__(self, model: ActorCritic, population_type: str = "actor") -> None:
         super().__init__(model, population_type)
 
+    def _sample_noise(self) -> np.ndarray:
+        """
+        Sample the noise used to generate a new population
+
+        :return: the noise of each individual (population_size, *space_shape)
+        """
+        self.normal_dist = np.random.randn(self.population_size, *self.space_shape)
+        return self.normal_dist
+
+    def _sample_population(self) -> np.ndarray:
+        """
+        Sample a new population around the mean
+
+        :return: the new population before any mutation, discretization or clipping
+        """
+        return self.mean + (self.std * self._sample_noise())
+
+    def weighted_noise(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Sum the noise of the current population weighted by e.g. the scaled rewards,
+        used to estimate the optimization direction.
+
+        :param weights: the weight of each individual (population_size,)
+        :return: the weighted sum of the noise (*space_shape)
+        """
+        return np.dot(self.normal_dist.T, weights)
+
     def __call__(
         self,
         learning_rate: float,
@@ -92,8 +122,7 @@ class NoisyGradientAscent(BaseEvolutionUpdater):
         self.mean += learning_rate * optimization_direction
 
         # Generate new population
-        self.normal_dist = np.random.randn(self.population_size, *self.space_shape)
-        population = self.mean + (self.std * self.normal_dist)
+        population = self._sample_population()
         if mutation_operator is not None:
             population = mutation_operator(population, self.space)
 
@@ -111,6 +140,159 @@ class NoisyGradientAscent(BaseEvolutionUpdater):
         return UpdaterLog(divergence=population_kl, entropy=population_entropy)
 
 
+class LowRankNoisyGradientAscent(NoisyGradientAscent):
+    """
+    Updater for the Natural Evolutionary Strategy with low rank perturbations.
+    The noise of each weight matrix of an individual is the outer product of two small
+    factors, A @ B.T / sqrt(rank), rather than a dense Gaussian sample. Only the factors are
+    sampled and stored so for a (m, n) weight matrix this needs (m + n) * rank random numbers
+    per individual instead of m * n. The population is built from the factors one parameter
+    tensor at a time and only the factors are kept, the weighted noise sum used to estimate
+    the optimization direction is accumulated directly from them. Other parameters (e.g.
+    biases) and `Dummy` individuals use dense noise.
+
+    :param model: the actor critic model containing the population
+    :param population_type: the type of population to update, either "actor" or "critic"
+    :param rank: rank of the perturbation of each weight matrix
+    """
+
+    def __init__(
+        self, model: ActorCritic, population_type: str = "actor", rank: int = 1
+    ) -> None:
+        super().__init__(model, population_type)
+        self.rank = rank
+        self.num_params = int(np.prod(self.space_shape))
+        individual = model.actor if population_type == "actor" else model.critic
+        self.segments = self._make_segments(individual)
+        self.factors = []
+
+        # Replace the dense initial population with a low rank one
+        self.normal_dist = None
+        population = self._sample_population()
+        if isinstance(self.space, (Discrete, MultiDiscrete)):
+            population = np.round(population).astype(np.int32)
+        population = np.clip(population, self.space_range[0], self.space_range[1])
+        self.update_networks(population)
+
+    def _make_segments(
+        self, individual: Union[Actor, Critic]
+    ) -> List[Tuple[int, int, Tuple[int, ...]]]:
+        """
+        Split the flat parameter vector into one segment per parameter tensor
+
+        :param individual: the individual defining the parameter layout
+        :return: list of (start index, end index, shape) of each segment
+        """
+        if isinstance(individual, Dummy):
+            return [(0, self.num_params, (self.num_params,))]
+        return [
+            (start, end, tuple(shape))
+            for shape, (start, end) in individual.state_info.values()
+        ]
+
+    def _sample_factors(self) -> None:
+        """Sample the noise factors of each parameter tensor of a new population"""
+        self.factors = []
+        for start, end, shape in self.segments:
+            if len(shape) >= 2:
+                rows, cols = shape[0], (end - start) // shape[0]
+                a = np.random.randn(self.population_size, rows, self.rank)
+                b = np.random.randn(self.population_size, cols, self.rank)
+                self.factors.append((a, b))
+            else:
+                self.factors.append(np.random.randn(self.population_size, end - start))
+
+    def _sample_population(self) -> np.ndarray:
+        self._sample_factors()
+        mean = self.mean.reshape(-1)
+        std = np.broadcast_to(self.std, self.space_shape).reshape(-1)
+        population = np.empty((self.population_size, self.num_params))
+        for (start, end, _), factor in zip(self.segments, self.factors):
+            segment = population[:, start:end]
+            if isinstance(factor, tuple):
+                a, b = factor
+                noise = np.matmul(a, b.transpose(0, 2, 1)).reshape(
+                    self.population_size, -1
+                )
+                np.multiply(noise, std[start:end] / np.sqrt(self.rank), out=segment)
+            else:
+                np.multiply(factor, std[start:end], out=segment)
+            segment += mean[start:end]
+
+        return population.reshape(self.population_size, *self.space_shape)
+
+    def weighted_noise(self, weights: np.ndarray) -> np.ndarray:
+        weights = np.asarray(weights)
+        direction = np.zeros(self.num_params)
+        for (start, end, _), factor in zip(self.segments, self.factors):
+            if isinstance(factor, tuple):
+                a, b = factor
+                # sum_i w_i * A_i @ B_i.T as a single matrix product
+                a = (a * weights[:, np.newaxis, np.newaxis]).transpose(1, 0, 2)
+                b = b.transpose(1, 0, 2)
+                direction[start:end] = (
+                    a.reshape(a.shape[0], -1) @ b.reshape(b.shape[0], -1).T
+                ).reshape(-1) / np.sqrt(self.rank)
+            else:
+                direction[start:end] = weights @ factor
+
+        return direction.reshape(self.space_shape)
+
+
+class NoiseTableGradientAscent(NoisyGradientAscent):
+    """
+    Updater for the Natural Evolutionary Strategy with noise taken from a shared noise table.
+    The noise of each individual is a slice of the table so the population is fully described
+    by the mean, the std and one noise table index per individual, which is what distributed
+    workers need to rebuild any individual.
+    https://arxiv.org/abs/1703.03864
+
+    :param model: the actor critic model containing the population
+    :param population_type: the type of population to update, either "actor" or "critic"
+    :param noise_table: the shared noise table, all processes should use the same size and seed
+    """
+
+    def __init__(
+        self,
+        model: ActorCritic,
+        population_type: str = "actor",
+        noise_table: Optional[NoiseTable] = None,
+    ) -> None:
+        super().__init__(model, population_type)
+        self.noise_table = noise_table if noise_table is not None else NoiseTable()
+        self.num_params = int(np.prod(self.space_shape))
+        self.noise_indices = None
+
+        # Replace the initial population with one from the noise table
+        self._sample_noise()
+        self.update_networks(self.population_from_indices(self.noise_indices))
+
+    def _noise(self, indices: np.ndarray) -> np.ndarray:
+        """Get the noise of the individuals with the given noise table indices"""
+        return self.noise_table.gather(indices, self.num_params).reshape(
+            len(indices), *self.space_shape
+        )
+
+    def _sample_noise(self) -> np.ndarray:
+        self.noise_indices = self.noise_table.sample_indices(
+            self.population_size, self.num_params
+        )
+        self.normal_dist = self._noise(self.noise_indices)
+        return self.normal_dist
+
+    def population_from_indices(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Rebuild individuals of the current population from their noise table indices
+
+        :param indices: the noise table index of each individual
+        :return: the individuals (len(indices), *space_shape)
+        """
+        population = self.mean + (self.std * self._noise(indices))
+        if isinstance(self.space, (Discrete, MultiDiscrete)):
+            population = np.round(population).astype(np.int32)
+        return np.clip(population, self.space_range[0], self.space_range[1])
+
+
 class GeneticUpdater(BaseEvolutionUpdater):
     """
     Updater for the Genetic Algorithm
@@ -133,7 +315,8 @@ class GeneticUpdater(BaseEvolutionUpdater):
         """
         Perform an optimization step
 
-        :param rewards: the rewards for the current population
+        :param rewards: the rewards for the current population, (population_size, num_objectives)
+            for multi-objective optimization
         :param selection_operator: the selection operator function
         :param crossover_operator: the crossover operator function
         :param mutation_operator: the mutation operator function
@@ -147,7 +330,11 @@ class GeneticUpdater(BaseEvolutionUpdater):
             old_population = self.model.numpy_critics()
         if elitism > 0:
             num_elite = int(self.population_size * elitism)
-            elite_indices = np.argpartition(rewards, -num_elite)[-num_elite:]
+            if rewards.ndim > 1:
+                # Multiple objectives, keep the best by front then crowding distance
+                elite_indices = crowded_comparison_order(rewards)[:num_elite]
+            else:
+                elite_indices = np.argpartition(rewards, -num_elite)[-num_elite:]
             elite_population = old_population[elite_indices]
 
         # Main update
@@ -168,3 +355,285 @@ class GeneticUpdater(BaseEvolutionUpdater):
         )
 
         return UpdaterLog(divergence=divergence, entropy=entropy)
+
+
+class MAPElitesUpdater(BaseEvolutionUpdater):
+    """
+    Updater for MAP-Elites
+    https://arxiv.org/abs/1504.04909
+
+    The current population is inserted into the archive, then the new population is
+    sampled uniformly from the occupied cells and mutated.
+
+    :param model: the actor critic model containing the population
+    :param archive: the quality-diversity archive storing the elites
+    :param population_type: the type of population to update, either "actor" or "critic"
+    """
+
+    def __init__(
+        self,
+        model: ActorCritic,
+        archive: BaseArchive,
+        population_type: str = "actor",
+    ) -> None:
+        super().__init__(model, population_type)
+        self.archive = archive
+
+    def __call__(
+        self,
+        rewards: np.ndarray,
+        descriptors: np.ndarray,
+        mutation_operator: Optional[MutationFunc] = None,
+    ) -> UpdaterLog:
+        """
+        Perform an optimization step
+
+        :param rewards: the rewards for the current population
+        :param descriptors: the behaviour descriptors of the current population
+        :param mutation_operator: the mutation operator function
+        :return: the updater log
+        """
+        if self.population_type == "actor":
+            old_population = self.model.numpy_actors()
+        elif self.population_type == "critic":
+            old_population = self.model.numpy_critics()
+        self.archive.add(old_population, rewards, descriptors)
+
+        new_population = self.archive.sample(self.population_size)
+        if mutation_operator is not None:
+            new_population = mutation_operator(new_population, self.space)
+        self.update_networks(new_population)
+
+        # Calculate Log metrics
+        divergence = np.mean(np.abs(new_population - old_population))
+        entropy = np.mean(
+            np.abs(np.max(new_population, axis=0) - np.min(new_population, axis=0))
+        )
+
+        return UpdaterLog(divergence=divergence, entropy=entropy)
+
+
+class CMAES(BaseEvolutionUpdater):
+    """
+    Updater for the Covariance Matrix Adaptation Evolution Strategy (CMA-ES)
+    https://arxiv.org/abs/1604.00772
+
+    The covariance matrix is adapted with the rank-one and rank-mu updates, where the rank-mu
+    update is a single weighted matrix product over the selected individuals. The
+    eigendecomposition used to sample new populations is only recomputed every O(n)
+    generations, n being the number of parameters. Memory and time scale with n^2 so this
+    is best suited to small genomes, see `SepCMAES` for large genomes.
+
+    :param model: the actor critic model containing the population
+    :param population_type: the type of population to update, either "actor" or "critic"
+    """
+
+    def __init__(self, model: ActorCritic, population_type: str = "actor") -> None:
+        super().__init__(model, population_type)
+        if self.mean is None:
+            self.mean = self._numpy_population().mean(axis=0)
+        self.sigma = float(np.mean(self.std))
+        self.num_params = int(np.prod(self.space_shape))
+        n = self.num_params
+
+        # Recombination weights of the best half of the population
+        self.mu = max(1, self.population_size // 2)
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / np.sum(weights)
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+
+        # Adaptation rates
+        self.c_c = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.c_sigma = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c_1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.c_mu = min(
+            1 - self.c_1,
+            2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff),
+        )
+        self.damping = (
+            1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.c_sigma
+        )
+        # Expected norm of a standard normal vector
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        self.path_c = np.zeros(n)
+        self.path_sigma = np.zeros(n)
+        self.generation = 0
+        self._init_covariance()
+
+    def _numpy_population(self) -> np.ndarray:
+        """Get the numpy representation of the population"""
+        if self.population_type == "actor":
+            return self.model.numpy_actors()
+        elif self.population_type == "critic":
+            return self.model.numpy_critics()
+
+    def _init_covariance(self) -> None:
+        """Initialize the covariance matrix and its eigendecomposition"""
+        n = self.num_params
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.eigen_generation = 0
+        self.eigen_interval = max(
+            1, int(self.population_size / (self.c_1 + self.c_mu) / n / 10)
+        )
+
+    def _sample(self, normal_dist: np.ndarray) -> np.ndarray:
+        """
+        Transform standard normal samples to samples with covariance C
+
+        :param normal_dist: standard normal samples (population_size, num_params)
+        :return: the transformed samples
+        """
+        return (normal_dist * self.D) @ self.B.T
+
+    def _whiten(self, step: np.ndarray) -> np.ndarray:
+        """
+        Multiply a step by C^(-1/2)
+
+        :param step: the step to transform
+        :return: the transformed step
+        """
+        return self.B @ ((self.B.T @ step) / self.D)
+
+    def _update_covariance(self, steps: np.ndarray, h_sigma: float) -> None:
+        """
+        Rank-one and rank-mu update of the covariance matrix
+
+        :param steps: the normalized steps of the selected individuals (mu, num_params)
+        :param h_sigma: the step size stall indicator
+        """
+        rank_one = (
+            np.outer(self.path_c, self.path_c)
+            + (1 - h_sigma) * self.c_c * (2 - self.c_c) * self.C
+        )
+        rank_mu = (steps.T * self.weights) @ steps
+        self.C = (
+            (1 - self.c_1 - self.c_mu) * self.C
+            + self.c_1 * rank_one
+            + self.c_mu * rank_mu
+        )
+
+        # Lazy eigendecomposition
+        if self.generation - self.eigen_generation >= self.eigen_interval:
+            self.eigen_generation = self.generation
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    def _coordinate_std(self) -> np.ndarray:
+        """Get the standard deviation of each parameter"""
+        return self.sigma * np.sqrt(np.diag(self.C))
+
+    def __call__(
+        self,
+        rewards: np.ndarray,
+        learning_rate: float = 1,
+        mutation_operator: Optional[MutationFunc] = None,
+    ) -> UpdaterLog:
+        """
+        Perform an optimization step
+
+        :param rewards: the rewards for the current population
+        :param learning_rate: the learning rate of the mean
+        :param mutation_operator: the mutation operator
+        :return: the updater log
+        """
+        n = self.num_params
+        mean = self.mean.reshape(-1).astype(np.float64)
+        # Snapshot current population dist for kl divergence
+        old_dist = Normal(
+            T.from_numpy(mean.copy()), T.from_numpy(self._coordinate_std())
+        )
+
+        # Normalized steps of the current population from the mean
+        population = self._numpy_population().reshape(self.population_size, n)
+        steps = (population - mean) / self.sigma
+        selected_steps = steps[np.argsort(-np.asarray(rewards).reshape(-1))[: self.mu]]
+        weighted_step = self.weights @ selected_steps
+
+        # Main update
+        mean = mean + learning_rate * self.sigma * weighted_step
+        self.generation += 1
+        self.path_sigma = (1 - self.c_sigma) * self.path_sigma + np.sqrt(
+            self.c_sigma * (2 - self.c_sigma) * self.mu_eff
+        ) * self._whiten(weighted_step)
+        path_sigma_norm = np.linalg.norm(self.path_sigma)
+        h_sigma = float(
+            path_sigma_norm
+            / np.sqrt(1 - (1 - self.c_sigma) ** (2 * self.generation))
+            / self.chi_n
+            < 1.4 + 2 / (n + 1)
+        )
+        self.path_c = (1 - self.c_c) * self.path_c + h_sigma * np.sqrt(
+            self.c_c * (2 - self.c_c) * self.mu_eff
+        ) * weighted_step
+        self._update_covariance(selected_steps, h_sigma)
+        self.sigma *= np.exp(
+            (self.c_sigma / self.damping) * (path_sigma_norm / self.chi_n - 1)
+        )
+        self.mean[...] = mean.reshape(self.mean.shape)
+
+        # Generate new population
+        self.normal_dist = np.random.randn(self.population_size, n)
+        population = mean + self.sigma * self._sample(self.normal_dist)
+        population = population.reshape(self.population_size, *self.space_shape)
+        if mutation_operator is not None:
+            population = mutation_operator(population, self.space)
+
+        # Discretize and clip population as needed
+        if isinstance(self.space, (Discrete, MultiDiscrete)):
+            population = np.round(population).astype(np.int32)
+        population = np.clip(population, self.space_range[0], self.space_range[1])
+        self.update_networks(population)
+
+        # Calculate Log metrics
+        new_dist = Normal(T.from_numpy(mean), T.from_numpy(self._coordinate_std()))
+        population_entropy = new_dist.entropy().mean()
+        population_kl = kl_divergence(old_dist, new_dist).mean()
+
+        return UpdaterLog(divergence=population_kl, entropy=population_entropy)
+
+
+class SepCMAES(CMAES):
+    """
+    Updater for the separable CMA-ES which only adapts the diagonal of the covariance matrix
+    https://hal.inria.fr/inria-00287367/document
+
+    Memory and time scale linearly with the number of parameters and there is no
+    eigendecomposition, making this suitable for evolving neural networks.
+
+    :param model: the actor critic model containing the population
+    :param population_type: the type of population to update, either "actor" or "critic"
+    """
+
+    def __init__(self, model: ActorCritic, population_type: str = "actor") -> None:
+        super().__init__(model, population_type)
+
+    def _init_covariance(self) -> None:
+        """Initialize the diagonal covariance and faster adaptation rates"""
+        n = self.num_params
+        self.C = np.ones(n)
+        self.D = np.ones(n)
+        self.c_1 = min(1, self.c_1 * (n + 2) / 3)
+        self.c_mu = min(1 - self.c_1, self.c_mu * (n + 2) / 3)
+
+    def _sample(self, normal_dist: np.ndarray) -> np.ndarray:
+        return normal_dist * self.D
+
+    def _whiten(self, step: np.ndarray) -> np.ndarray:
+        return step / self.D
+
+    def _update_covariance(self, steps: np.ndarray, h_sigma: float) -> None:
+        rank_one = self.path_c ** 2 + (1 - h_sigma) * self.c_c * (2 - self.c_c) * self.C
+        rank_mu = self.weights @ (steps ** 2)
+        self.C = (
+            (1 - self.c_1 - self.c_mu) * self.C
+            + self.c_1 * rank_one
+            + self.c_mu * rank_mu
+        )
+        self.D = np.sqrt(self.C)
+
+    def _coordinate_std(self) -> np.ndarray:
+        return self.sigma * self.D
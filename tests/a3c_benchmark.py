@@ -0,0 +1,61 @@
+"""
+Benchmark the training throughput of A3C against the synchronous A2C on this machine.
+Run with `python -m tests.a3c_benchmark`
+"""
+import multiprocessing as mp
+import time
+
+import gym
+import torch as T
+
+from pearll.agents import A3C
+from pearll.agents.a2c import A2C
+from pearll.settings import BufferSettings, LoggerSettings
+
+NUM_STEPS = 20000
+BATCH_SIZE = 20
+
+
+def make_agent():
+    return A2C(
+        env=gym.make("CartPole-v0"),
+        buffer_settings=BufferSettings(buffer_size=BATCH_SIZE + 1),
+        logger_settings=LoggerSettings(verbose=False),
+    )
+
+
+def benchmark_a2c() -> float:
+    agent = make_agent()
+    start = time.perf_counter()
+    agent.fit(
+        num_steps=NUM_STEPS,
+        batch_size=BATCH_SIZE,
+        train_frequency=("step", BATCH_SIZE),
+    )
+    return agent.step / (time.perf_counter() - start)
+
+
+def benchmark_a3c(num_workers: int) -> float:
+    a3c = A3C(make_agent, num_workers=num_workers, start_method="fork", seed=0)
+    a3c.fit(
+        num_steps=NUM_STEPS * num_workers,
+        batch_size=BATCH_SIZE,
+        train_frequency=("step", BATCH_SIZE),
+    )
+    return a3c.steps_per_second
+
+
+if __name__ == "__main__":
+    num_cores = mp.cpu_count()
+    print(f"{num_cores} CPU cores, {NUM_STEPS} environment steps per worker")
+    T.set_num_threads(1)
+    a2c_rate = benchmark_a2c()
+    print(f"A2C: {a2c_rate:.0f} steps/s")
+    num_workers = 1
+    while num_workers <= num_cores:
+        rate = benchmark_a3c(num_workers)
+        print(
+            f"A3C with {num_workers} workers: {rate:.0f} steps/s, "
+            f"{rate / a2c_rate:.2f}x A2C"
+        )
+        num_workers *= 2
@@ -0,0 +1,26 @@
+"""
+Benchmark the time to evaluate each candidate of the batched test function environments.
+Run with `python -m tests.function_env_benchmark`
+"""
+import time
+
+import numpy as np
+
+from pearll.common.function_envs import Ackley, Rastrigin, Rosenbrock, Sphere
+
+NUM_ENVS = int(1e5)
+DIMENSION = 10
+NUM_STEPS = 10
+
+
+if __name__ == "__main__":
+    print(f"{NUM_ENVS} candidates of dimension {DIMENSION}")
+    for env_class in (Sphere, Rastrigin, Rosenbrock, Ackley):
+        env = env_class(num_envs=NUM_ENVS, dimension=DIMENSION)
+        actions = np.random.uniform(-1, 1, (NUM_ENVS, DIMENSION))
+        env.step(actions)
+        start = time.perf_counter()
+        for _ in range(NUM_STEPS):
+            env.step(actions)
+        seconds = (time.perf_counter() - start) / (NUM_STEPS * NUM_ENVS)
+        print(f"{env_class.__name__}: {seconds * 1e6:.3f} us per candidate")
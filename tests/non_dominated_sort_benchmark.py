@@ -0,0 +1,34 @@
+"""
+Benchmark `non_dominated_sort` on random populations of several sizes and numbers of objectives.
+Run with `python -m tests.non_dominated_sort_benchmark`
+"""
+import time
+
+import numpy as np
+
+from pearll.signal_processing.selection_operators import non_dominated_sort
+
+POPULATION_SIZES = [1000, 10000]
+NUM_OBJECTIVES = [1, 2, 3, 5]
+NUM_REPEATS = 5
+
+
+def benchmark(fitness_scores: np.ndarray) -> float:
+    """Get the mean number of seconds to sort the population"""
+    non_dominated_sort(fitness_scores)
+    start = time.perf_counter()
+    for _ in range(NUM_REPEATS):
+        non_dominated_sort(fitness_scores)
+    return (time.perf_counter() - start) / NUM_REPEATS
+
+
+if __name__ == "__main__":
+    np.random.seed(8)
+    for population_size in POPULATION_SIZES:
+        for num_objectives in NUM_OBJECTIVES:
+            fitness_scores = np.random.rand(population_size, num_objectives)
+            seconds = benchmark(fitness_scores)
+            print(
+                f"{population_size} individuals, {num_objectives} objectives: "
+                f"{seconds * 1e3:.1f} ms"
+            )
@@ -0,0 +1,58 @@
+"""
+Benchmark the sampling throughput of the packed row layout of `PackedReplayBuffer` against the
+struct-of-arrays layout of `ReplayBuffer` at several observation sizes.
+Run with `python -m tests.packed_buffer_benchmark`
+"""
+import time
+
+import gym
+import numpy as np
+
+from pearll.buffers import PackedReplayBuffer, ReplayBuffer
+
+BUFFER_SIZE = int(1e6)
+BATCH_SIZE = 256
+NUM_SAMPLES = 500
+OBSERVATION_SIZES = [4, 17, 64, 256]
+
+
+def make_env(observation_size: int) -> gym.Env:
+    env = gym.make("Pendulum-v0")
+    env.observation_space = gym.spaces.Box(-1, 1, (observation_size,), np.float32)
+    return env
+
+
+def fill(buffer: ReplayBuffer, observation_size: int) -> None:
+    # Write the columns directly, filling through `add_trajectory` would dominate the benchmark
+    buffer.observations[:] = np.random.uniform(-1, 1, (BUFFER_SIZE, observation_size))
+    if hasattr(buffer, "rows"):
+        buffer.next_observations[:] = np.roll(buffer.observations, -1, axis=0)
+    buffer.actions[:] = np.random.uniform(-1, 1, buffer.actions.shape)
+    buffer.rewards[:] = np.random.uniform(-1, 1, buffer.rewards.shape)
+    buffer.full = True
+
+
+def benchmark(buffer: ReplayBuffer) -> float:
+    """Get the number of transitions sampled per second"""
+    buffer.sample(BATCH_SIZE, dtype="numpy")
+    start = time.perf_counter()
+    for _ in range(NUM_SAMPLES):
+        buffer.sample(BATCH_SIZE, dtype="numpy")
+    return NUM_SAMPLES * BATCH_SIZE / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    print(f"{BUFFER_SIZE} transitions, batches of {BATCH_SIZE}")
+    for observation_size in OBSERVATION_SIZES:
+        env = make_env(observation_size)
+        rates = []
+        for buffer_class in (ReplayBuffer, PackedReplayBuffer):
+            buffer = buffer_class(env, BUFFER_SIZE)
+            fill(buffer, observation_size)
+            rates.append(benchmark(buffer))
+            del buffer
+        print(
+            f"observation size {observation_size}: "
+            f"struct-of-arrays {rates[0] / 1e6:.2f}M transitions/s, "
+            f"packed {rates[1] / 1e6:.2f}M transitions/s, {rates[1] / rates[0]:.2f}x"
+        )
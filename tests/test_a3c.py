@@ -0,0 +1,33 @@
+import gym
+import pytest
+import torch as T
+
+from pearll.agents import A3C
+from pearll.agents.a2c import A2C
+from pearll.settings import BufferSettings, LoggerSettings
+
+
+def make_agent():
+    return A2C(
+        env=gym.make("CartPole-v0"),
+        buffer_settings=BufferSettings(buffer_size=20),
+        logger_settings=LoggerSettings(verbose=False),
+    )
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_a3c(start_method):
+    a3c = A3C(make_agent, num_workers=2, start_method=start_method, seed=0)
+    initial_params = [p.detach().clone() for p in a3c.model.actors[0].parameters()]
+    assert all(p.is_shared() for p in a3c.model.parameters())
+
+    a3c.fit(num_steps=40, batch_size=5, train_frequency=("step", 5))
+
+    # Both workers stepped their own environment and updated the shared weights
+    assert a3c.num_steps == 40
+    assert a3c.agent.step == 40
+    assert a3c.steps_per_second > 0
+    assert any(
+        not T.equal(initial, p)
+        for initial, p in zip(initial_params, a3c.model.actors[0].parameters())
+    )
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from pearll.common.archives import CVTArchive, GridArchive, NoveltyArchive
+
+
+def test_grid_archive_index():
+    archive = GridArchive(
+        genome_shape=(2,), descriptor_bounds=([0, 0], [1, 2]), cells_per_dim=(2, 4)
+    )
+    assert archive.num_cells == 8
+    descriptors = np.array([[0, 0], [0.9, 1.9], [0.6, 0.6], [-1, 5]])
+    np.testing.assert_array_equal(archive.index(descriptors), [0, 7, 5, 3])
+
+
+def test_cvt_archive_index():
+    centroids = np.array([[0, 0], [1, 1], [0, 1]])
+    archive = CVTArchive(
+        genome_shape=(2,), descriptor_bounds=(0, 1), centroids=centroids
+    )
+    assert archive.num_cells == 3
+    descriptors = np.array([[0.1, 0.2], [0.9, 0.8], [0.2, 0.7]])
+    np.testing.assert_array_equal(archive.index(descriptors), [0, 1, 2])
+
+    archive = CVTArchive(
+        genome_shape=(2,), descriptor_bounds=(0, 1), num_cells=10, num_samples=200
+    )
+    assert archive.centroids.shape == (10, 1)
+
+
+def test_archive_add():
+    archive = GridArchive(genome_shape=(2,), descriptor_bounds=(0, 1), cells_per_dim=2)
+    genomes = np.arange(8).reshape(4, 2)
+    fitness = np.array([1, 3, 2, 0])
+    descriptors = np.array([0.1, 0.2, 0.3, 0.9])
+
+    # collisions in the same cell keep the best individual
+    assert archive.add(genomes, fitness, descriptors) == 2
+    np.testing.assert_array_equal(archive.fitness, [3, 0])
+    np.testing.assert_array_equal(archive.genomes, [[2, 3], [6, 7]])
+    assert archive.coverage == 1
+    assert archive.qd_score == 3
+
+    # worse individuals don't replace the elites
+    assert archive.add(genomes[:1], [2], [0.4]) == 0
+    assert archive.add(genomes[:1], [5], [0.4]) == 1
+    genome, fitness = archive.best()
+    np.testing.assert_array_equal(genome, [0, 1])
+    assert fitness == 5
+
+    samples = archive.sample(100)
+    assert samples.shape == (100, 2)
+    assert set(map(tuple, samples)) == {(0, 1), (6, 7)}
+
+
+def test_large_archive():
+    archive = GridArchive(
+        genome_shape=(10,), descriptor_bounds=(0, 1), cells_per_dim=(100, 1000)
+    )
+    assert archive.num_cells == 100000
+    for _ in range(5):
+        genomes = np.random.randn(5000, 10)
+        fitness = np.random.randn(5000)
+        descriptors = np.random.rand(5000, 2)
+        archive.add(genomes, fitness, descriptors)
+
+    # every elite is the best individual inserted into its cell
+    cells = archive.index(archive.descriptors[archive.occupied])
+    np.testing.assert_array_equal(cells, np.flatnonzero(archive.occupied))
+    assert archive.size > 20000
+    assert archive.sample(5000).shape == (5000, 10)
+
+
+def test_empty_archive_sample():
+    archive = GridArchive(genome_shape=(2,), descriptor_bounds=(0, 1))
+    with pytest.raises(AssertionError):
+        archive.sample(1)
+
+
+def brute_force_novelty(descriptors, archive_descriptors, k):
+    novelty = np.zeros(descriptors.shape[0])
+    for i, descriptor in enumerate(descriptors):
+        others = np.concatenate(
+            [np.delete(descriptors, i, axis=0), archive_descriptors]
+        )
+        distances = np.sort(np.linalg.norm(others - descriptor, axis=1))
+        novelty[i] = distances[:k].mean()
+    return novelty
+
+
+def test_novelty_archive():
+    np.random.seed(0)
+    archive = NoveltyArchive(descriptor_size=3, num_neighbours=5, rebuild_frequency=50)
+    added = np.zeros((0, 3))
+
+    # empty archive only compares to the rest of the population
+    population = np.random.randn(20, 3)
+    np.testing.assert_allclose(
+        archive.novelty(population), brute_force_novelty(population, added, 5)
+    )
+
+    # the spatial index is rebuilt periodically, recent insertions are searched by brute force
+    for _ in range(6):
+        new = np.random.randn(30, 3)
+        archive.add(new)
+        added = np.concatenate([added, new])
+        population = np.random.randn(20, 3)
+        np.testing.assert_allclose(
+            archive.novelty(population),
+            brute_force_novelty(population, added, 5),
+            rtol=1e-6,
+        )
+    assert archive.size == 180
+    assert archive.tree_size == 180
+
+    # novel behaviours score higher
+    assert archive.novelty(np.array([[100, 100, 100], [0, 0, 0]]))[0] > 100
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from gym import spaces
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.buffers import ReplayBuffer, RolloutBuffer
+from pearll.common.batched_env import BatchedEnv
+from pearll.common.type_aliases import Log
+from pearll.common.utils import get_space_shape
+from pearll.models import ActorCritic, Dummy
+from pearll.settings import BufferSettings, ExplorerSettings
+
+
+class PointMass(BatchedEnv):
+    """
+    Batch of point masses moved by the actions, each episode lasts `row + 1` steps.
+    """
+
+    def __init__(self, num_envs):
+        super().__init__(
+            num_envs,
+            observation_space=spaces.Box(low=-np.inf, high=np.inf, shape=(2,)),
+            action_space=spaces.Box(low=-1, high=1, shape=(2,)),
+        )
+        self.positions = np.zeros((num_envs, 2), dtype=np.float32)
+        self.t = np.zeros(num_envs, dtype=np.int64)
+        self.num_resets = np.zeros(num_envs, dtype=np.int64)
+
+    def reset_batch(self, mask):
+        self.positions[mask] = 0
+        self.t[mask] = 0
+        self.num_resets[mask] += 1
+        return self.positions[mask].copy()
+
+    def step_batch(self, actions):
+        self.positions += actions
+        self.t += 1
+        rewards = -np.linalg.norm(self.positions, axis=1)
+        dones = self.t > np.arange(self.num_envs)
+        return self.positions.copy(), rewards, dones, {"t": self.t.copy()}
+
+
+class MockAgent(BaseAgent):
+    def _fit(self, batch_size, actor_epochs=1, critic_epochs=1):
+        return Log()
+
+
+def test_batched_env_reset():
+    env = PointMass(4)
+    observations = env.reset()
+    np.testing.assert_array_equal(observations, np.zeros((4, 2)))
+    np.testing.assert_array_equal(env.num_resets, [1, 1, 1, 1])
+
+    observations, _, _, _ = env.step(np.ones((4, 2), dtype=np.float32))
+    new_observations = env.reset(mask=np.array([True, False, True, False]))
+    np.testing.assert_array_equal(new_observations[[0, 2]], np.zeros((2, 2)))
+    np.testing.assert_array_equal(new_observations[[1, 3]], np.ones((2, 2)))
+    np.testing.assert_array_equal(env.num_resets, [3, 1, 2, 1])
+    # Observations already returned aren't modified
+    np.testing.assert_array_equal(observations[[1, 2, 3]], np.ones((3, 2)))
+
+
+def test_batched_env_step():
+    env = PointMass(3)
+    env.reset()
+    actions = np.ones((3, 2), dtype=np.float32)
+    observations, rewards, dones, infos = env.step(actions)
+    np.testing.assert_array_equal(dones, [True, False, False])
+    np.testing.assert_allclose(rewards, -np.sqrt(2) * np.ones(3))
+    # Done rows are automatically reset
+    np.testing.assert_array_equal(observations, [[0, 0], [1, 1], [1, 1]])
+    np.testing.assert_array_equal(infos["terminal_observation"], [[1, 1]])
+    np.testing.assert_array_equal(infos["t"], [1, 1, 1])
+
+    observations, _, dones, _ = env.step(actions)
+    np.testing.assert_array_equal(dones, [True, True, False])
+    np.testing.assert_array_equal(observations, [[0, 0], [0, 0], [2, 2]])
+
+
+def test_batched_env_spaces():
+    env = PointMass(5)
+    assert get_space_shape(env.action_space) == (5, 2)
+    assert get_space_shape(env.observation_space) == (5, 2)
+    actions = env.action_space.sample()
+    assert actions.shape == (5, 2)
+    assert np.all(np.abs(actions) <= 1)
+
+
+@pytest.mark.parametrize("buffer_class", [ReplayBuffer, RolloutBuffer])
+def test_batched_env_agent(buffer_class):
+    env = PointMass(64)
+    model = ActorCritic(
+        actor=Dummy(space=env.single_action_space),
+        critic=Dummy(space=env.single_action_space),
+    )
+    agent = MockAgent(
+        env=env,
+        model=model,
+        buffer_class=buffer_class,
+        buffer_settings=BufferSettings(buffer_size=10),
+        explorer_settings=ExplorerSettings(start_steps=100),
+    )
+    assert agent.logger.num_envs == 64
+
+    observation = env.reset()
+    observation = agent.step_env(observation, num_steps=5)
+    assert observation.shape == (64, 2)
+    assert agent.episode == 0
+
+    trajectories = agent.buffer.all(dtype="numpy")
+    assert trajectories.observations.shape == (64, 5, 2)
+    assert trajectories.actions.shape == (64, 5, 2)
+    assert trajectories.rewards.shape == (64, 5, 1)
+    np.testing.assert_array_equal(
+        trajectories.dones[:, :, 0].sum(axis=1)[:5], [5, 2, 1, 1, 1]
+    )
@@ -3,9 +3,10 @@ import numpy as np
 import pytest
 import torch as T
 
-from pearll.buffers import ReplayBuffer
+from pearll.buffers import PackedReplayBuffer, ReplayBuffer
 from pearll.buffers.rollout_buffer import RolloutBuffer
 from pearll.common.type_aliases import Trajectories
+from pearll.settings import StorageSettings
 
 env = gym.make("CartPole-v0")
 
@@ -247,3 +248,298 @@ def test_buffer_multiple_envs(buffer_class):
     assert trajectories.rewards.shape == (2, 5, 1)
     assert trajectories.next_observations.shape == (2, 5, 4)
     assert trajectories.dones.shape == (2, 5, 1)
+
+
+@pytest.mark.parametrize("buffer_class", [ReplayBuffer, RolloutBuffer])
+def test_buffer_vector_rewards(buffer_class):
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = buffer_class(env, buffer_size=10, reward_size=3)
+    assert buffer.rewards.shape == (10, 2, 3)
+
+    obs = env.reset()
+    for i in range(5):
+        action = env.action_space.sample()
+        next_obs, _, done, _ = env.step(action)
+        buffer.add_trajectory(
+            observation=obs,
+            action=action,
+            reward=np.full((2, 3), i),
+            next_observation=next_obs,
+            done=done,
+        )
+        obs = next_obs
+
+    trajectories = buffer.last(batch_size=5)
+    assert trajectories.rewards.shape == (2, 5, 3)
+    np.testing.assert_array_equal(trajectories.rewards[0, :, 0], np.arange(5))
+
+    buffer.reset()
+    assert buffer.rewards.shape == (10, 2, 3)
+
+
+def fill_buffer(buffer, env, num_steps):
+    obs = env.reset()
+    for _ in range(num_steps):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        buffer.add_trajectory(obs, action, reward, next_obs, done)
+        obs = env.reset() if np.all(done) else next_obs
+
+
+@pytest.mark.parametrize("buffer_class", [ReplayBuffer, RolloutBuffer])
+def test_sample_many(buffer_class):
+    buffer = buffer_class(env, buffer_size=20)
+    fill_buffer(buffer, env, 15)
+
+    np.random.seed(0)
+    expected = [buffer.sample(batch_size=5, dtype="numpy") for _ in range(3)]
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, batch_size=5, dtype="numpy"))
+    assert len(actual) == 3
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a.observations, e.observations)
+        np.testing.assert_array_equal(a.actions, e.actions)
+        np.testing.assert_array_equal(a.rewards, e.rewards)
+        np.testing.assert_array_equal(a.next_observations, e.next_observations)
+        np.testing.assert_array_equal(a.dones, e.dones)
+
+    batches = list(buffer.sample_many(2, batch_size=5, fields=["observations"]))
+    assert isinstance(batches[0].observations, T.Tensor)
+    assert batches[0].observations.shape == (5, 4)
+    assert batches[0].actions is None
+    assert batches[0].next_observations is None
+
+    with pytest.raises(AssertionError):
+        next(buffer.sample_many(2, batch_size=5, fields=["values"]))
+
+
+@pytest.mark.parametrize("buffer_class", [ReplayBuffer, RolloutBuffer])
+def test_sample_many_multiple_envs(buffer_class):
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = buffer_class(env, buffer_size=20)
+    fill_buffer(buffer, env, 15)
+
+    np.random.seed(0)
+    expected = [buffer.sample(batch_size=5, flatten_env=True) for _ in range(3)]
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, batch_size=5, flatten_env=True))
+    for a, e in zip(actual, expected):
+        assert a.observations.shape == (4, 4)
+        T.testing.assert_close(a.observations, e.observations)
+        T.testing.assert_close(a.next_observations, e.next_observations)
+        T.testing.assert_close(a.dones, e.dones)
+
+    for trajectories in buffer.sample_many(3, batch_size=5):
+        assert trajectories.observations.shape == (2, 5, 4)
+        assert trajectories.actions.shape == (2, 5, 1)
+        assert trajectories.rewards.shape == (2, 5, 1)
+        assert trajectories.dones.shape == (2, 5, 1)
+
+
+@pytest.mark.parametrize(
+    "buffer_class", [ReplayBuffer, RolloutBuffer, PackedReplayBuffer]
+)
+def test_storage_settings(buffer_class):
+    storage_settings = StorageSettings(
+        observation_dtype="float16",
+        reward_dtype="float16",
+        compact_actions=True,
+        compact_dones=True,
+    )
+    buffer = buffer_class(env, buffer_size=20, storage_settings=storage_settings)
+    full_buffer = buffer_class(env, buffer_size=20)
+    assert buffer.observations.dtype == np.float16
+    assert buffer.actions.dtype == np.uint8
+    assert buffer.rewards.dtype == np.float16
+    assert buffer.dones.dtype == np.uint8
+    assert buffer.observations.nbytes < full_buffer.observations.nbytes
+    assert buffer.actions.nbytes * 8 == full_buffer.actions.nbytes
+
+    obs = env.reset()
+    for _ in range(10):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        buffer.add_trajectory(obs, action, reward, next_obs, done)
+        full_buffer.add_trajectory(obs, action, reward, next_obs, done)
+        obs = next_obs
+
+    # Samples are converted back to the compute dtypes
+    trajectories = buffer.last(batch_size=5)
+    expected = full_buffer.last(batch_size=5)
+    assert trajectories.observations.dtype == T.float32
+    assert trajectories.actions.dtype == T.int64
+    assert trajectories.rewards.dtype == T.float32
+    assert trajectories.dones.dtype == T.float32
+    T.testing.assert_close(
+        trajectories.observations, expected.observations, rtol=1e-3, atol=1e-3
+    )
+    T.testing.assert_close(trajectories.actions, expected.actions)
+    T.testing.assert_close(trajectories.dones, expected.dones)
+
+    trajectories = buffer.last(batch_size=5, dtype="numpy")
+    assert trajectories.observations.dtype == np.float32
+    assert trajectories.actions.dtype == np.int64
+    batch = next(buffer.sample_many(2, batch_size=5, fields=["actions"]))
+    assert batch.actions.dtype == T.int64
+
+    buffer.reset()
+    assert buffer.observations.dtype == np.float16
+    assert buffer.dones.dtype == np.uint8
+
+
+def test_storage_settings_compact_actions():
+    vector_env = gym.vector.make("CartPole-v0", 2)
+    buffer = ReplayBuffer(
+        vector_env,
+        buffer_size=10,
+        storage_settings=StorageSettings(compact_actions=True),
+    )
+    assert buffer.actions.dtype == np.uint8
+
+    continuous_env = gym.make("Pendulum-v0")
+    buffer = ReplayBuffer(
+        continuous_env,
+        buffer_size=10,
+        storage_settings=StorageSettings(compact_actions=True),
+    )
+    # Only discrete actions are compacted
+    assert buffer.actions.dtype == continuous_env.action_space.dtype
+
+
+def add_episodes(buffer, episode_lengths, num_envs=1):
+    """Add episodes of the given lengths whose observations and rewards count the steps"""
+    for step in range(sum(episode_lengths)):
+        done = step + 1 in np.cumsum(episode_lengths)
+        obs = np.full((num_envs, 4), step, dtype=np.float32)
+        if num_envs == 1:
+            obs = obs[0]
+        rewards = np.arange(1, num_envs + 1) * float(step)
+        buffer.add_trajectory(
+            obs,
+            np.zeros(num_envs, dtype=np.int64),
+            rewards,
+            obs + 1,
+            np.full(num_envs, done),
+        )
+
+
+@pytest.mark.parametrize(
+    "buffer_class", [ReplayBuffer, RolloutBuffer, PackedReplayBuffer]
+)
+def test_episode_index(buffer_class):
+    buffer = buffer_class(env, buffer_size=20)
+    episode_lengths = [3, 5, 4, 7, 1, 2, 6, 3, 4]
+    add_episodes(buffer, episode_lengths)
+    ends = np.cumsum(episode_lengths)
+    starts = ends - episode_lengths
+    # Episodes are evicted as soon as their first step is overwritten
+    stored = starts >= ends[-1] - buffer.buffer_size + buffer._overwritten_ahead
+    assert buffer.num_episodes == stored.sum()
+
+    summaries = buffer.episode_summaries()
+    np.testing.assert_array_equal(
+        summaries["lengths"], np.array(episode_lengths)[stored]
+    )
+    expected_returns = [sum(range(s, e)) for s, e in zip(starts[stored], ends[stored])]
+    np.testing.assert_array_equal(summaries["returns"][:, 0], expected_returns)
+    np.testing.assert_array_equal(buffer.episode_summaries(2)["lengths"], [3, 4])
+
+    episodes = buffer.last_episodes(2, dtype="numpy")
+    np.testing.assert_array_equal(episodes[0].observations[:, 0], np.arange(28, 31))
+    np.testing.assert_array_equal(
+        episodes[1].next_observations[:, 0], np.arange(32, 36)
+    )
+    np.testing.assert_array_equal(episodes[1].dones[:, 0], [0, 0, 0, 1])
+    assert len(buffer.last_episodes(100)) == stored.sum()
+
+    for episode in buffer.sample_episodes(10, dtype="numpy"):
+        steps = episode.observations[:, 0]
+        assert steps[0] in starts[stored]
+        np.testing.assert_array_equal(steps, np.arange(steps[0], steps[0] + len(steps)))
+        assert episode.dones[-1, 0] == 1
+    assert isinstance(buffer.sample_episodes(1)[0].observations, T.Tensor)
+
+    buffer.reset()
+    assert buffer.num_episodes == 0
+    with pytest.raises(RuntimeError):
+        buffer.sample_episodes(1)
+
+
+def test_episode_index_multiple_envs():
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = ReplayBuffer(env, buffer_size=20)
+    add_episodes(buffer, [3, 5], num_envs=2)
+    # Only the second environment ends an episode on the last step
+    done = np.array([False, True])
+    obs = np.full((2, 4), 8, dtype=np.float32)
+    buffer.add_trajectory(obs, np.zeros(2, dtype=np.int64), np.ones(2), obs + 1, done)
+
+    summaries = buffer.episode_summaries()
+    np.testing.assert_array_equal(summaries["lengths"], [3, 3, 5, 5, 1])
+    np.testing.assert_array_equal(summaries["envs"], [0, 1, 0, 1, 1])
+    np.testing.assert_array_equal(summaries["returns"][:, 0], [3, 6, 25, 50, 1])
+
+    episodes = buffer.last_episodes(2, dtype="numpy")
+    assert episodes[0].observations.shape == (5, 4)
+    np.testing.assert_array_equal(episodes[0].observations[:, 0], np.arange(3, 8))
+    np.testing.assert_array_equal(episodes[1].rewards, [[1]])
+
+
+@pytest.mark.parametrize(
+    "buffer_class", [ReplayBuffer, RolloutBuffer, PackedReplayBuffer]
+)
+def test_sample_sequences(buffer_class):
+    buffer = buffer_class(env, buffer_size=20)
+    episode_lengths = [3, 5, 4, 7, 1, 2, 6, 3, 4]
+    # Wrap around so windows cross the ring boundary
+    add_episodes(buffer, episode_lengths)
+    num_steps = sum(episode_lengths)
+    ends = np.cumsum(episode_lengths)
+
+    trajectories, mask = buffer.sample_sequences(32, 5, dtype="numpy")
+    assert trajectories.observations.shape == (32, 5, 4)
+    assert trajectories.rewards.shape == (32, 5, 1)
+    assert mask.shape == (32, 5, 1)
+    assert mask.dtype == bool
+    starts = trajectories.observations[:, 0, 0].astype(int)
+    oldest = num_steps - buffer.buffer_size + buffer._overwritten_ahead
+    assert np.all((starts >= oldest) & (starts < num_steps))
+    for start, window, window_mask in zip(starts, trajectories.observations, mask):
+        steps = start + np.arange(5)
+        # Valid steps are stored and in the episode of the first step
+        episode_end = ends[np.searchsorted(ends, start, side="right")]
+        expected_mask = (steps < num_steps) & (steps < episode_end)
+        np.testing.assert_array_equal(window_mask[:, 0], expected_mask)
+        np.testing.assert_array_equal(window[expected_mask, 0], steps[expected_mask])
+
+    trajectories, mask = buffer.sample_sequences(4, 3)
+    assert isinstance(trajectories.observations, T.Tensor)
+    assert mask.dtype == T.bool
+
+    with pytest.raises(AssertionError):
+        buffer.sample_sequences(4, 21)
+    buffer.reset()
+    with pytest.raises(RuntimeError):
+        buffer.sample_sequences(4, 3)
+
+
+def test_sample_sequences_multiple_envs():
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = ReplayBuffer(env, buffer_size=20)
+    add_episodes(buffer, [3, 5, 4], num_envs=2)
+
+    trajectories, mask = buffer.sample_sequences(6, 4)
+    assert trajectories.observations.shape == (2, 6, 4, 4)
+    assert trajectories.dones.shape == (2, 6, 4, 1)
+    assert mask.shape == (2, 6, 4, 1)
+
+    trajectories, mask = buffer.sample_sequences(6, 4, flatten_env=True, dtype="numpy")
+    assert trajectories.observations.shape == (6, 4, 4)
+    assert mask.shape == (6, 4, 1)
+    # Both environments of a window start on the same step
+    np.testing.assert_array_equal(
+        trajectories.observations[::2], trajectories.observations[1::2]
+    )
+    np.testing.assert_array_equal(
+        trajectories.rewards[1::2], 2 * trajectories.rewards[::2]
+    )
@@ -0,0 +1,153 @@
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.buffers import CompressedReplayBuffer, ReplayBuffer
+from pearll.buffers.compressed_buffer import lz4_frame
+from pearll.settings import CompressionSettings
+
+env = gym.make("CartPole-v0")
+
+
+def fill(buffers, start, num_steps):
+    """Add transitions whose observations count up from `start`"""
+    for i in range(start, start + num_steps):
+        obs = np.full(4, i, dtype=np.float32)
+        for buffer in buffers:
+            buffer.add_trajectory(obs, i % 2, float(i), obs + 1, i % 7 == 0)
+
+
+def assert_trajectories_equal(actual, expected):
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    np.testing.assert_array_equal(actual.actions, expected.actions)
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+    np.testing.assert_array_equal(actual.next_observations, expected.next_observations)
+    np.testing.assert_array_equal(actual.dones, expected.dones)
+
+
+@pytest.fixture
+def buffer():
+    buffer = CompressedReplayBuffer(
+        env,
+        buffer_size=100,
+        compression_settings=CompressionSettings(chunk_size=16, cache_size=2),
+    )
+    yield buffer
+    buffer.close()
+
+
+def test_compressed_buffer_matches_replay_buffer(buffer):
+    replay_buffer = ReplayBuffer(env, buffer_size=100)
+    fill([buffer, replay_buffer], 0, 60)
+
+    np.random.seed(0)
+    expected = replay_buffer.sample(50, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(50, dtype="numpy")
+    assert_trajectories_equal(actual, expected)
+    assert_trajectories_equal(
+        buffer.last(20, dtype="numpy"), replay_buffer.last(20, dtype="numpy")
+    )
+    trajectories = buffer.all(dtype="numpy")
+    np.testing.assert_array_equal(trajectories.observations[:, 0], np.arange(60))
+
+    np.random.seed(0)
+    expected = list(replay_buffer.sample_many(3, 10, dtype="numpy"))
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, 10, dtype="numpy"))
+    for a, e in zip(actual, expected):
+        assert_trajectories_equal(a, e)
+
+    trajectories = buffer.sample(8)
+    assert isinstance(trajectories.observations, T.Tensor)
+    assert trajectories.actions.dtype == T.int64
+
+
+def test_compressed_buffer_wrap_around(buffer):
+    replay_buffer = ReplayBuffer(env, buffer_size=100)
+    # Wrap around so compressed chunks are reopened and overwritten
+    fill([buffer, replay_buffer], 0, 250)
+    assert buffer.full
+
+    np.random.seed(1)
+    expected = replay_buffer.sample(200, dtype="numpy")
+    np.random.seed(1)
+    actual = buffer.sample(200, dtype="numpy")
+    assert_trajectories_equal(actual, expected)
+    assert set(actual.observations[:, 0]) <= set(range(150, 250))
+    assert_trajectories_equal(
+        buffer.last(50, dtype="numpy"), replay_buffer.last(50, dtype="numpy")
+    )
+    np.testing.assert_array_equal(
+        buffer.episode_summaries()["returns"],
+        replay_buffer.episode_summaries()["returns"],
+    )
+    for actual, expected in zip(
+        buffer.last_episodes(3, dtype="numpy"),
+        replay_buffer.last_episodes(3, dtype="numpy"),
+    ):
+        assert_trajectories_equal(actual, expected)
+
+    np.random.seed(2)
+    expected, expected_mask = replay_buffer.sample_sequences(8, 6, dtype="numpy")
+    np.random.seed(2)
+    actual, actual_mask = buffer.sample_sequences(8, 6, dtype="numpy")
+    assert_trajectories_equal(actual, expected)
+    np.testing.assert_array_equal(actual_mask, expected_mask)
+
+
+def test_compressed_buffer_stats(buffer):
+    fill([buffer], 0, 60)
+    buffer.flush()
+    stats = buffer.stats()
+    # Chunks 0, 1 and 2 are full, chunk 3 is being written
+    assert stats["num_compressed_chunks"] == 3
+    assert stats["raw_bytes"] == 3 * 16 * (4 * 4 + 8 + 4 + 4)
+    assert stats["compression_ratio"] > 1
+    assert stats["mean_encode_latency"] > 0
+
+    buffer.sample(100)
+    stats = buffer.stats()
+    assert stats["mean_decode_latency"] > 0
+    # The cache is bounded
+    assert len(buffer._cache) == 2
+
+    buffer.reset_stats()
+    # Only the open chunk is touched
+    buffer.last(5)
+    assert buffer.stats()["cache_hit_rate"] == 0
+    # Each call looks up the 3 compressed chunks, 2 of which are cached
+    buffer.all()
+    buffer.all()
+    assert buffer.stats()["cache_hit_rate"] == pytest.approx(2 / 3)
+
+    buffer.reset()
+    assert buffer.pos == 0
+    assert buffer.stats()["num_compressed_chunks"] == 0
+
+
+def test_compressed_buffer_lzma():
+    buffer = CompressedReplayBuffer(
+        env,
+        buffer_size=50,
+        compression_settings=CompressionSettings(chunk_size=10, codec="lzma"),
+    )
+    replay_buffer = ReplayBuffer(env, buffer_size=50)
+    fill([buffer, replay_buffer], 0, 35)
+    buffer.flush()
+    assert buffer.stats()["num_compressed_chunks"] == 3
+    assert_trajectories_equal(
+        buffer.last(30, dtype="numpy"), replay_buffer.last(30, dtype="numpy")
+    )
+    buffer.close()
+
+
+@pytest.mark.skipif(lz4_frame is not None, reason="lz4 is installed")
+def test_compressed_buffer_missing_codec():
+    with pytest.raises(ImportError):
+        CompressedReplayBuffer(
+            env,
+            buffer_size=50,
+            compression_settings=CompressionSettings(codec="lz4"),
+        )
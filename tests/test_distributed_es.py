@@ -0,0 +1,189 @@
+import threading
+import time
+from dataclasses import replace
+from functools import partial
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+from pearll.agents import ES, AdamES
+from pearll.agents.distributed_es import (
+    ESCoordinator,
+    evaluate_population,
+    run_es_worker,
+    start_es_workers,
+)
+from pearll.common.function_envs import Sphere
+from pearll.common.noise_table import NoiseTable
+from pearll.common.remote_env import connect, recv_message
+from pearll.models import ActorCritic, Dummy
+from pearll.settings import DistributedESSettings, LoggerSettings, PopulationSettings
+from pearll.updaters.evolution import NoiseTableGradientAscent
+
+POPULATION_SIZE = 20
+AUTHKEY = b"test distributed es"
+noise_table = NoiseTable(size=10000, seed=1)
+
+
+def make_agent(num_envs=4, agent_class=ES):
+    env = Sphere(num_envs=num_envs)
+    model = ActorCritic(
+        actor=Dummy(space=env.single_action_space, state=np.array([10, 10])),
+        critic=Dummy(space=env.single_action_space),
+        population_settings=PopulationSettings(
+            actor_population_size=num_envs, actor_distribution="normal"
+        ),
+    )
+    return agent_class(
+        env=env,
+        model=model,
+        updater_class=partial(NoiseTableGradientAscent, noise_table=noise_table),
+        learning_rate=1,
+        logger_settings=LoggerSettings(verbose=False),
+    )
+
+
+def run_faulty_worker(settings, hang):
+    """Worker which receives a share then disconnects or stops responding"""
+    conn = connect(settings.host, settings.port, settings.authkey)
+    recv_message(conn)
+    recv_message(conn)
+    if hang:
+        time.sleep(60)
+    conn.close()
+
+
+def local_fitness(agent):
+    updater = agent.updater
+    return -Sphere.function(updater.population_from_indices(updater.noise_indices))
+
+
+def test_noise_table_updater():
+    agent = make_agent(num_envs=POPULATION_SIZE)
+    updater = agent.updater
+    # The population is rebuilt exactly from the noise indices
+    np.testing.assert_allclose(
+        agent.model.numpy_actors(),
+        updater.population_from_indices(updater.noise_indices),
+    )
+    np.testing.assert_array_equal(
+        noise_table.get(updater.noise_indices[0], 2),
+        noise_table.noise[updater.noise_indices[0] : updater.noise_indices[0] + 2],
+    )
+    population = updater.population_from_indices(updater.noise_indices)
+    np.testing.assert_allclose(
+        evaluate_population(agent, population), local_fitness(agent), rtol=1e-5
+    )
+    # Fewer individuals than environments
+    np.testing.assert_allclose(
+        evaluate_population(agent, population[:3]),
+        local_fitness(agent)[:3],
+        rtol=1e-5,
+    )
+
+
+@pytest.mark.parametrize("agent_class", [ES, AdamES])
+def test_distributed_es(agent_class):
+    agent = make_agent(num_envs=POPULATION_SIZE, agent_class=agent_class)
+    coordinator = ESCoordinator(
+        agent, DistributedESSettings(AUTHKEY, port=0, share_size=3, connect_timeout=10)
+    )
+    settings = replace(coordinator.settings, port=coordinator.address[1])
+    processes = start_es_workers(
+        partial(make_agent, num_envs=2, agent_class=agent_class),
+        num_workers=3,
+        settings=settings,
+        start_method="fork",
+    )
+    coordinator.wait_for_workers(3)
+
+    fitness = coordinator.evaluate(agent.updater.noise_indices)
+    np.testing.assert_allclose(fitness, local_fitness(agent), rtol=1e-5)
+
+    start_mean = agent.updater.mean.copy()
+    coordinator.fit(num_generations=10)
+    assert np.linalg.norm(agent.updater.mean) < np.linalg.norm(start_mean)
+    # Workers pick up the new mean
+    fitness = coordinator.evaluate(agent.updater.noise_indices)
+    np.testing.assert_allclose(fitness, local_fitness(agent), rtol=1e-5)
+
+    coordinator.close()
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+
+
+@pytest.mark.parametrize("hang", [False, True])
+def test_distributed_es_missing_worker(hang):
+    import multiprocessing as mp
+
+    agent = make_agent(num_envs=POPULATION_SIZE)
+    coordinator = ESCoordinator(
+        agent,
+        DistributedESSettings(
+            AUTHKEY, port=0, share_size=5, timeout=1, connect_timeout=10
+        ),
+    )
+    settings = replace(coordinator.settings, port=coordinator.address[1])
+    ctx = mp.get_context("fork")
+    faulty = ctx.Process(target=run_faulty_worker, args=(settings, hang), daemon=True)
+    faulty.start()
+    coordinator.wait_for_workers(1)
+    processes = start_es_workers(
+        partial(make_agent, num_envs=5),
+        num_workers=2,
+        settings=settings,
+        start_method="fork",
+    )
+    coordinator.wait_for_workers(3)
+
+    fitness = coordinator.evaluate(agent.updater.noise_indices)
+    np.testing.assert_allclose(fitness, local_fitness(agent), rtol=1e-5)
+    assert coordinator.num_redispatched == 1
+    assert coordinator.num_workers == 2
+
+    coordinator.close()
+    faulty.terminate()
+    for process in processes:
+        process.join(timeout=10)
+
+
+def test_es_worker_thread():
+    agent = make_agent(num_envs=POPULATION_SIZE)
+    coordinator = ESCoordinator(
+        agent, DistributedESSettings(AUTHKEY, port=0, share_size=5, connect_timeout=10)
+    )
+    settings = replace(coordinator.settings, port=coordinator.address[1])
+    # A worker started directly, as on another host
+    worker = threading.Thread(
+        target=run_es_worker, args=(partial(make_agent, num_envs=5), settings)
+    )
+    worker.start()
+    coordinator.wait_for_workers(1)
+
+    fitness = coordinator.evaluate(agent.updater.noise_indices)
+    np.testing.assert_allclose(fitness, local_fitness(agent), rtol=1e-5)
+
+    coordinator.close()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+
+
+def test_distributed_es_requires_noise_table():
+    env = Sphere(num_envs=4)
+    agent = ES(env=env, logger_settings=LoggerSettings(verbose=False))
+    with pytest.raises(ValueError):
+        ESCoordinator(agent, DistributedESSettings(AUTHKEY, port=0))
+
+
+def test_distributed_es_rejects_wrong_authkey():
+    agent = make_agent(num_envs=POPULATION_SIZE)
+    coordinator = ESCoordinator(
+        agent, DistributedESSettings(AUTHKEY, port=0, connect_timeout=10)
+    )
+    with pytest.raises(AuthenticationError):
+        connect(*coordinator.address, b"wrong key")
+    time.sleep(0.1)
+    assert coordinator.num_workers == 0
+    coordinator.close()
@@ -0,0 +1,162 @@
+import gym
+import numpy as np
+import pytest
+import torch as T
+from gym.wrappers import FrameStack
+
+from pearll.buffers import FrameStackBuffer, ReplayBuffer
+
+FRAME_STACK = 4
+
+
+class CounterImageEnv(gym.Env):
+    """Environment whose frames are filled with a global frame counter"""
+
+    observation_space = gym.spaces.Box(0, 255, (3, 2), np.uint8)
+    action_space = gym.spaces.Discrete(2)
+
+    def __init__(self, episode_length: int = 7):
+        self.episode_length = episode_length
+        self.counter = 0
+        self.t = 0
+
+    def _frame(self):
+        self.counter += 1
+        return np.full((3, 2), self.counter % 256, dtype=np.uint8)
+
+    def reset(self):
+        self.t = 0
+        return self._frame()
+
+    def step(self, action):
+        self.t += 1
+        done = self.t == self.episode_length
+        return self._frame(), float(self.t), done, {}
+
+
+def make_env():
+    return FrameStack(CounterImageEnv(), FRAME_STACK)
+
+
+def collect(env, buffers, num_steps):
+    obs = env.reset()
+    for _ in range(num_steps):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        for buffer in buffers:
+            buffer.add_trajectory(obs, action, reward, next_obs, done)
+        obs = env.reset() if done else next_obs
+
+
+def assert_trajectories_equal(actual, expected):
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    np.testing.assert_array_equal(actual.actions, expected.actions)
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+    np.testing.assert_array_equal(actual.next_observations, expected.next_observations)
+    np.testing.assert_array_equal(actual.dones, expected.dones)
+
+
+def test_frame_stack_buffer_init():
+    buffer = FrameStackBuffer(make_env(), buffer_size=100, frame_stack=FRAME_STACK)
+    # Each frame is stored once
+    assert buffer.observations.shape == (100, 1, 3, 2)
+    assert buffer.observations.dtype == np.uint8
+
+    with pytest.raises(AssertionError):
+        FrameStackBuffer(make_env(), buffer_size=100, frame_stack=3)
+
+
+def test_frame_stack_buffer_matches_replay_buffer():
+    env = make_env()
+    buffer = FrameStackBuffer(env, buffer_size=100, frame_stack=FRAME_STACK)
+    replay_buffer = ReplayBuffer(env, buffer_size=100)
+    # Several episodes so stacks cross episode boundaries
+    collect(env, [buffer, replay_buffer], 30)
+
+    np.random.seed(0)
+    expected = replay_buffer.sample(50, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(50, dtype="numpy")
+    assert actual.observations.shape == (50, FRAME_STACK, 3, 2)
+    assert_trajectories_equal(actual, expected)
+
+    assert_trajectories_equal(
+        buffer.last(10, dtype="numpy"), replay_buffer.last(10, dtype="numpy")
+    )
+    expected = replay_buffer.all(dtype="numpy")
+    actual = buffer.all(dtype="numpy")
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    for actual, expected in zip(
+        buffer.last_episodes(2, dtype="numpy"),
+        replay_buffer.last_episodes(2, dtype="numpy"),
+    ):
+        assert_trajectories_equal(actual, expected)
+
+    np.random.seed(2)
+    expected, expected_mask = replay_buffer.sample_sequences(8, 6, dtype="numpy")
+    np.random.seed(2)
+    actual, actual_mask = buffer.sample_sequences(8, 6, dtype="numpy")
+    assert_trajectories_equal(actual, expected)
+    np.testing.assert_array_equal(actual_mask, expected_mask)
+
+    np.random.seed(0)
+    expected = list(replay_buffer.sample_many(3, 10, dtype="numpy"))
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, 10, dtype="numpy"))
+    for a, e in zip(actual, expected):
+        assert_trajectories_equal(a, e)
+
+    trajectories = buffer.sample(8)
+    assert isinstance(trajectories.observations, T.Tensor)
+    assert trajectories.observations.dtype == T.uint8
+
+
+def test_frame_stack_buffer_episode_start():
+    env = make_env()
+    buffer = FrameStackBuffer(env, buffer_size=100, frame_stack=FRAME_STACK)
+    collect(env, [buffer], 8)
+    # The second episode starts on step 7, its first stack repeats the reset frame
+    observations = buffer.all(dtype="numpy").observations
+    np.testing.assert_array_equal(observations[7, :, 0, 0], [9, 9, 9, 9])
+    np.testing.assert_array_equal(observations[6, :, 0, 0], [4, 5, 6, 7])
+
+
+def test_frame_stack_buffer_wrap_around():
+    env = make_env()
+    buffer = FrameStackBuffer(env, buffer_size=20, frame_stack=FRAME_STACK)
+    replay_buffer = ReplayBuffer(env, buffer_size=20)
+    collect(env, [buffer, replay_buffer], 47)
+    assert buffer.full
+
+    assert_trajectories_equal(
+        buffer.last(15, dtype="numpy"), replay_buffer.last(15, dtype="numpy")
+    )
+    # Stacks don't reach back past the oldest stored frame
+    oldest = (buffer.pos + 1) % buffer.buffer_size
+    trajectories = buffer._get_samples(np.array([oldest]), ["observations"])
+    frames = trajectories["observations"][0, :, 0, 0]
+    assert np.all(frames == frames[-1])
+
+
+def test_frame_stack_buffer_multiple_envs():
+    env = gym.vector.SyncVectorEnv(
+        [make_env, lambda: FrameStack(CounterImageEnv(5), 4)]
+    )
+    buffer = FrameStackBuffer(env, buffer_size=50, frame_stack=FRAME_STACK)
+    replay_buffer = ReplayBuffer(env, buffer_size=50)
+    assert buffer.observations.shape == (50, 2, 1, 3, 2)
+    obs = env.reset()
+    for _ in range(20):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        # The vector env resets finished sub environments itself
+        buffer.add_trajectory(obs, action, reward, next_obs, done)
+        replay_buffer.add_trajectory(obs, action, reward, next_obs, done)
+        obs = next_obs
+
+    np.random.seed(0)
+    expected = replay_buffer.sample(10, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(10, dtype="numpy")
+    assert actual.observations.shape == (2, 10, FRAME_STACK, 3, 2)
+    np.testing.assert_array_equal(actual.observations, expected.observations)
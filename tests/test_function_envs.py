@@ -0,0 +1,79 @@
+import gym
+import numpy as np
+import pytest
+
+from pearll.common.function_envs import Ackley, Rastrigin, Rosenbrock, Sphere
+
+
+@pytest.mark.parametrize(
+    "env_class, optimum",
+    [(Sphere, 0), (Rastrigin, 0), (Rosenbrock, 1), (Ackley, 0)],
+)
+@pytest.mark.parametrize("dimension", [2, 10])
+def test_function_env(env_class, optimum, dimension):
+    env = env_class(num_envs=5, dimension=dimension)
+    assert env.single_action_space.shape == (dimension,)
+    np.testing.assert_array_equal(env.reset(), np.zeros(5))
+
+    actions = np.random.uniform(-1, 1, (5, dimension))
+    actions[0] = optimum
+    observations, rewards, dones, infos = env.step(actions)
+    assert observations.shape == (5,)
+    assert rewards.shape == (5,)
+    assert dones.all()
+    np.testing.assert_array_equal(infos["terminal_observation"], np.zeros(5))
+    # The optimum has the best reward
+    np.testing.assert_allclose(rewards[0], 0, atol=1e-12)
+    assert np.all(rewards[1:] < 0)
+
+
+@pytest.mark.parametrize("env_class", [Sphere, Rastrigin, Rosenbrock, Ackley])
+def test_function_env_matches_single_evaluation(env_class):
+    env = env_class(num_envs=4, dimension=3)
+    actions = np.stack([env.single_action_space.sample() for _ in range(4)])
+    actions = actions.astype(np.float64)
+    _, rewards, _, _ = env.step(actions)
+    expected_rewards = [
+        -env_class.function(action[np.newaxis])[0] for action in actions
+    ]
+    np.testing.assert_allclose(rewards, expected_rewards)
+
+
+def test_function_env_values():
+    x = np.array([[1.0, 2.0]])
+    np.testing.assert_allclose(Sphere.function(x), [5])
+    np.testing.assert_allclose(Rastrigin.function(x), [5])
+    np.testing.assert_allclose(Rosenbrock.function(x), [100])
+    np.testing.assert_allclose(Ackley.function(x), [5.4221297], rtol=1e-6)
+
+
+def test_function_env_bounds():
+    env = Rastrigin(num_envs=2, dimension=3, bounds=(-1, 1))
+    assert isinstance(env.single_action_space, gym.spaces.Box)
+    np.testing.assert_array_equal(env.single_action_space.low, -np.ones(3))
+    np.testing.assert_array_equal(env.single_action_space.high, np.ones(3))
+    assert Sphere(num_envs=2).single_action_space.high[0] == 100
+
+
+@pytest.mark.parametrize("env_class", [Sphere, Rastrigin, Rosenbrock, Ackley])
+def test_function_env_vectorized(env_class, monkeypatch):
+    num_envs = 1000
+    env = env_class(num_envs=num_envs, dimension=10)
+    actions = np.random.uniform(-1, 1, (num_envs, 10))
+    # The function of a single candidate gives the same values as the batch
+    expected = np.concatenate(
+        [env_class.function(action[np.newaxis]) for action in actions]
+    )
+
+    batch_shapes = []
+    function = env_class.function
+
+    def spy(x):
+        batch_shapes.append(x.shape)
+        return function(x)
+
+    monkeypatch.setattr(env_class, "function", staticmethod(spy))
+    _, rewards, _, _ = env.step(actions)
+    # All candidates are evaluated in a single call
+    assert batch_shapes == [(num_envs, 10)]
+    np.testing.assert_allclose(rewards, -expected)
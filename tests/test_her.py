@@ -3,10 +3,12 @@ from typing import Any, Dict, Optional, Tuple, Union
 
 import numpy as np
 import pytest
+import torch as T
 from gym import GoalEnv, spaces
 from gym.envs.registration import EnvSpec
 
 from pearll.buffers import HERBuffer
+from pearll.common.type_aliases import DictTrajectories
 
 
 class BitFlippingEnv(GoalEnv):
@@ -362,3 +364,59 @@ def test_her_last(buffer_size, goal_selection_strategy):
     )
     # Make sure we got the right number of samples
     assert len(most_recent.dones) == 2
+
+
+def test_her_episode_index():
+    buffer = HERBuffer(env=env, buffer_size=50)
+    episodes = []
+    observations, rewards = [], []
+    obs = env.reset()
+    for _ in range(20):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        buffer.add_trajectory(obs, action, reward, next_obs, done)
+        observations.append(obs["observation"])
+        rewards.append(reward)
+        obs = next_obs
+        if done:
+            episodes.append((np.array(observations), sum(rewards)))
+            observations, rewards = [], []
+            obs = env.reset()
+
+    assert buffer.num_episodes == len(episodes) > 0
+    np.testing.assert_array_equal(
+        buffer.episode_summaries()["returns"][:, 0], [ret for _, ret in episodes]
+    )
+    last = buffer.last_episodes(1, dtype="numpy")[0]
+    assert isinstance(last, DictTrajectories)
+    np.testing.assert_array_equal(last.observations["observation"], episodes[-1][0])
+    assert last.observations["desired_goal"].shape == (len(episodes[-1][0]), NUM_BITS)
+    for episode in buffer.sample_episodes(3, dtype="numpy"):
+        assert episode.dones[-1, 0] == 1
+
+
+def test_her_sample_sequences():
+    buffer = HERBuffer(env=env, buffer_size=20)
+    obs = env.reset()
+    for _ in range(30):
+        action = env.action_space.sample()
+        next_obs, reward, done, _ = env.step(action)
+        buffer.add_trajectory(obs, action, reward, next_obs, done)
+        obs = env.reset() if done else next_obs
+
+    trajectories, mask = buffer.sample_sequences(4, 3, dtype="numpy")
+    assert isinstance(trajectories, DictTrajectories)
+    assert trajectories.observations["observation"].shape == (4, 3, NUM_BITS)
+    assert trajectories.observations["desired_goal"].shape == (4, 3, NUM_BITS)
+    assert trajectories.next_observations["desired_goal"].shape == (4, 3, NUM_BITS)
+    assert trajectories.rewards.shape == (4, 3, 1)
+    assert mask.shape == (4, 3, 1)
+    # Consecutive steps within an episode chain their observations
+    chained = mask[:, 1:, 0] & (trajectories.dones[:, :-1, 0] == 0)
+    np.testing.assert_array_equal(
+        trajectories.observations["observation"][:, 1:][chained],
+        trajectories.next_observations["observation"][:, :-1][chained],
+    )
+
+    trajectories, mask = buffer.sample_sequences(4, 3)
+    assert isinstance(trajectories.observations["observation"], T.Tensor)
@@ -0,0 +1,131 @@
+import multiprocessing as mp
+import threading
+import time
+
+import gym
+import numpy as np
+import pytest
+
+from pearll.common.inference_server import InferenceServer
+from pearll.common.utils import to_numpy
+from pearll.explorers import GaussianExplorer
+from pearll.models.actor_critics import Actor, ActorCritic, Critic
+from pearll.models.encoders import IdentityEncoder
+from pearll.models.heads import DeterministicHead, ValueHead
+from pearll.models.torsos import MLP
+
+env = gym.make("MountainCarContinuous-v0")
+NUM_CLIENTS = 4
+NUM_REQUESTS = 20
+
+
+def make_model():
+    encoder = IdentityEncoder()
+    torso = MLP([2, 10, 10])
+    actor_head = DeterministicHead(
+        input_shape=10, action_shape=env.action_space.shape, activation_fn=None
+    )
+    critic_head = ValueHead(input_shape=10, activation_fn=None)
+    actor = Actor(encoder=encoder, torso=torso, head=actor_head)
+    critic = Critic(encoder=encoder, torso=torso, head=critic_head)
+    return ActorCritic(actor=actor, critic=critic)
+
+
+def observations(seed):
+    return np.random.default_rng(seed).uniform(-1, 1, (NUM_REQUESTS, 2))
+
+
+def run_client(client, seed, results=None):
+    actions = [client.predict(observation) for observation in observations(seed)]
+    if results is not None:
+        results[seed] = np.array(actions)
+    client.close()
+
+
+@pytest.fixture
+def model():
+    return make_model()
+
+
+def test_inference_server_threads(model):
+    server = InferenceServer(model, max_batch_size=NUM_CLIENTS, max_latency=0.05)
+    clients = [server.connect() for _ in range(NUM_CLIENTS)]
+    server.start()
+    results = {}
+    threads = [
+        threading.Thread(target=run_client, args=(client, i, results))
+        for i, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    server.close()
+
+    for i in range(NUM_CLIENTS):
+        expected = to_numpy(model.predict(observations(i)))
+        np.testing.assert_allclose(results[i], expected, rtol=1e-5, atol=1e-6)
+
+    stats = server.stats()
+    assert stats["max_batch_size"] <= NUM_CLIENTS
+    # Requests of different clients were batched together
+    assert stats["num_batches"] < NUM_CLIENTS * NUM_REQUESTS
+    assert stats["mean_batch_size"] == pytest.approx(
+        NUM_CLIENTS * NUM_REQUESTS / stats["num_batches"]
+    )
+    assert stats["mean_queue_latency"] > 0
+
+
+def test_inference_server_processes(model):
+    server = InferenceServer(model, max_batch_size=16, max_latency=0.05)
+    clients = [server.connect() for _ in range(NUM_CLIENTS)]
+    server.start()
+    ctx = mp.get_context("fork")
+    processes = [
+        ctx.Process(target=run_client, args=(client, i), daemon=True)
+        for i, client in enumerate(clients)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+    server.close()
+    assert server.stats()["num_batches"] < NUM_CLIENTS * NUM_REQUESTS
+
+
+def test_inference_server_latency_deadline(model):
+    server = InferenceServer(model, max_batch_size=64, max_latency=0.01).start()
+    client = server.connect()
+    # A lone request is answered once the deadline passes without waiting for a full batch
+    start = time.monotonic()
+    action = client.predict(np.zeros(2))
+    assert time.monotonic() - start < 1
+    assert action.shape == env.action_space.shape
+
+    actions = client.predict_batch(np.zeros((8, 2)))
+    assert actions.shape == (8,) + env.action_space.shape
+    stats = server.stats()
+    assert stats["num_batches"] == 2
+    assert stats["max_batch_size"] == 8
+    assert stats["max_queue_latency"] < 1
+
+    server.reset_stats()
+    assert server.stats()["num_batches"] == 0
+    client.close()
+    server.close()
+
+
+def test_inference_server_explorer(model):
+    explorer = GaussianExplorer(env.action_space, start_steps=0)
+    server = InferenceServer(model, explorer=explorer, max_latency=0.001)
+    client = server.connect()
+    thread = threading.Thread(target=server.run_batch)
+    thread.start()
+    actions = client.predict_batch(np.zeros((5, 2)))
+    thread.join(timeout=10)
+    assert actions.shape == (5, 1)
+    assert np.all(np.abs(actions) <= 1)
+    assert server.step == 1
+    client.close()
+    server.close()
@@ -471,6 +471,48 @@ def test_population_initialize():
     np.testing.assert_array_almost_equal(np.std(actor_state), 1, decimal=1.5)
 
 
+@pytest.mark.parametrize("genome", ["head", ["torso.model.0.bias", "head"]])
+def test_population_genome(genome):
+    torso = MLP([5, 5])
+    head_actor = DeterministicHead(input_shape=5, action_shape=1)
+    actor = Actor(IdentityEncoder(), torso, head_actor, genome=genome)
+    critic = Critic(IdentityEncoder(), MLP([5, 5]), ValueHead(input_shape=5))
+    genome_size = 6 if genome == "head" else 11
+    assert actor.numpy().shape == (genome_size,)
+    assert actor.space_shape == (genome_size,)
+
+    model = ActorCritic(
+        actor,
+        critic,
+        population_settings=PopulationSettings(
+            actor_population_size=3, actor_distribution="normal"
+        ),
+    )
+    assert model.numpy_actors().shape == (3, genome_size)
+
+    # the torso weights are shared in memory, the genome is copied
+    for ind in model.actors:
+        assert ind.model.torso.model[0].weight is torso.model[0].weight
+        assert ind.model.head is not head_actor
+    assert not T.equal(
+        model.actors[0].model.head.model.model[0].weight,
+        model.actors[1].model.head.model.model[0].weight,
+    )
+    if genome == "head":
+        assert model.actors[0].model.torso.model[0].bias is torso.model[0].bias
+    else:
+        assert model.actors[0].model.torso.model[0].bias is not torso.model[0].bias
+
+    # setting the state only changes the genome
+    new_state = np.zeros(genome_size)
+    model.set_actors_state(new_state)
+    assert T.equal(model.actors[0].model.head.model.model[0].weight, T.zeros(1, 5))
+    assert not T.equal(torso.model[0].weight, T.zeros(5, 5))
+
+    with pytest.raises(ValueError):
+        Actor(IdentityEncoder(), torso, head_actor, genome="missing")
+
+
 @pytest.mark.parametrize("actor_population_size", [1, 2])
 def test_action_distribution(actor_population_size):
     input = T.Tensor([1, 1, 1, 1, 1]).repeat(actor_population_size, 1)
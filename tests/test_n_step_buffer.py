@@ -0,0 +1,132 @@
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.buffers import NStepReplayBuffer, ReplayBuffer
+from pearll.common.type_aliases import NStepTrajectories
+from pearll.signal_processing.return_estimators import TD_zero
+
+env = gym.make("CartPole-v0")
+GAMMA = 0.9
+
+
+def fill(buffers, num_steps, episode_length=5, num_envs=1):
+    """Add transitions whose observations and rewards count the steps"""
+    for step in range(num_steps):
+        obs = np.full((num_envs, 4), step, dtype=np.float32)
+        # Environments end their episodes on different steps
+        dones = (step + 1 + np.arange(num_envs)) % episode_length == 0
+        rewards = np.full(num_envs, float(step))
+        if num_envs == 1:
+            obs, dones, rewards = obs[0], dones[0], rewards[0]
+        for buffer in buffers:
+            buffer.add_trajectory(
+                obs, np.zeros(num_envs, dtype=np.int64), rewards, obs + 1, dones
+            )
+
+
+def n_step_target(step, num_steps, n_step, episode_length, env_id=0):
+    """Compute the n-step reward sum, bootstrap observation, done and discount of a step"""
+    returns, discount, done = 0.0, 1.0, 0.0
+    for t in range(step, min(step + n_step, num_steps)):
+        returns += discount * t
+        discount *= GAMMA
+        if (t + 1 + env_id) % episode_length == 0:
+            done = 1.0
+            break
+    return returns, t + 1, done, discount
+
+
+@pytest.mark.parametrize("num_steps", [12, 37])
+def test_n_step_buffer_targets(num_steps):
+    buffer = NStepReplayBuffer(env, buffer_size=20, n_step=3, gamma=GAMMA)
+    fill([buffer], num_steps)
+
+    trajectories = buffer.sample(64, dtype="numpy")
+    steps = trajectories.observations[:, 0].astype(int)
+    for i, step in enumerate(steps):
+        returns, bootstrap_step, done, discount = n_step_target(step, num_steps, 3, 5)
+        assert trajectories.rewards[i, 0] == pytest.approx(returns)
+        assert trajectories.next_observations[i, 0] == bootstrap_step
+        assert trajectories.dones[i, 0] == done
+        assert trajectories.discounts[i, 0] == pytest.approx(discount)
+    assert trajectories.discounts.dtype == np.float32
+
+    trajectories = buffer.sample(8)
+    assert isinstance(trajectories.discounts, T.Tensor)
+    assert trajectories.discounts.shape == (8, 1)
+    # The discounts replace gamma in the one-step target
+    target = TD_zero(
+        trajectories.rewards,
+        T.ones(8, 1),
+        trajectories.dones,
+        trajectories.discounts,
+    )
+    assert target.shape == (8, 1)
+
+
+def test_n_step_buffer_one_step_matches_replay_buffer():
+    buffer = NStepReplayBuffer(env, buffer_size=20, n_step=1, gamma=GAMMA)
+    replay_buffer = ReplayBuffer(env, buffer_size=20)
+    fill([buffer, replay_buffer], 27)
+
+    np.random.seed(0)
+    expected = replay_buffer.sample(30, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(30, dtype="numpy")
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+    np.testing.assert_array_equal(actual.next_observations, expected.next_observations)
+    np.testing.assert_array_equal(actual.dones, expected.dones)
+    np.testing.assert_allclose(actual.discounts, GAMMA)
+
+    # The stored transitions are unchanged
+    expected = replay_buffer.last(10, dtype="numpy")
+    actual = buffer.last(10, dtype="numpy")
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+    assert not isinstance(actual, NStepTrajectories)
+
+
+def test_n_step_buffer_sample_many():
+    buffer = NStepReplayBuffer(env, buffer_size=20, n_step=4, gamma=GAMMA)
+    fill([buffer], 30)
+
+    np.random.seed(0)
+    expected = [buffer.sample(6, dtype="numpy") for _ in range(3)]
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, 6, dtype="numpy"))
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a.observations, e.observations)
+        np.testing.assert_array_equal(a.rewards, e.rewards)
+        np.testing.assert_array_equal(a.next_observations, e.next_observations)
+        np.testing.assert_array_equal(a.dones, e.dones)
+        np.testing.assert_array_equal(a.discounts, e.discounts)
+
+    assert isinstance(actual[0], NStepTrajectories)
+    batches = list(buffer.sample_many(2, 6, fields=["observations"]))
+    assert batches[0].rewards is None
+    assert not isinstance(batches[0], NStepTrajectories)
+
+
+def test_n_step_buffer_multiple_envs():
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = NStepReplayBuffer(env, buffer_size=20, n_step=3, gamma=GAMMA)
+    fill([buffer], 25, num_envs=2)
+
+    trajectories = buffer.sample(16, dtype="numpy")
+    assert trajectories.rewards.shape == (2, 16, 1)
+    assert trajectories.discounts.shape == (2, 16, 1)
+    for env_id in range(2):
+        steps = trajectories.observations[env_id, :, 0].astype(int)
+        for i, step in enumerate(steps):
+            returns, bootstrap_step, done, discount = n_step_target(
+                step, 25, 3, 5, env_id
+            )
+            assert trajectories.rewards[env_id, i, 0] == pytest.approx(returns)
+            assert trajectories.next_observations[env_id, i, 0] == bootstrap_step
+            assert trajectories.dones[env_id, i, 0] == done
+            assert trajectories.discounts[env_id, i, 0] == pytest.approx(discount)
+
+    trajectories = buffer.sample(16, flatten_env=True)
+    assert trajectories.discounts.shape == (16, 1)
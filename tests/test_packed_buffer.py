@@ -0,0 +1,109 @@
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.buffers import PackedReplayBuffer, ReplayBuffer
+
+env = gym.make("CartPole-v0")
+
+
+def fill(buffer, start, num_steps):
+    """Add transitions whose observations count up from `start`"""
+    for i in range(start, start + num_steps):
+        obs = np.full(4, i, dtype=np.float32)
+        buffer.add_trajectory(obs, i % 2, float(i), obs + 1, i % 5 == 0)
+
+
+def assert_trajectories_equal(actual, expected):
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    np.testing.assert_array_equal(actual.actions, expected.actions)
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+    np.testing.assert_array_equal(actual.next_observations, expected.next_observations)
+    np.testing.assert_array_equal(actual.dones, expected.dones)
+
+
+def test_packed_buffer_init():
+    buffer = PackedReplayBuffer(env, buffer_size=10)
+    assert buffer.rows.shape == (10,)
+    assert buffer.observations.shape == (10, 4)
+    assert buffer.actions.shape == (10, 1)
+    assert buffer.rewards.shape == (10, 1)
+    assert buffer.next_observations.shape == (10, 4)
+    assert buffer.dones.shape == (10, 1)
+    # The fields are views of the rows
+    assert np.shares_memory(buffer.observations, buffer.rows)
+
+
+def test_packed_buffer_matches_replay_buffer():
+    buffer = PackedReplayBuffer(env, buffer_size=50)
+    replay_buffer = ReplayBuffer(env, buffer_size=50)
+    fill(buffer, 0, 20)
+    fill(replay_buffer, 0, 20)
+
+    np.random.seed(0)
+    expected = replay_buffer.sample(10, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(10, dtype="numpy")
+    assert_trajectories_equal(actual, expected)
+    assert_trajectories_equal(
+        buffer.last(5, dtype="numpy"), replay_buffer.last(5, dtype="numpy")
+    )
+
+    np.random.seed(0)
+    expected = list(replay_buffer.sample_many(3, 10, dtype="numpy"))
+    np.random.seed(0)
+    actual = list(buffer.sample_many(3, 10, dtype="numpy"))
+    for a, e in zip(actual, expected):
+        assert_trajectories_equal(a, e)
+
+    trajectories = buffer.all()
+    assert isinstance(trajectories.observations, T.Tensor)
+    np.testing.assert_array_equal(trajectories.observations[:, 0], np.arange(20))
+
+
+def test_packed_buffer_wrap_around():
+    buffer = PackedReplayBuffer(env, buffer_size=10)
+    fill(buffer, 0, 25)
+    assert buffer.full
+    assert buffer.pos == 5
+
+    trajectories = buffer.sample(200, dtype="numpy")
+    # Every row holds a complete transition, including the write position
+    assert set(trajectories.observations[:, 0]) == set(range(15, 25))
+    np.testing.assert_array_equal(
+        trajectories.next_observations, trajectories.observations + 1
+    )
+    np.testing.assert_array_equal(
+        trajectories.rewards[:, 0], trajectories.observations[:, 0]
+    )
+
+    trajectories = buffer.last(10, dtype="numpy")
+    np.testing.assert_array_equal(trajectories.observations[:, 0], np.arange(15, 25))
+
+    buffer.reset()
+    assert buffer.pos == 0
+    assert not buffer.full
+    assert np.all(buffer.observations == 0)
+
+
+@pytest.mark.parametrize("flatten_env", [False, True])
+def test_packed_buffer_multiple_envs(flatten_env):
+    env = gym.vector.make("CartPole-v0", 2)
+    buffer = PackedReplayBuffer(env, buffer_size=20, reward_size=3)
+    obs = env.reset()
+    for _ in range(10):
+        action = env.action_space.sample()
+        next_obs, _, done, _ = env.step(action)
+        buffer.add_trajectory(obs, action, np.ones((2, 3)), next_obs, done)
+        obs = next_obs
+
+    trajectories = buffer.sample(batch_size=6, flatten_env=flatten_env)
+    if flatten_env:
+        assert trajectories.observations.shape == (6, 4)
+        assert trajectories.rewards.shape == (6, 3)
+    else:
+        assert trajectories.observations.shape == (2, 6, 4)
+        assert trajectories.rewards.shape == (2, 6, 3)
+        assert trajectories.dones.shape == (2, 6, 1)
+    assert T.all(trajectories.rewards == 1)
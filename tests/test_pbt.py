@@ -0,0 +1,105 @@
+import shutil
+
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.agents.pbt import PBT, get_hyperparameter, set_hyperparameter
+from pearll.buffers import ReplayBuffer
+from pearll.common.type_aliases import Log
+from pearll.models.actor_critics import Actor, ActorCritic, Critic
+from pearll.models.encoders import IdentityEncoder
+from pearll.models.heads import DeterministicHead, ValueHead
+from pearll.models.torsos import MLP
+from pearll.settings import ExplorerSettings, OptimizerSettings, PBTSettings
+
+
+class MockAgent(BaseAgent):
+    """Agent whose training step adds the learning rate to the actor bias"""
+
+    def __init__(self, env, model, optimizer_settings=OptimizerSettings()):
+        super().__init__(
+            env,
+            model,
+            buffer_class=ReplayBuffer,
+            explorer_settings=ExplorerSettings(start_steps=0),
+        )
+        self.optimizer_settings = optimizer_settings
+
+    def _fit(self, batch_size, actor_epochs=1, critic_epochs=1):
+        with T.no_grad():
+            self.model.actors[0].model.head.model.model[0].bias.add_(
+                self.optimizer_settings.learning_rate
+            )
+        return Log()
+
+
+def make_agent():
+    env = gym.make("Pendulum-v0")
+    actor = Actor(
+        IdentityEncoder(), MLP([3, 2]), DeterministicHead(input_shape=2, action_shape=1)
+    )
+    critic = Critic(IdentityEncoder(), MLP([3, 2]), ValueHead(input_shape=2))
+    with T.no_grad():
+        actor.model.head.model.model[0].bias.zero_()
+    return MockAgent(env, ActorCritic(actor, critic))
+
+
+def score_agent(agent):
+    return agent.model.actors[0].model.head.model.model[0].bias.item()
+
+
+def test_hyperparameter_paths():
+    default_settings = OptimizerSettings()
+    agent = make_agent()
+    agent.optimizer_settings = default_settings
+    set_hyperparameter(agent, "optimizer_settings.learning_rate", 0.5)
+    assert get_hyperparameter(agent, "optimizer_settings.learning_rate") == 0.5
+    # shared settings objects aren't modified
+    assert default_settings.learning_rate == 1e-3
+
+
+def test_pbt():
+    path = "runs/pbt_tests"
+    pbt = PBT(
+        agent_fn=make_agent,
+        hyperparameters={"optimizer_settings.learning_rate": (0.0, 1.0)},
+        population_size=4,
+        pbt_settings=PBTSettings(
+            ready_steps=5,
+            exploit_ratio=0.25,
+            resample_probability=0,
+            copy_buffer=True,
+            checkpoint_path=path,
+        ),
+        eval_fn=score_agent,
+        fit_kwargs={"batch_size": 1},
+        initial_hyperparameters=[
+            {"optimizer_settings.learning_rate": lr} for lr in [0.1, 0.2, 0.3, 0.4]
+        ],
+    )
+    best = pbt.fit(num_steps=10)
+
+    first_round, second_round = pbt.history
+    np.testing.assert_allclose(first_round["scores"], [0.5, 1, 1.5, 2], rtol=1e-5)
+    # the worst agent copied a better agent and perturbed its learning rate
+    ((replaced, donor),) = first_round["exploited"]
+    assert replaced == 0
+    assert donor in [2, 3]
+    donor_lr = first_round["hyperparameters"][donor]["optimizer_settings.learning_rate"]
+    new_lr = second_round["hyperparameters"][0]["optimizer_settings.learning_rate"]
+    assert new_lr == pytest.approx(donor_lr * 0.8) or new_lr == pytest.approx(
+        donor_lr * 1.2
+    )
+    np.testing.assert_allclose(
+        second_round["scores"][0],
+        first_round["scores"][donor] + 5 * new_lr,
+        rtol=1e-5,
+    )
+    best_index = int(np.argmax(second_round["scores"]))
+    assert best == second_round["hyperparameters"][best_index]
+
+    pbt.close()
+    shutil.rmtree(path)
@@ -0,0 +1,111 @@
+import copy
+
+import gym
+import numpy as np
+import pytest
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.buffers import ReplayBuffer
+from pearll.common.pipelined_env import PipelinedVectorEnv
+from pearll.common.type_aliases import Log
+from pearll.models.actor_critics import Actor, ActorCritic, Critic
+from pearll.models.encoders import IdentityEncoder
+from pearll.models.heads import DeterministicHead, ValueHead
+from pearll.models.torsos import MLP
+from pearll.settings import BufferSettings, ExplorerSettings, LoggerSettings
+
+NUM_ENVS = 5
+
+
+class MockAgent(BaseAgent):
+    def _fit(self, batch_size, actor_epochs=1, critic_epochs=1):
+        return Log()
+
+
+def make_env():
+    return gym.make("MountainCarContinuous-v0")
+
+
+def make_model():
+    encoder = IdentityEncoder()
+    torso = MLP([2, 10, 10])
+    actor_head = DeterministicHead(input_shape=10, action_shape=1, activation_fn=None)
+    critic_head = ValueHead(input_shape=10, activation_fn=None)
+    return ActorCritic(
+        actor=Actor(encoder=encoder, torso=torso, head=actor_head),
+        critic=Critic(encoder=encoder, torso=torso, head=critic_head),
+    )
+
+
+def make_agent(env, model=None, start_steps=0):
+    return MockAgent(
+        env=env,
+        model=model or make_model(),
+        buffer_class=ReplayBuffer,
+        buffer_settings=BufferSettings(buffer_size=100),
+        explorer_settings=ExplorerSettings(start_steps=start_steps),
+        logger_settings=LoggerSettings(verbose=False),
+    )
+
+
+def test_pipelined_env_step():
+    env = PipelinedVectorEnv([make_env] * NUM_ENVS, num_groups=2, asynchronous=False)
+    local_env = gym.vector.SyncVectorEnv([make_env] * NUM_ENVS)
+    assert [s.stop - s.start for s in env.slices] == [3, 2]
+    env.seed(0)
+    local_env.seed(0)
+    np.testing.assert_array_equal(env.reset(), local_env.reset())
+    for _ in range(5):
+        actions = np.random.uniform(-1, 1, (NUM_ENVS, 1))
+        expected = local_env.step(actions)
+        actual = env.step(actions)
+        for e, a in zip(expected[:3], actual[:3]):
+            np.testing.assert_array_equal(a, e)
+        assert len(actual[3]) == NUM_ENVS
+    assert not env.in_flight
+
+    # Actions in flight are discarded on reset
+    env.step_async(np.zeros((NUM_ENVS, 1)))
+    assert env.in_flight
+    env.reset()
+    assert not env.in_flight
+    env.close()
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_pipelined_agent_matches_vector_env(asynchronous):
+    env = PipelinedVectorEnv(
+        [make_env] * NUM_ENVS, num_groups=3, asynchronous=asynchronous
+    )
+    local_env = gym.vector.SyncVectorEnv([make_env] * NUM_ENVS)
+    agent = make_agent(env)
+    local_agent = make_agent(local_env, copy.deepcopy(agent.model))
+    env.seed(0)
+    local_env.seed(0)
+
+    observation = agent.step_env(env.reset(), num_steps=10)
+    local_observation = local_agent.step_env(local_env.reset(), num_steps=10)
+    # The next actions are already in flight
+    assert env.in_flight
+    # Batch sizes change the float rounding of the actions
+    np.testing.assert_allclose(observation, local_observation, rtol=1e-5)
+
+    trajectories = agent.buffer.all(dtype="numpy")
+    expected = local_agent.buffer.all(dtype="numpy")
+    assert trajectories.observations.shape == (NUM_ENVS, 10, 2)
+    np.testing.assert_allclose(
+        trajectories.observations, expected.observations, rtol=1e-5
+    )
+    np.testing.assert_allclose(trajectories.actions, expected.actions, rtol=1e-5)
+    np.testing.assert_allclose(trajectories.rewards, expected.rewards, rtol=1e-5)
+    env.close()
+
+
+def test_pipelined_agent_random_actions():
+    env = PipelinedVectorEnv([make_env] * NUM_ENVS, num_groups=2, asynchronous=False)
+    agent = make_agent(env, start_steps=100)
+    agent.step_env(env.reset(), num_steps=3)
+    trajectories = agent.buffer.all(dtype="numpy")
+    assert trajectories.actions.shape == (NUM_ENVS, 3, 1)
+    assert np.all(np.abs(trajectories.actions) <= 1)
+    env.close()
@@ -0,0 +1,98 @@
+import gym
+import numpy as np
+import pytest
+
+from pearll.common.racing import Racing
+
+
+class ConstantRewardEnv(gym.Env):
+    """
+    Env which returns the action as the reward for a fixed number of steps.
+    """
+
+    def __init__(self, episode_length: int = 10):
+        self.action_space = gym.spaces.Box(low=-10, high=10, shape=(1,))
+        self.observation_space = gym.spaces.Box(low=0, high=100, shape=(1,))
+        self.episode_length = episode_length
+        self.t = 0
+
+    def step(self, action):
+        self.t += 1
+        done = self.t >= self.episode_length
+        return np.array([self.t], dtype=np.float32), float(action[0]), done, {}
+
+    def reset(self):
+        self.t = 0
+        return np.array([self.t], dtype=np.float32)
+
+
+def run_generation(racing, env, action):
+    observation = env.reset()
+    racing.reset()
+    done = np.zeros(env.num_envs, dtype=bool)
+    total_rewards = np.zeros(env.num_envs)
+    num_steps = 0
+    while not np.all(done):
+        observation, reward, done, _ = racing.step(env, observation, action)
+        total_rewards += reward
+        num_steps += 1
+    return total_rewards, num_steps
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_racing_given_bounds(asynchronous):
+    vector_env_class = (
+        gym.vector.AsyncVectorEnv if asynchronous else gym.vector.SyncVectorEnv
+    )
+    env = vector_env_class([lambda: ConstantRewardEnv() for _ in range(4)])
+    racing = Racing(
+        num_envs=4, selection_ratio=0.5, reward_bounds=(0, 1), episode_length=10
+    )
+    action = np.array([[1], [0.9], [0], [0]], dtype=np.float32)
+
+    total_rewards, num_steps = run_generation(racing, env, action)
+
+    assert num_steps == 10
+    # The two best individuals are always kept
+    np.testing.assert_allclose(total_rewards[:2], [10, 9], rtol=1e-5)
+    # The two worst individuals are stopped as soon as they can't catch up
+    np.testing.assert_array_equal(total_rewards[2:], [0, 0])
+    assert racing.num_stopped == 2
+    if not asynchronous:
+        assert racing.skipped_steps > 0
+    env.close()
+
+
+def test_racing_estimated_bounds():
+    env = gym.vector.SyncVectorEnv([lambda: ConstantRewardEnv() for _ in range(4)])
+    racing = Racing(num_envs=4, selection_ratio=0.25)
+    action = np.array([[1], [0.5], [0], [0]], dtype=np.float32)
+
+    # Nothing is stopped until the episode length has been estimated
+    total_rewards, _ = run_generation(racing, env, action)
+    assert racing.num_stopped == 0
+    np.testing.assert_allclose(total_rewards, [10, 5, 0, 0])
+
+    total_rewards, num_steps = run_generation(racing, env, action)
+    assert racing.estimated_episode_length == 10
+    assert num_steps == 10
+    assert total_rewards[0] == 10
+    assert racing.num_stopped == 3
+    assert racing.skipped_steps > 0
+
+
+def test_racing_min_steps():
+    env = gym.vector.SyncVectorEnv([lambda: ConstantRewardEnv() for _ in range(2)])
+    racing = Racing(
+        num_envs=2,
+        selection_ratio=0.5,
+        reward_bounds=(0, 1),
+        episode_length=10,
+        min_steps=8,
+    )
+    action = np.array([[1], [0]], dtype=np.float32)
+
+    total_rewards, _ = run_generation(racing, env, action)
+    # The worst individual can't be stopped before min_steps
+    assert racing.skipped_steps == 2
+    np.testing.assert_array_equal(total_rewards, [10, 0])
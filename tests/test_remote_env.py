@@ -0,0 +1,212 @@
+import socket
+import threading
+from multiprocessing import AuthenticationError
+
+import gym
+import numpy as np
+import pytest
+
+from pearll.agents.base_agents import BaseAgent
+from pearll.buffers import RolloutBuffer
+from pearll.common.remote_env import (
+    _HEADER,
+    STEP,
+    EnvClient,
+    EnvServer,
+    decode_arrays,
+    decode_infos,
+    decode_space,
+    encode_arrays,
+    encode_infos,
+    encode_space,
+    recv_message,
+    send_message,
+)
+from pearll.common.type_aliases import Log
+from pearll.models import ActorCritic, Dummy
+from pearll.settings import BufferSettings, ExplorerSettings, LoggerSettings
+
+NUM_ENVS = 3
+AUTHKEY = b"test remote env"
+
+
+class MockAgent(BaseAgent):
+    def _fit(self, batch_size, actor_epochs=1, critic_epochs=1):
+        return Log()
+
+
+@pytest.fixture
+def client():
+    server = EnvServer(
+        [lambda: gym.make("CartPole-v0") for _ in range(NUM_ENVS)], AUTHKEY
+    )
+    thread = threading.Thread(target=server.serve, args=(1,), daemon=True)
+    thread.start()
+    client = EnvClient(*server.address, AUTHKEY)
+    yield client
+    client.close()
+    thread.join(timeout=10)
+    server.close()
+
+
+def test_encode_arrays():
+    arrays = [
+        np.arange(12, dtype=np.float32).reshape(3, 4),
+        np.array([True, False]),
+        np.array(5, dtype=np.int64),
+        np.zeros((0, 2)),
+        np.arange(6, dtype=np.uint8).reshape(2, 3)[:, ::2],
+    ]
+    decoded = decode_arrays(memoryview(encode_arrays(arrays)))
+    assert len(decoded) == len(arrays)
+    for expected, actual in zip(arrays, decoded):
+        assert actual.dtype == expected.dtype
+        np.testing.assert_array_equal(actual, expected)
+
+    with pytest.raises(TypeError):
+        encode_arrays([np.array([{}])])
+
+
+@pytest.mark.parametrize(
+    "space",
+    [
+        gym.spaces.Box(low=-1, high=np.array([1.0, 2.0]), dtype=np.float64),
+        gym.spaces.Box(low=0, high=255, shape=(2, 3), dtype=np.uint8),
+        gym.spaces.Discrete(4),
+        gym.spaces.MultiDiscrete([2, 3]),
+        gym.spaces.MultiBinary(5),
+    ],
+)
+def test_encode_space(space):
+    arrays = decode_arrays(memoryview(encode_arrays(encode_space(space))))
+    decoded = decode_space(arrays)
+    assert decoded == space
+    assert decoded.dtype == space.dtype
+
+
+def test_encode_infos():
+    infos = [
+        {},
+        {"terminal_observation": np.arange(4.0), "TimeLimit.truncated": True},
+        {"score": np.float32(1.5), "tags": ["a", "b"]},
+    ]
+    decoded = decode_infos(
+        decode_arrays(memoryview(encode_arrays(encode_infos(infos))))
+    )
+    assert decoded[0] == {}
+    np.testing.assert_array_equal(decoded[1]["terminal_observation"], np.arange(4.0))
+    assert decoded[1]["TimeLimit.truncated"] is True
+    assert decoded[2] == {"score": 1.5, "tags": ["a", "b"]}
+
+    with pytest.raises(TypeError):
+        encode_infos([{"env": object()}])
+
+
+def test_env_client_authkey():
+    with pytest.raises(ValueError):
+        EnvServer([lambda: gym.make("CartPole-v0")], b"")
+
+    server = EnvServer([lambda: gym.make("CartPole-v0")], AUTHKEY)
+    thread = threading.Thread(target=server.serve, args=(1,), daemon=True)
+    thread.start()
+    with pytest.raises(AuthenticationError):
+        EnvClient(*server.address, b"wrong key")
+    # The rejected client isn't counted so the server keeps serving
+    client = EnvClient(*server.address, AUTHKEY)
+    assert client.num_envs == 1
+    client.close()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    server.close()
+
+
+def test_env_server_max_message_size():
+    server = EnvServer([lambda: gym.make("CartPole-v0")], AUTHKEY, max_message_size=64)
+    thread = threading.Thread(target=server.serve, args=(1,), daemon=True)
+    thread.start()
+    client = EnvClient(*server.address, AUTHKEY)
+    client.reset()
+    # A header announcing a huge body is rejected before anything is allocated
+    client.socket.sendall(_HEADER.pack(2 ** 62, STEP))
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    with pytest.raises((EOFError, ConnectionResetError)):
+        recv_message(client.socket)
+    client.close()
+    server.close()
+
+    sender, receiver = socket.socketpair()
+    send_message(sender, STEP, [np.zeros(100)])
+    with pytest.raises(ValueError):
+        recv_message(receiver, max_size=100)
+    sender.close()
+    receiver.close()
+
+
+def test_env_client(client):
+    assert client.num_envs == NUM_ENVS
+    assert client.single_observation_space == gym.make("CartPole-v0").observation_space
+    local_env = gym.vector.SyncVectorEnv(
+        [lambda: gym.make("CartPole-v0") for _ in range(NUM_ENVS)]
+    )
+    client.seed(0)
+    local_env.seed(0)
+    np.testing.assert_array_equal(client.reset(), local_env.reset())
+
+    for _ in range(30):
+        actions = np.random.randint(2, size=NUM_ENVS)
+        expected = local_env.step(actions)
+        actual = client.step(actions)
+        for e, a in zip(expected[:3], actual[:3]):
+            np.testing.assert_array_equal(a, e)
+        assert len(actual[3]) == NUM_ENVS
+        if np.any(expected[2]):
+            np.testing.assert_array_equal(
+                [info.get("terminal_observation") for info in actual[3] if info],
+                [info.get("terminal_observation") for info in expected[3] if info],
+            )
+
+
+def test_env_client_pipelining(client):
+    local_env = gym.vector.SyncVectorEnv(
+        [lambda: gym.make("CartPole-v0") for _ in range(NUM_ENVS)]
+    )
+    client.seed(1)
+    local_env.seed(1)
+    client.reset_async()
+    actions = [np.random.randint(2, size=NUM_ENVS) for _ in range(3)]
+    # Several requests in flight before any result is collected
+    for action in actions:
+        client.step_async(action)
+    assert client.num_pending == 4
+
+    np.testing.assert_array_equal(client.reset_wait(), local_env.reset())
+    for action in actions:
+        observations, rewards, _, _ = client.step_wait()
+        expected_observations, expected_rewards, _, _ = local_env.step(action)
+        np.testing.assert_array_equal(observations, expected_observations)
+        np.testing.assert_array_equal(rewards, expected_rewards)
+    assert client.num_pending == 0
+
+    with pytest.raises(RuntimeError):
+        client.step_wait()
+
+
+def test_env_client_agent(client):
+    model = ActorCritic(
+        actor=Dummy(space=client.single_action_space),
+        critic=Dummy(space=client.single_action_space),
+    )
+    agent = MockAgent(
+        env=client,
+        model=model,
+        buffer_class=RolloutBuffer,
+        buffer_settings=BufferSettings(buffer_size=20),
+        explorer_settings=ExplorerSettings(start_steps=100),
+        logger_settings=LoggerSettings(verbose=False),
+    )
+    observation = client.reset()
+    agent.step_env(observation, num_steps=10)
+    trajectories = agent.buffer.all(dtype="numpy")
+    assert trajectories.observations.shape == (NUM_ENVS, 10, 4)
+    assert trajectories.rewards.shape == (NUM_ENVS, 10, 1)
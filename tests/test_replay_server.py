@@ -0,0 +1,209 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.buffers import ReplayBuffer, ReplayClient, ReplayServer
+from pearll.buffers.replay_server import INSERT, RateLimiter, start_replay_server
+from pearll.common.remote_env import _HEADER, recv_message, send_message
+from pearll.settings import ReplayServerSettings
+
+env = gym.make("CartPole-v0")
+AUTHKEY = b"test replay server"
+
+
+def make_buffer():
+    return ReplayBuffer(gym.make("CartPole-v0"), buffer_size=1000)
+
+
+def make_batch(size, start=0):
+    observations = np.arange(start, start + size, dtype=np.float32)[:, None].repeat(
+        4, axis=1
+    )
+    return (
+        observations,
+        np.zeros(size, dtype=np.int64),
+        np.ones(size, dtype=np.float32),
+        observations + 1,
+        np.zeros(size, dtype=np.float32),
+    )
+
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def factory(**kwargs):
+        server = ReplayServer(make_buffer(), ReplayServerSettings(AUTHKEY, **kwargs))
+        threading.Thread(target=server.serve, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+def collect(address, start, num_batches, batch_size):
+    client = ReplayClient(*address, AUTHKEY)
+    for i in range(num_batches):
+        client.add_batch_trajectories(*make_batch(batch_size, start + i * batch_size))
+    client.close()
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(samples_per_insert=2, min_size_to_sample=4, error_buffer=3)
+    assert not limiter.can_sample()
+    limiter.insert(3)
+    assert limiter.can_insert()
+    assert not limiter.can_sample()
+    limiter.insert(1)
+    assert limiter.can_sample()
+    # Inserts are held back once the learner falls too far behind
+    limiter.insert(2)
+    assert not limiter.can_insert()
+    limiter.sample(2)
+    assert limiter.can_insert()
+    # Samples are held back once the learner gets too far ahead
+    limiter.sample(6)
+    assert not limiter.can_sample()
+    limiter.insert(1)
+    assert limiter.can_sample()
+
+    limiter = RateLimiter(min_size_to_sample=2)
+    limiter.insert(2)
+    limiter.sample(1000)
+    assert limiter.can_insert()
+    assert limiter.can_sample()
+
+
+def test_replay_client(server_factory):
+    server = server_factory()
+    client = ReplayClient(*server.address, AUTHKEY)
+    client.add_batch_trajectories(*make_batch(10))
+    client.add_trajectory(*[data[0] for data in make_batch(1, start=10)])
+    assert server.buffer.pos == 11
+    np.testing.assert_array_equal(
+        server.buffer.observations[:11, 0], np.arange(11, dtype=np.float32)
+    )
+
+    trajectories = client.sample(8)
+    assert isinstance(trajectories.observations, T.Tensor)
+    assert trajectories.observations.shape == (8, 4)
+    trajectories = client.sample(8, dtype="numpy")
+    assert trajectories.observations.shape == (8, 4)
+    assert trajectories.rewards.shape == (8, 1)
+    np.testing.assert_array_equal(
+        trajectories.next_observations, trajectories.observations + 1
+    )
+
+    stats = client.stats()
+    assert stats["num_inserted"] == 11
+    assert stats["num_sampled"] == 16
+    assert stats["insert_rate"] > 0
+    assert stats["samples_per_insert"] == pytest.approx(16 / 11)
+    client.close()
+
+
+def test_replay_server_blocks(server_factory):
+    server = server_factory(
+        samples_per_insert=1, min_size_to_sample=10, error_buffer=5, timeout=0.2
+    )
+    client = ReplayClient(*server.address, AUTHKEY)
+    with pytest.raises(TimeoutError):
+        client.sample(5)
+    client.add_batch_trajectories(*make_batch(10))
+    client.add_batch_trajectories(*make_batch(10))
+    # The learner hasn't sampled the inserted data yet
+    with pytest.raises(TimeoutError):
+        client.add_batch_trajectories(*make_batch(10))
+
+    # A blocked insert is released by a sample from another client
+    learner = ReplayClient(*server.address, AUTHKEY)
+    inserter = threading.Thread(
+        target=client.add_batch_trajectories, args=make_batch(10)
+    )
+    server.settings.timeout = None
+    inserter.start()
+    time.sleep(0.1)
+    assert inserter.is_alive()
+    learner.sample(10)
+    inserter.join(timeout=5)
+    assert not inserter.is_alive()
+    stats = learner.stats()
+    assert stats["num_inserted"] == 30
+    assert stats["insert_wait_time"] > 0.2
+    learner.close()
+    client.close()
+
+
+def test_replay_server_closed(server_factory):
+    server = server_factory(min_size_to_sample=10)
+    client = ReplayClient(*server.address, AUTHKEY)
+    # A blocked sample is released when the server closes
+    threading.Timer(0.1, server.close).start()
+    with pytest.raises(EOFError):
+        client.sample(1)
+    client.close()
+
+
+def test_replay_server_processes():
+    process, address = start_replay_server(
+        make_buffer,
+        ReplayServerSettings(AUTHKEY, samples_per_insert=0.5, error_buffer=20),
+        start_method="fork",
+    )
+    ctx = mp.get_context("fork")
+    collectors = [
+        ctx.Process(target=collect, args=(address, i * 100, 10, 10), daemon=True)
+        for i in range(2)
+    ]
+    for collector in collectors:
+        collector.start()
+
+    learner = ReplayClient(*address, AUTHKEY)
+    for _ in range(15):
+        trajectories = learner.sample(6, dtype="numpy")
+        assert trajectories.observations.shape == (6, 4)
+    for collector in collectors:
+        collector.join(timeout=10)
+        assert collector.exitcode == 0
+
+    stats = learner.stats()
+    assert stats["num_inserted"] == 200
+    assert stats["num_sampled"] == 90
+    learner.close()
+    process.terminate()
+    process.join()
+
+
+def test_replay_server_rejects_clients(server_factory):
+    server = server_factory(max_message_size=1024)
+    with pytest.raises(AuthenticationError):
+        ReplayClient(*server.address, b"wrong key")
+    assert server.stats()["num_inserted"] == 0
+
+    # A header announcing a huge body closes the connection before anything is allocated
+    client = ReplayClient(*server.address, AUTHKEY)
+    client.socket.sendall(_HEADER.pack(2 ** 62, INSERT))
+    with pytest.raises((EOFError, ConnectionResetError)):
+        recv_message(client.socket)
+    client.close()
+
+    # So does an unknown operation
+    client = ReplayClient(*server.address, AUTHKEY)
+    send_message(client.socket, b"X")
+    with pytest.raises((EOFError, ConnectionResetError)):
+        recv_message(client.socket)
+    client.close()
+
+    # The server still serves authenticated clients
+    client = ReplayClient(*server.address, AUTHKEY)
+    client.add_batch_trajectories(*make_batch(10))
+    assert client.stats()["num_inserted"] == 10
+    client.close()
@@ -0,0 +1,173 @@
+import gc
+import multiprocessing as mp
+import pickle
+from multiprocessing import shared_memory
+
+import gym
+import numpy as np
+import pytest
+import torch as T
+
+from pearll.buffers import ReplayBuffer, SharedHERBuffer, SharedReplayBuffer
+from tests.test_her import BitFlippingEnv
+
+env = gym.make("CartPole-v0")
+
+
+@pytest.fixture
+def buffer():
+    buffer = SharedReplayBuffer(env, buffer_size=50, num_shards=3)
+    yield buffer
+    buffer.close()
+
+
+def fill(buffer, start, num_steps):
+    """Add transitions whose observations count up from `start`"""
+    for i in range(start, start + num_steps):
+        obs = np.full(4, i, dtype=np.float32)
+        buffer.add_trajectory(obs, 0, float(i), obs + 1, False)
+
+
+def collect(buffer, shard_id, num_steps):
+    shard = buffer.shard(shard_id)
+    fill(shard, shard_id * 1000, num_steps)
+    shard.close()
+
+
+def test_shared_buffer_init(buffer):
+    assert buffer.observations.shape == (50, 4)
+    assert buffer.actions.shape == (50, 1)
+    assert buffer.rewards.shape == (50, 1)
+    assert buffer.dones.shape == (50, 1)
+    assert buffer._shared["observations"].shape == (3, 50, 4)
+
+
+def test_shared_buffer_shards(buffer):
+    fill(buffer, 0, 5)
+    shard = pickle.loads(pickle.dumps(buffer.shard(2)))
+    fill(shard, 2000, 10)
+    assert shard.pos == 10
+    # The writes of the shard handle are visible in the original buffer
+    np.testing.assert_array_equal(
+        buffer._shared["observations"][2, :10, 0], np.arange(2000, 2010)
+    )
+    np.testing.assert_array_equal(buffer._cursors[:, 0], [5, 0, 10])
+    assert buffer.pos == 5
+
+    trajectories = buffer.sample(1000, dtype="numpy")
+    observations = trajectories.observations[:, 0]
+    assert set(observations) == set(range(5)) | set(range(2000, 2010))
+    np.testing.assert_array_equal(
+        trajectories.next_observations, trajectories.observations + 1
+    )
+    np.testing.assert_array_equal(trajectories.rewards[:, 0], observations)
+    shard.close()
+
+    trajectories = buffer.sample(8)
+    assert isinstance(trajectories.observations, T.Tensor)
+    assert trajectories.observations.shape == (8, 4)
+
+
+def test_shared_buffer_sample_many(buffer):
+    fill(buffer, 0, 5)
+    shard = buffer.shard(1)
+    fill(shard, 1000, 10)
+    shard.close()
+    np.random.seed(0)
+    # Samples are only valid until the next sample so they're copied
+    expected = [buffer.sample(20, dtype="numpy").observations.copy() for _ in range(3)]
+    np.random.seed(0)
+    batches = list(buffer.sample_many(3, 20, dtype="numpy"))
+    for trajectories, observations in zip(batches, expected):
+        np.testing.assert_array_equal(trajectories.observations, observations)
+        np.testing.assert_array_equal(
+            trajectories.next_observations, trajectories.observations + 1
+        )
+        np.testing.assert_array_equal(
+            trajectories.rewards[:, 0], trajectories.observations[:, 0]
+        )
+
+
+def test_shared_buffer_matches_replay_buffer(buffer):
+    # A single shard samples the same transitions as a `ReplayBuffer` once it wraps around
+    replay_buffer = ReplayBuffer(env, buffer_size=50)
+    fill(buffer, 0, 120)
+    fill(replay_buffer, 0, 120)
+    np.random.seed(0)
+    expected = replay_buffer.sample(200, dtype="numpy")
+    np.random.seed(0)
+    actual = buffer.sample(200, dtype="numpy")
+    np.testing.assert_array_equal(actual.observations, expected.observations)
+    np.testing.assert_array_equal(actual.next_observations, expected.next_observations)
+    np.testing.assert_array_equal(actual.rewards, expected.rewards)
+
+    buffer.reset()
+    assert buffer.pos == 0
+    assert not buffer.full
+    with pytest.raises(RuntimeError):
+        buffer.sample(1)
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_shared_buffer_processes(buffer, start_method):
+    ctx = mp.get_context(start_method)
+    processes = [
+        ctx.Process(target=collect, args=(buffer, shard_id, 20 + shard_id))
+        for shard_id in (1, 2)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    np.testing.assert_array_equal(buffer._cursors[:, 0], [0, 21, 22])
+    observations = buffer.sample(2000, dtype="numpy").observations[:, 0]
+    assert set(observations) == set(range(1000, 1021)) | set(range(2000, 2022))
+
+
+def test_shared_her_buffer():
+    her_env = BitFlippingEnv(5)
+    buffer = SharedHERBuffer(
+        her_env, buffer_size=20, num_shards=2, goal_selection_strategy="final"
+    )
+    for shard_id in range(2):
+        shard = buffer.shard(shard_id)
+        obs = her_env.reset()
+        for _ in range(5):
+            action = her_env.action_space.sample()
+            next_obs, reward, done, _ = her_env.step(action)
+            shard.add_trajectory(obs, action, reward, next_obs, done)
+            obs = next_obs
+            if done:
+                obs = her_env.reset()
+        shard.close()
+
+    assert buffer.episode_end_indices.shape == (20,)
+    np.testing.assert_array_equal(buffer._cursors[:, 0], [5, 5])
+    trajectories = buffer.sample(10, dtype="numpy")
+    assert trajectories.observations["observation"].shape == (10, 5)
+    assert trajectories.observations["desired_goal"].shape == (10, 5)
+    assert trajectories.rewards.shape == (10, 1)
+    trajectories = buffer.sample(10)
+    assert isinstance(trajectories.actions, T.Tensor)
+    buffer.close()
+
+
+def test_shared_buffer_freed_without_close():
+    buffer = SharedReplayBuffer(env, buffer_size=50, num_shards=2)
+    fill(buffer, 0, 5)
+    shard = buffer.shard(1)
+    fill(shard, 1000, 5)
+    names = [segment.name for segment in buffer._segments.values()]
+    shard.close()
+    # Only the creating buffer frees the segments
+    del shard
+    gc.collect()
+    shared_memory.SharedMemory(name=names[0]).close()
+
+    del buffer
+    gc.collect()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
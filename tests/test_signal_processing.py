@@ -19,7 +19,11 @@ from pearll.signal_processing.sample_estimators import (
     sample_reverse_kl_divergence,
 )
 from pearll.signal_processing.selection_operators import (
+    crowded_comparison_order,
+    crowding_distance,
     naive_selection,
+    non_dominated_sort,
+    nsga2_selection,
     roulette_selection,
     tournament_selection,
 )
@@ -133,6 +137,11 @@ def test_tournament_selection():
 
     np.testing.assert_array_equal(actual_population, expected_population)
 
+    # tied fitness scores, e.g. novelty scores of duplicate behaviours
+    fitness = np.array([1, 1, 1])
+    actual_population = tournament_selection(population, fitness, 2)
+    assert actual_population.shape == population.shape
+
 
 def test_roulette_selection():
     np.random.seed(8)
@@ -144,6 +153,77 @@ def test_roulette_selection():
     np.testing.assert_array_equal(actual_population, expected_population)
 
 
+def brute_force_non_dominated_sort(fitness):
+    dominates = np.all(fitness[:, None] >= fitness[None], axis=-1) & np.any(
+        fitness[:, None] > fitness[None], axis=-1
+    )
+    fronts = np.full(fitness.shape[0], -1)
+    remaining = np.ones(fitness.shape[0], dtype=bool)
+    front = 0
+    while remaining.any():
+        current = remaining & ~np.any(dominates[remaining], axis=0)
+        fronts[current] = front
+        remaining &= ~current
+        front += 1
+    return fronts
+
+
+@pytest.mark.parametrize("num_objectives", [1, 2, 3, 5])
+def test_non_dominated_sort(num_objectives):
+    np.random.seed(8)
+    fitness = np.random.rand(600, num_objectives)
+    np.testing.assert_array_equal(
+        non_dominated_sort(fitness, block_size=64),
+        brute_force_non_dominated_sort(fitness),
+    )
+
+    # Duplicate individuals are in the same front
+    fitness = np.random.randint(0, 4, size=(600, num_objectives)).astype(float)
+    np.testing.assert_array_equal(
+        non_dominated_sort(fitness, block_size=64),
+        brute_force_non_dominated_sort(fitness),
+    )
+
+    # Ties on some objectives only
+    fitness = np.random.randint(0, 20, size=(600, num_objectives)).astype(float)
+    np.testing.assert_array_equal(
+        non_dominated_sort(fitness, block_size=64),
+        brute_force_non_dominated_sort(fitness),
+    )
+
+    fitness = np.array([[1, 2], [2, 1], [1, 1], [0, 0], [1, 1]])
+    np.testing.assert_array_equal(non_dominated_sort(fitness), [0, 0, 1, 2, 1])
+
+
+def test_crowding_distance():
+    fitness = np.array([[0, 4], [1, 3], [3, 1], [4, 0], [0, 0], [1, 1]])
+    fronts = non_dominated_sort(fitness)
+    np.testing.assert_array_equal(fronts, [0, 0, 0, 0, 2, 1])
+    actual_distances = crowding_distance(fitness, fronts)
+    expected_distances = np.array([np.inf, 1.5, 1.5, np.inf, np.inf, np.inf])
+    np.testing.assert_array_equal(actual_distances, expected_distances)
+
+    order = crowded_comparison_order(fitness)
+    assert set(order[:2]) == {0, 3}
+    np.testing.assert_array_equal(order[4:], [5, 4])
+
+
+def test_nsga2_selection():
+    np.random.seed(8)
+    population = np.arange(8)[:, None]
+    fitness = np.array(
+        [[0, 4], [1, 3], [3, 1], [4, 0], [0, 0], [1, 1], [0, 1], [1, 0]], dtype=float
+    )
+    actual_population = nsga2_selection(population, fitness, tournament_size=8)
+    assert actual_population.shape == population.shape
+    # Large tournaments always pick boundary individuals of the first front
+    assert np.isin(actual_population, [0, 3]).mean() > 0.5
+
+    # Dominated individuals never win a tournament against the whole population
+    actual_population = nsga2_selection(population, fitness, tournament_size=100)
+    assert np.isin(actual_population, [0, 1, 2, 3]).all()
+
+
 def test_fit_gaussian():
     np.random.seed(9)
     parents = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
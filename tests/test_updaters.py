@@ -1,4 +1,5 @@
 import copy
+from functools import partial
 from typing import Union
 
 import gym
@@ -6,6 +7,8 @@ import numpy as np
 import pytest
 import torch as T
 
+from pearll.common.archives import GridArchive
+from pearll.common.function_envs import Sphere
 from pearll.models import Actor, ActorCritic, Critic, Dummy
 from pearll.models.actor_critics import Model
 from pearll.models.encoders import IdentityEncoder, MLPEncoder
@@ -29,7 +32,14 @@ from pearll.updaters.critics import (
     ValueRegression,
 )
 from pearll.updaters.environment import DeepRegression
-from pearll.updaters.evolution import GeneticUpdater, NoisyGradientAscent
+from pearll.updaters.evolution import (
+    CMAES,
+    GeneticUpdater,
+    LowRankNoisyGradientAscent,
+    MAPElitesUpdater,
+    NoisyGradientAscent,
+    SepCMAES,
+)
 
 ############################### SET UP MODELS ###############################
 
@@ -332,22 +342,6 @@ def test_continuous_q_regression(model: Union[Critic, ActorCritic]):
 ############################### TEST EVOLUTION UPDATERS ###############################
 
 
-class Sphere(gym.Env):
-    """
-    Sphere(2) function for testing ES agent.
-    """
-
-    def __init__(self):
-        self.action_space = gym.spaces.Box(low=-100, high=100, shape=(2,))
-        self.observation_space = gym.spaces.Discrete(1)
-
-    def step(self, action):
-        return 0, -(action[0] ** 2 + action[1] ** 2), False, {}
-
-    def reset(self):
-        return 0
-
-
 class DiscreteSphere(gym.Env):
     """
     Discrete Sphere(1) function for testing ES agent.
@@ -365,9 +359,7 @@ class DiscreteSphere(gym.Env):
 
 
 POPULATION_SIZE = 100
-env_continuous = gym.vector.SyncVectorEnv(
-    [lambda: Sphere() for _ in range(POPULATION_SIZE)]
-)
+env_continuous = Sphere(num_envs=POPULATION_SIZE)
 env_discrete = gym.vector.SyncVectorEnv(
     [lambda: DiscreteSphere() for _ in range(POPULATION_SIZE)]
 )
@@ -534,6 +526,161 @@ def test_genetic_updater_discrete():
     np.testing.assert_array_less(np.min(new_population, axis=0), np.array([5]))
 
 
+def test_genetic_updater_multi_objective():
+    actor = Dummy(space=env_continuous.single_action_space, state=np.array([10, 10]))
+    critic = Dummy(space=env_continuous.single_action_space)
+    model = ActorCritic(
+        actor=actor,
+        critic=critic,
+        population_settings=PopulationSettings(
+            actor_population_size=POPULATION_SIZE, actor_distribution="normal"
+        ),
+    )
+    updater = GeneticUpdater(model)
+    old_population = model.numpy_actors()
+
+    # One objective per action dimension, the first front is kept as elite
+    rewards = old_population.copy()
+    fronts = selection_operators.non_dominated_sort(rewards)
+    log = updater(
+        rewards=rewards,
+        selection_operator=selection_operators.nsga2_selection,
+        mutation_operator=partial(
+            mutation_operators.gaussian_mutation, mutation_rate=1
+        ),
+        elitism=0.2,
+    )
+    new_population = model.numpy_actors()
+    assert log.divergence > 0
+    kept = np.all(np.isclose(new_population, old_population), axis=1)
+    assert kept.sum() == int(POPULATION_SIZE * 0.2)
+    assert np.all(fronts[kept] <= np.sort(fronts)[int(POPULATION_SIZE * 0.2) - 1])
+
+
+def test_map_elites_updater():
+    actor = Dummy(space=env_continuous.single_action_space, state=np.array([10, 10]))
+    critic = Dummy(space=env_continuous.single_action_space)
+    model = ActorCritic(
+        actor=actor,
+        critic=critic,
+        population_settings=PopulationSettings(
+            actor_population_size=POPULATION_SIZE, actor_distribution="uniform"
+        ),
+    )
+    archive = GridArchive(
+        genome_shape=actor.space_shape,
+        descriptor_bounds=(actor.space_range[0], actor.space_range[1]),
+        cells_per_dim=5,
+    )
+    updater = MAPElitesUpdater(model, archive=archive)
+
+    # Test call, the genome is used as the behaviour descriptor
+    old_population = model.numpy_actors()
+    action = model(np.zeros(POPULATION_SIZE))
+    _, rewards, _, _ = env_continuous.step(action)
+    log = updater(rewards=rewards, descriptors=old_population)
+    new_population = model.numpy_actors()
+    assert log.divergence > 0
+    assert archive.size > 1
+    elites = archive.genomes[archive.occupied]
+    assert all((elites == ind).all(axis=1).any() for ind in new_population)
+    assert archive.fitness.max() == np.max(rewards)
+
+    # mutated offspring are inserted on the next call
+    log = updater(
+        rewards=rewards,
+        descriptors=new_population,
+        mutation_operator=mutation_operators.gaussian_mutation,
+    )
+    assert np.not_equal(model.numpy_actors(), new_population).any()
+
+
+@pytest.mark.parametrize("updater_class", [CMAES, SepCMAES])
+def test_cma_updater(updater_class):
+    np.random.seed(0)
+    actor_continuous = Dummy(
+        space=env_continuous.single_action_space, state=np.array([10, 10])
+    )
+    critic = Dummy(space=env_continuous.single_action_space)
+    model_continuous = ActorCritic(
+        actor=actor_continuous,
+        critic=critic,
+        population_settings=PopulationSettings(
+            actor_population_size=POPULATION_SIZE, actor_distribution="normal"
+        ),
+    )
+
+    updater = updater_class(model_continuous)
+    assert updater.C.shape == ((2, 2) if updater_class == CMAES else (2,))
+
+    # Test call
+    old_population = model_continuous.numpy_actors()
+    action = model_continuous(np.zeros(POPULATION_SIZE))
+    _, rewards, _, _ = env_continuous.step(action)
+    log = updater(rewards=rewards)
+    new_population = model_continuous.numpy_actors()
+    assert log.divergence > 0
+    assert new_population.shape == old_population.shape
+    assert np.not_equal(old_population, new_population).any()
+    # make sure the network mean has been updated by the updater
+    np.testing.assert_array_equal(model_continuous.mean_actor, updater.mean)
+    np.testing.assert_array_less(np.abs(updater.mean), np.array([10, 10]))
+
+    # Run to convergence on the sphere function
+    for _ in range(50):
+        action = model_continuous(np.zeros(POPULATION_SIZE))
+        _, rewards, _, _ = env_continuous.step(action)
+        updater(rewards=rewards)
+    np.testing.assert_allclose(updater.mean, np.zeros(2), atol=1e-2)
+    assert updater.sigma < 1
+
+
+@pytest.mark.parametrize("rank", [1, 2])
+def test_low_rank_evolutionary_updater(rank):
+    np.random.seed(0)
+    torso = MLP(layer_sizes=[2, 8, 4])
+    head = DiagGaussianHead(input_shape=4, action_size=1)
+    model = ActorCritic(
+        actor=Actor(encoder=IdentityEncoder(), torso=torso, head=head),
+        critic=critic,
+        population_settings=PopulationSettings(
+            actor_population_size=POPULATION_SIZE, actor_distribution="normal"
+        ),
+    )
+
+    updater = LowRankNoisyGradientAscent(model, rank=rank)
+    assert updater.normal_dist is None
+    population = model.numpy_actors()
+    noise = (population - updater.mean) / updater.std
+
+    # make sure each weight matrix perturbation has the requested rank
+    for (start, end, shape), factor in zip(updater.segments, updater.factors):
+        if len(shape) == 2:
+            assert factor[0].shape == (POPULATION_SIZE, shape[0], rank)
+            assert factor[1].shape == (POPULATION_SIZE, shape[1], rank)
+            weight_noise = noise[0, start:end].reshape(shape)
+            assert np.linalg.matrix_rank(weight_noise) == min(rank, *shape)
+        else:
+            assert factor.shape == (POPULATION_SIZE, end - start)
+
+    # make sure the factored weighted noise matches the dense calculation
+    weights = np.random.randn(POPULATION_SIZE)
+    np.testing.assert_allclose(
+        updater.weighted_noise(weights), np.dot(noise.T, weights), atol=1e-6
+    )
+
+    # Test call
+    optimization_direction = updater.weighted_noise(weights)
+    old_mean = updater.mean.copy()
+    log = updater(learning_rate=0.01, optimization_direction=optimization_direction)
+    new_population = model.numpy_actors()
+    assert log.divergence > 0
+    assert np.not_equal(population, new_population).any()
+    np.testing.assert_allclose(
+        updater.mean, old_mean + 0.01 * optimization_direction, rtol=1e-5
+    )
+
+
 ############################### TEST ENVIRONMENT UPDATERS ###############################
 
 